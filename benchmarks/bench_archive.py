@@ -0,0 +1,107 @@
+"""
+Loan archive: ledger memory and history reads with the returned loans moved out.
+
+Generates a library, times generate_borrowing_report(), the windowed
+live report, loan_columns() and the borrowed-books fallback of
+recommend_books() on the full ledger, then moves every returned loan to a
+LoanArchive and times them again. Checks the reports are identical. A
+second, traced run (tracemalloc) measures what the ledger and its
+listeners hold before and after archive_loans().
+
+Usage: python benchmarks/bench_archive.py [n_loans] [open_share]
+"""
+
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+from benchmarks.datagen import populate
+
+
+def timed(function, *args, repeat=3, **kwargs):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def build(n_loans, open_share):
+    populate(n_books=max(1000, n_loans // 20), n_members=max(100, n_loans // 20), n_loans=n_loans)
+    step = round(1 / open_share) if open_share else 0
+    with lib.loans.lock:
+        for i, record in enumerate(lib.loans):
+            if step and i % step == 0:
+                record.pop("return_date", None)
+                record["returned"] = False
+
+
+def uncached_window(days):
+    lib.materialized_report._cache.clear()  # time the window scan, not the report cache
+    return lib.live_borrowing_report(window_days=days)
+
+
+def history(member_ids):
+    return [lib._recommend(m, 10, "scan", set()) for m in member_ids]
+
+
+def main():
+    n_loans = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    open_share = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    directory = tempfile.mkdtemp(prefix="library-archive-")
+    now = datetime.today()
+    try:
+        build(n_loans, open_share)
+        member_ids = list(lib.members)[:50]
+        jobs = {
+            "generate_borrowing_report()": lambda: lib.generate_borrowing_report(),
+            "live report, window_days=365": lambda: uncached_window(365),
+            "loan_columns().borrowing_report()": lambda: lib.loan_columns().borrowing_report(now=now),
+            "recommend_books(mode='scan') x50": lambda: history(member_ids),
+        }
+        before = {name: timed(job) for name, job in jobs.items()}
+
+        lib.open_archive(os.path.join(directory, "timed"), fsync=False)
+        (moved, archive_time) = timed(lib.archive_loans, repeat=1)
+        after = {name: timed(job) for name, job in jobs.items()}
+        _, zero_copy = timed(lambda: lib.loan_archive.columns().top_books(10))
+        for name in ("generate_borrowing_report()", "live report, window_days=365"):
+            assert before[name][0] == after[name][0], name
+        assert before["loan_columns().borrowing_report()"][0] == after["loan_columns().borrowing_report()"][0]
+        size = sum(os.path.getsize(os.path.join(lib.loan_archive.path, f)) for f in os.listdir(lib.loan_archive.path))
+        lib.close_archive()
+
+        # Same data again under tracemalloc, for the memory the ledger and its listeners keep
+        tracemalloc.start()
+        build(n_loans, open_share)
+        gc.collect()
+        full = tracemalloc.get_traced_memory()[0]
+        lib.open_archive(os.path.join(directory, "traced"), fsync=False)
+        lib.archive_loans()
+        gc.collect()
+        archived = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        lib.close_archive()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"{n_loans:,} loans, {open_share:.0%} open; archived {moved:,} in {archive_time:.2f} s "
+          f"({size / 2**20:.1f} MB on disk)")
+    print(f"  traced memory   {full / 2**20:8.1f} MB  ->  {archived / 2**20:8.1f} MB")
+    print(f"  {'read':36} {'ledger':>9} {'archive':>9}")
+    for name in jobs:
+        print(f"  {name:36} {before[name][1] * 1000:7.1f}ms {after[name][1] * 1000:7.1f}ms")
+    print(f"  {'archive.columns().top_books(10)':36} {'':>9} {zero_copy * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
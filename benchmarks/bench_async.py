@@ -0,0 +1,106 @@
+"""
+Async front end: AsyncLibrary vs. pushing each call onto a thread.
+
+Starts N concurrent client tasks on one event loop. Each client borrows a
+random book, searches the catalog, asks for recommendations and returns
+the book, either through AsyncLibrary (on the loop, asyncio locks, batched
+flushes) or through asyncio.to_thread() around the synchronous library
+functions (the default executor, each call making its own store.sync()).
+Runs once in memory and once with a durable store (fsync on), checks the
+copy counts afterwards and reports requests/s.
+
+Usage: python benchmarks/bench_async.py [clients]
+"""
+
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+from src.async_library import AsyncLibrary
+from benchmarks.datagen import populate
+
+COPIES = 3
+
+
+async def _async_client(library, rng, member_id, book_ids):
+    book_id = rng.choice(book_ids)
+    requests = 3  # borrow, search, recommend
+    try:
+        await library.borrow(member_id, book_id)
+        borrowed = True
+    except ValueError:
+        borrowed = False  # no copies left (expected under contention)
+    await library.search(author=f"Author {rng.randrange(100)}", limit=10)
+    await library.recommend(member_id, limit=5)
+    if borrowed:
+        await library.return_book(member_id, book_id)
+        requests += 1
+    return requests
+
+
+async def _thread_client(rng, member_id, book_ids):
+    book_id = rng.choice(book_ids)
+    requests = 3  # borrow, search, recommend
+    try:
+        await asyncio.to_thread(lib.check_in_out_operations, member_id, book_id, "borrow")
+        borrowed = True
+    except ValueError:
+        borrowed = False
+    await asyncio.to_thread(lib.search_catalog, author=f"Author {rng.randrange(100)}", limit=10)
+    await asyncio.to_thread(lib.recommend_books, member_id=member_id, limit=5)
+    if borrowed:
+        await asyncio.to_thread(lib.check_in_out_operations, member_id, book_id, "return")
+        requests += 1
+    return requests
+
+
+async def _run(mode, member_ids, book_ids):
+    rng = random.Random(7)
+    if mode == "AsyncLibrary":
+        library = AsyncLibrary()
+        clients = [_async_client(library, random.Random(rng.random()), m, book_ids) for m in member_ids]
+    else:
+        clients = [_thread_client(random.Random(rng.random()), m, book_ids) for m in member_ids]
+    start = time.perf_counter()
+    requests = sum(await asyncio.gather(*clients))
+    return requests / (time.perf_counter() - start)
+
+
+def _check_copies():
+    for book in lib.catalog:
+        assert book["copies_available"] == COPIES, book["id"]
+    assert lib.loans.open_count() == 0
+
+
+def main():
+    n_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    print(f"{n_clients:,} concurrent clients, 4 requests each (borrow, search, recommend, return)")
+    for durable in (False, True):
+        print("durable store, fsync on:" if durable else "in memory:")
+        for mode in ("thread offload", "AsyncLibrary"):
+            populate(n_books=2_000, n_members=n_clients, n_loans=0)
+            for book in lib.catalog:
+                book["copies_total"] = book["copies_available"] = COPIES
+            member_ids, book_ids = list(lib.members), list(lib.catalog.ids())
+            path = tempfile.mkdtemp(prefix="library-store-") if durable else None
+            if durable:
+                lib.open_store(path, fsync=True)
+            try:
+                rate = asyncio.run(_run(mode, member_ids, book_ids))
+                _check_copies()
+                print(f"  {mode:<15} {rate:10,.0f} requests/s   copies OK")
+            finally:
+                if durable:
+                    lib.close_store()
+                    shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
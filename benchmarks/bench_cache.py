@@ -0,0 +1,120 @@
+"""
+Result caches: search_catalog() and recommend_books() with and without them.
+
+Replays the same request mix with the caches disabled and with them on:
+popular searches and members drawn from a Zipf-like distribution, with
+a borrow or a return every tenth request. Both are run with the default
+recommender and again with co-borrow similarity switched on (which
+gives each recommendation several hundred version keys and lets every
+checkout outdate other members' results). Reports requests/s, each
+cache's counters for the cached run, and the mean cost of a hit and of
+a miss. Every cached answer is then compared with an uncached
+recomputation (so checkouts never leave a stale result).
+
+Usage: python benchmarks/bench_cache.py [n_requests] [n_books]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+from src.result_cache import ResultCache
+from benchmarks.datagen import GENRES, WORDS, populate
+
+
+def _zipf(rng, n, s=1.1):
+    weights = [1 / (i + 1) ** s for i in range(n)]
+    return lambda: rng.choices(range(n), weights)[0]
+
+
+def make_requests(n, rng, member_ids, book_ids):
+    queries = [dict(query=" ".join(rng.sample(WORDS, rng.randint(1, 2))),
+                    genre=rng.choice(["", "", *GENRES]),
+                    available=rng.choice([None, True]), limit=20) for _ in range(300)]
+    pick_query, pick_member = _zipf(rng, len(queries)), _zipf(rng, len(member_ids))
+    requests = []
+    for i in range(n):
+        if i % 10 == 9:
+            requests.append(("circulate", member_ids[pick_member()], rng.choice(book_ids)))
+        elif i % 2:
+            requests.append(("search", queries[pick_query()]))
+        else:
+            requests.append(("recommend", member_ids[pick_member()]))
+    return requests
+
+
+def run(requests, check=False, timings=None):
+    mismatches = 0
+    start = time.perf_counter()
+    for request in requests:
+        if request[0] in ("search", "recommend"):
+            cache = lib.search_cache if request[0] == "search" else lib.recommend_cache
+            hits, began = cache.hits, time.perf_counter()
+            if request[0] == "search":
+                result = lib.search_catalog(**request[1])
+            else:
+                result = lib.recommend_books(member_id=request[1])
+            if timings is not None:
+                timings.setdefault((request[0], cache.hits > hits), []).append(time.perf_counter() - began)
+            if check:
+                function, kwargs = ((lib.search_catalog, request[1]) if request[0] == "search"
+                                    else (lib.recommend_books, {"member_id": request[1]}))
+                mismatches += _uncached(function, **kwargs) != result
+        else:
+            _, member_id, book_id = request
+            for action in ("borrow", "return"):
+                try:
+                    lib.check_in_out_operations(member_id, book_id, action)
+                    break
+                except ValueError:
+                    pass  # no copies left / already borrowed, or nothing to return
+    return len(requests) / (time.perf_counter() - start), mismatches
+
+
+def _uncached(function, **kwargs):
+    caches = lib.search_cache, lib.recommend_cache
+    lib.search_cache = lib.recommend_cache = ResultCache(lib.versions, maxsize=0)
+    try:
+        return function(**kwargs)
+    finally:
+        lib.search_cache, lib.recommend_cache = caches
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    n_books = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    print(f"{n:,} requests (45% search, 45% recommend, 10% borrow / return), {n_books:,} books")
+    caches = lib.search_cache, lib.recommend_cache
+    for co_borrow_weight in (0.0, 1.0):
+        print(f"co_borrow_weight = {co_borrow_weight}")
+        lib.recommender.co_borrow_weight = co_borrow_weight
+        for cached in (False, True):
+            rng = populate(n_books=n_books, n_members=10_000, n_loans=100_000)
+            member_ids, book_ids = rng.sample(list(lib.members), 2_000), list(lib.catalog.ids())
+            requests = make_requests(n, random.Random(5), member_ids, book_ids)
+            lib.search_cache = ResultCache(lib.versions, maxsize=4096 if cached else 0)
+            lib.recommend_cache = ResultCache(lib.versions, maxsize=4096 if cached else 0)
+            lib.search_catalog("warm up")  # first reads apply queued index work
+            lib.recommend_books(member_id=member_ids[0])
+            timings = {}
+            rate, _ = run(requests, timings=timings)
+            print(f"  {'cached' if cached else 'uncached':<9} {rate:10,.0f} requests/s")
+        for name, stats in lib.cache_stats().items():
+            hit, miss = (timings.get((name, h), [0]) for h in (True, False))
+            print(f"  {name:<9} hit rate {stats['hit_rate']:.0%}, {stats['invalidations']:,} invalidated, "
+                  f"{stats['evictions']:,} evicted; hit {sum(hit) / len(hit) * 1e6:,.0f} us, "
+                  f"miss {sum(miss) / len(miss) * 1e6:,.0f} us")
+
+        # Replay a slice with every cached answer checked against a recomputation
+        _, mismatches = run(make_requests(1_000, random.Random(6), member_ids, book_ids), check=True)
+        print(f"  stale results: {mismatches}")
+    lib.recommender.co_borrow_weight = 0.0
+    lib.search_cache, lib.recommend_cache = caches
+
+
+if __name__ == "__main__":
+    main()
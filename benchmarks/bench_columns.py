@@ -0,0 +1,60 @@
+"""
+Loan fines and reports: row-by-row Python vs. the NumPy columnar path.
+
+Checks that LoanColumns gives the same borrowing report and overdue fees as
+generate_borrowing_report() and automated_overdue_notifications(), then
+times both. Needs NumPy.
+
+Usage: python benchmarks/bench_columns.py [n_loans]
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+from benchmarks.datagen import populate
+
+
+def main():
+    n_loans = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    populate(n_books=5000, n_members=2000, n_loans=n_loans)
+    now = datetime.today()
+
+    start = time.perf_counter()
+    expected = lib.generate_borrowing_report()
+    pure_report = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns = lib.loan_columns()
+    encode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    report = columns.borrowing_report(now=now)
+    vector_report = time.perf_counter() - start
+    assert report == expected, "columnar report differs from generate_borrowing_report()"
+
+    start = time.perf_counter()
+    notices = lib.automated_overdue_notifications()
+    pure_overdue = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rows, days, fees = columns.overdue()
+    vector_overdue = time.perf_counter() - start
+    assert [round(f, 2) for f in fees.tolist()] == [m["fee"] for m in notices["messages"]]
+    print("columnar results match the pure-Python functions: OK")
+
+    print(f"loans: {len(lib.loans):,}")
+    print(f"generate_borrowing_report:        {pure_report * 1e3:9.1f} ms")
+    print(f"LoanColumns.from_records (once):  {encode * 1e3:9.1f} ms")
+    print(f"LoanColumns.borrowing_report:     {vector_report * 1e3:9.1f} ms")
+    print(f"automated_overdue_notifications:  {pure_overdue * 1e3:9.1f} ms")
+    print(f"LoanColumns.overdue:              {vector_overdue * 1e3:9.1f} ms")
+    print("top books:", columns.top_books(3))
+
+
+if __name__ == "__main__":
+    main()
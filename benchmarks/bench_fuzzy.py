@@ -0,0 +1,161 @@
+"""
+Fuzzy search: latency and recall of misspelled queries, by catalog size.
+
+Generates titles and authors from a synthetic vocabulary (pronounceable
+words, Zipf-distributed, growing with the square root of the catalog as
+real vocabularies roughly do), indexes them in a TextIndex with a
+FuzzyIndex attached, and turns random title / author words into queries with one
+typo (a dropped, added, changed or swapped letter). Compares exact and
+fuzzy ranking (as search_catalog() does it) for each query:
+
+- recall@10: share of the correctly spelled query's top 10 that the
+  misspelled query returns in its top 10;
+- latency p50 / p99, against the exact search of the correctly spelled
+  query, and of the vocabulary lookup alone against a scan of the whole
+  vocabulary with edit_distance().
+
+Usage: python benchmarks/bench_fuzzy.py [sizes, comma-separated] [n_queries]
+"""
+
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.fuzzy_index import FuzzyIndex, edit_distance, max_typos
+from src.text_index import TextIndex
+from src.utils import tokenize
+from benchmarks.datagen import zipf_sampler
+
+ONSETS = ["b", "c", "d", "f", "g", "h", "k", "l", "m", "n", "p", "r", "s", "t", "v", "w",
+          "br", "ch", "cl", "dr", "gr", "pl", "sh", "st", "th", "tr"]
+VOWELS = ["a", "e", "i", "o", "u", "ai", "ea", "ou"]
+CODAS = ["", "", "", "n", "r", "s", "l", "nd", "rk", "st"]
+
+
+def make_words(n, rng):
+    """n distinct pronounceable words of 4 to 12 letters."""
+    words = set()
+    while len(words) < n:
+        word = "".join(rng.choice(ONSETS) + rng.choice(VOWELS) for _ in range(rng.randint(2, 3)))
+        word += rng.choice(CODAS)
+        if 4 <= len(word) <= 12:
+            words.add(word)
+    return sorted(words)
+
+
+def make_books(n_books, rng):
+    scale = math.sqrt(n_books)
+    title_word = zipf_sampler(make_words(max(2000, int(40 * scale)), rng), rng, s=0.9)
+    first = make_words(500, rng)
+    last = make_words(max(500, int(20 * scale)), rng)
+    return [
+        {
+            "id": f"{1000000000 + i}",
+            "title": " ".join(title_word() for _ in range(rng.randint(1, 4))).title(),
+            "author": f"{rng.choice(first)} {rng.choice(last)}".title(),
+        }
+        for i in range(n_books)
+    ]
+
+
+def typo(word, rng):
+    i = rng.randrange(len(word) - 1)
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return rng.choice((
+        word[:i] + word[i + 1:],                            # dropped
+        word[:i] + letter + word[i:],                       # added
+        word[:i] + letter + word[i + 1:],                   # changed
+        word[:i] + word[i + 1] + word[i] + word[i + 2:],    # swapped
+    ))
+
+
+def make_queries(books, n_queries, rng):
+    """(correct, misspelled) token lists: one or two words of a title or author, one of them misspelled."""
+    queries = []
+    while len(queries) < n_queries:
+        book = rng.choice(books)
+        words = tokenize(book[rng.choice(("title", "author"))])
+        words = words[:rng.randint(1, 2)]
+        eligible = [i for i, w in enumerate(words) if max_typos(w)]
+        if not eligible:
+            continue
+        i = rng.choice(eligible)
+        wrong = typo(words[i], rng)
+        if wrong != words[i] and max_typos(wrong):
+            queries.append((words, words[:i] + [wrong] + words[i + 1:]))
+    return queries
+
+
+def ranked(index, fuzzy, tokens, position):
+    if fuzzy is None:
+        hits = index.search(tokens) or []
+        return [bid for bid, _ in sorted(hits, key=lambda hit: (-hit[1], position[hit[0]]))]
+    hits = index.fuzzy_search(tokens, fuzzy) or []
+    return [bid for bid, _, _ in sorted(hits, key=lambda hit: (hit[1], -hit[2], position[hit[0]]))]
+
+
+def quantiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def scan_vocabulary(vocabulary, word):
+    limit = max_typos(word)
+    return [term for term in vocabulary if edit_distance(word, term, limit) <= limit]
+
+
+def run(n_books, n_queries, rng):
+    books = make_books(n_books, rng)
+    index, fuzzy = TextIndex(), FuzzyIndex()
+    index.set_vocabulary(fuzzy)
+    start = time.perf_counter()
+    for book in books:
+        index.add(book["id"], book)
+    build = time.perf_counter() - start
+    position = {book["id"]: i for i, book in enumerate(books)}
+    vocabulary = list(fuzzy._terms)
+
+    rows = {"exact, correct spelling": [], "exact, misspelled": [], "fuzzy, misspelled": [], "similar(word)": []}
+    recall = {"exact": 0.0, "fuzzy": 0.0}
+    for right, wrong in make_queries(books, n_queries, rng):
+        expected, seconds = timed(ranked, index, None, right, position)
+        expected = expected[:10]
+        rows["exact, correct spelling"].append(seconds)
+        exact, seconds = timed(ranked, index, None, wrong, position)
+        rows["exact, misspelled"].append(seconds)
+        found, seconds = timed(ranked, index, fuzzy, wrong, position)
+        rows["fuzzy, misspelled"].append(seconds)
+        for word in wrong:
+            rows["similar(word)"].append(timed(fuzzy.similar, word)[1])
+        recall["exact"] += len(set(exact[:10]) & set(expected)) / len(expected)
+        recall["fuzzy"] += len(set(found[:10]) & set(expected)) / len(expected)
+    words = [w for _, wrong in make_queries(books, 20, rng) for w in wrong]
+    rows["scan of vocabulary"] = [timed(scan_vocabulary, vocabulary, w)[1] for w in words]
+
+    print(f"{n_books:,} titles, {len(fuzzy):,} distinct terms, indexed in {build:.1f} s; {n_queries:,} misspelled queries")
+    print(f"  recall@10   exact {recall['exact'] / n_queries:6.1%}   fuzzy {recall['fuzzy'] / n_queries:6.1%}")
+    print(f"  {'operation':30} {'p50':>9} {'p99':>9}")
+    for name, samples in rows.items():
+        p50, p99 = quantiles(samples)
+        print(f"  {name:30} {p50 * 1e6:7.0f}us {p99 * 1e6:7.0f}us")
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [100_000, 1_000_000]
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    for n_books in sizes:
+        run(n_books, n_queries, random.Random(11))
+
+
+if __name__ == "__main__":
+    main()
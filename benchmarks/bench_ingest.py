@@ -0,0 +1,114 @@
+"""
+Bulk catalog ingest: load_catalog() vs. one Book(...) per row.
+
+Writes a generated feed (ISBN-13 ids, about 1% bad ids, missing titles
+or duplicates) as CSV, JSONL and MARC-lite, loads each into an empty
+catalog and reports rows/s and the rejection counts. The Book() baseline
+reads the same CSV and creates one Book per row, then sets its tags
+(catalog.append per book, each index updated per insert and per edit).
+
+Usage: python benchmarks/bench_ingest.py [n_rows] [workers]
+"""
+
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+from src.book_class import Book
+from src.ingest import load_catalog
+from benchmarks.datagen import GENRES, WORDS
+
+
+def _isbn13(n):
+    body = f"978{n:09d}"
+    check = (10 - sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(body)) % 10) % 10
+    return body + str(check)
+
+
+def make_rows(n, rng):
+    rows = []
+    for i in range(n):
+        row = {"id": _isbn13(i), "title": " ".join(rng.sample(WORDS, rng.randint(1, 4))).title(),
+               "author": f"Author {rng.randrange(max(1, n // 20))}", "genre": rng.choice(GENRES),
+               "tags": ";".join(rng.sample(GENRES, 2)), "copies_total": rng.randint(1, 5)}
+        fault = rng.random()
+        if fault < 0.004:
+            row["id"] = row["id"][:-1] + str((int(row["id"][-1]) + 1) % 10)  # bad checksum
+        elif fault < 0.007:
+            row["title"] = ""
+        elif fault < 0.010 and rows:
+            row["id"] = rng.choice(rows)["id"]
+        rows.append(row)
+    return rows
+
+
+def write_feeds(rows, directory):
+    paths = {}
+    paths["csv"] = os.path.join(directory, "feed.csv")
+    with open(paths["csv"], "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    paths["jsonl"] = os.path.join(directory, "feed.jsonl")
+    with open(paths["jsonl"], "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+    paths["marc"] = os.path.join(directory, "feed.mrk")
+    with open(paths["marc"], "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(f"=020  \\\\$a{row['id']}\n=245  10$a{row['title']}\n=100  1\\$a{row['author']}\n"
+                    f"=655  \\7$a{row['genre']}\n")
+            for tag in row["tags"].split(";"):
+                f.write(f"=650  \\0$a{tag}\n")
+            f.write(f"=852  \\\\$a{row['copies_total']}\n\n")
+    return paths
+
+
+def _book_per_row(path):
+    # The way a feed is loaded without the bulk loader: read a row, Book(...), then set its tags
+    start = time.perf_counter()
+    rows = 0
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            rows += 1
+            try:
+                if not lib.catalog.has(row["id"]):
+                    Book(row["id"], row["title"], row["author"], row["genre"], int(row["copies_total"]))
+                    lib.catalog.get(row["id"])["tags"] = set(row["tags"].split(";"))
+            except ValueError:
+                pass
+    return rows / (time.perf_counter() - start)
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else min(4, os.cpu_count() or 1)
+    rows = make_rows(n_rows, random.Random(14))
+    directory = tempfile.mkdtemp(prefix="library-feed-")
+    try:
+        paths = write_feeds(rows, directory)
+        lib.catalog.clear()
+        print(f"{n_rows:,} rows")
+        print(f"  Book() per row, csv:          {_book_per_row(paths['csv']):10,.0f} rows/s")
+        for fmt, path in paths.items():
+            for w in (0, workers) if workers > 1 else (0,):
+                lib.catalog.clear()
+                report = load_catalog(path, workers=w)
+                assert report["loaded"] == len(lib.catalog)
+                label = f"load_catalog {fmt}, {w} workers:"
+                print(f"  {label:<30}{report['rows_per_sec']:10,.0f} rows/s   "
+                      f"loaded {report['loaded']:,}  rejected {report['reasons']}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
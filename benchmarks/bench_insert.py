@@ -0,0 +1,70 @@
+"""
+Single inserts: Book(...) into a catalog of n books, and each catalog index's share.
+
+Loads n generated books with catalog.bulk_extend(), then creates new
+books one at a time with Book(...), the way the front desk adds them,
+and reports the mean, p50 and p99 time per Book() call. The same insert is then
+timed per registered catalog index (index.add(book_id, record) alone),
+to show which index an insert spends its time in.
+
+Usage: python benchmarks/bench_insert.py [sizes, comma-separated] [n_inserts]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+from src.book_class import Book
+from benchmarks.datagen import GENRES, WORDS, make_catalog
+
+
+def quantiles(samples):
+    """Mean, p50 and p99."""
+    mean = sum(samples) / len(samples)
+    samples = sorted(samples)
+    return mean, samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+def run(n_books, n_inserts, rng):
+    lib.catalog.clear()
+    lib.catalog.bulk_extend(make_catalog(n_books, rng))
+    new = [(f"{2000000000 + i}", " ".join(rng.sample(WORDS, rng.randint(1, 4))).title(),
+            f"Author {rng.randrange(max(1, n_books // 20))}", rng.choice(GENRES)) for i in range(n_inserts)]
+
+    samples = []
+    for args in new:
+        start = time.perf_counter()
+        Book(*args)
+        samples.append(time.perf_counter() - start)
+
+    # The same books again, into each index on its own (removed first, re-added timed)
+    per_index = {}
+    for index in lib.catalog._indexes:
+        times = per_index.setdefault(type(index).__name__, [])
+        for book_id, *_ in new:
+            record = lib.catalog.get(book_id)
+            index.discard(book_id)
+            start = time.perf_counter()
+            index.add(book_id, record)
+            times.append(time.perf_counter() - start)
+
+    print(f"{n_books:,} books in the catalog, {n_inserts:,} single inserts")
+    print(f"  {'operation':30} {'mean':>9} {'p50':>9} {'p99':>9}")
+    for name, times in [("Book(...)", samples)] + [(f"  {name}.add", times) for name, times in per_index.items()]:
+        mean, p50, p99 = quantiles(times)
+        print(f"  {name:30} {mean * 1e6:7.0f}us {p50 * 1e6:7.0f}us {p99 * 1e6:7.0f}us")
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10_000, 100_000]
+    n_inserts = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    for n_books in sizes:
+        run(n_books, n_inserts, random.Random(7))
+
+
+if __name__ == "__main__":
+    main()
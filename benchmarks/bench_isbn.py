@@ -0,0 +1,75 @@
+"""
+Code validation: validate_codes() vs. validate_code() one string at a time.
+
+Generates a mix of hyphenated and plain ISBN-13s, ISBN-10s (some with an X
+check digit) and library IDs, about 2% of them with a wrong check digit,
+then validates the batch with the scalar function in a loop and with
+validate_codes(). Checks that both agree and that every ISBN-10 maps to
+the ISBN-13 of the same book, and reports codes/s.
+
+Usage: python benchmarks/bench_isbn.py [n_codes]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+
+
+def _isbn10(body):
+    check = (11 - sum(int(d) * w for d, w in zip(body, range(10, 1, -1))) % 11) % 11
+    return body + ("X" if check == 10 else str(check))
+
+
+def _isbn13(body):
+    check = (10 - sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(body)) % 10) % 10
+    return body + str(check)
+
+
+def make_codes(n, rng):
+    codes, pairs = [], []
+    for i in range(n):
+        body = f"{rng.randrange(10**8):08d}"
+        kind = i % 4
+        if kind == 0:
+            code = _isbn13("9780" + body)
+            code = f"{code[:3]}-{code[3]}-{code[4:8]}-{code[8:12]}-{code[12]}"
+        elif kind == 1:
+            code = _isbn13("9791" + body)
+        elif kind == 2:
+            code = _isbn10("0" + body)
+            pairs.append((len(codes), _isbn13("9780" + body)))
+        else:
+            code = f"{1000000000 + rng.randrange(10**9)}"
+        if rng.random() < 0.02 and kind != 3:
+            code = code[:-1] + str((int(code[-1]) + 1) % 10 if code[-1] != "X" else 0)
+        codes.append(code)
+    return codes, pairs
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    codes, pairs = make_codes(n, random.Random(11))
+
+    start = time.perf_counter()
+    expected = [lib.validate_code(code) for code in codes]
+    scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    valid, isbn13 = lib.validate_codes(codes)
+    batch = time.perf_counter() - start
+
+    assert valid == expected
+    for i, canonical in pairs:
+        assert isbn13[i] == (canonical if valid[i] else None), (codes[i], isbn13[i], canonical)
+    print(f"{n:,} codes, {sum(valid):,} valid, {sum(1 for c in isbn13 if c):,} with an ISBN-13")
+    print(f"  validate_code() loop  {n / scalar:12,.0f} codes/s")
+    print(f"  validate_codes()      {n / batch:12,.0f} codes/s   ({scalar / batch:.1f}x, results match)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Memory per record: plain dicts vs. the compact record types.
+
+Generates books, members and loans as plain dicts (the layout the catalog,
+members table and loan ledger used to keep), then converts a second copy
+into BookRecord / MemberRecord / LoanRecord and lets the dicts go. Both
+sides are measured with tracemalloc, values included, so interned strings
+and shared tag sets count in the "after" column.
+
+Usage: python benchmarks/bench_memory.py [n_books] [n_members] [n_loans]
+"""
+
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.records import BookRecord, LoanRecord
+from benchmarks.datagen import make_catalog, make_loans, make_members
+
+
+def _retained(build):
+    """Bytes still allocated after build() returns, while its result is alive."""
+    gc.collect()
+    start = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - start
+    del result
+    gc.collect()
+    return size
+
+
+def _books(n, compact):
+    rng = random.Random(1)
+    books = make_catalog(n, rng)  # a new author string and tag set per book, as if read from a file
+    return [BookRecord(b) for b in books] if compact else books
+
+
+def _members(n, compact):
+    members = make_members(n)
+    if compact:
+        return members
+    return {member_id: dict(record) for member_id, record in members.items()}
+
+
+def _loans(n, n_books, n_members, compact):
+    rng = random.Random(2)
+    book_ids = [f"{1000000000 + i}" for i in range(n_books)]
+    member_ids = [f"M{i}" for i in range(n_members)]
+    loans = make_loans(n, book_ids, member_ids, rng)
+    for loan in loans:
+        loan["member_id"] = f"M{loan['member_id'][1:]}"  # ids parsed per row, not shared
+        loan["book_id"] = f"{loan['book_id']}"
+    return [LoanRecord(r) for r in loans] if compact else loans
+
+
+def main():
+    n_books = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    n_members = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    n_loans = int(sys.argv[3]) if len(sys.argv) > 3 else 500_000
+    tracemalloc.start()
+    cases = [
+        ("book", n_books, lambda compact: _books(n_books, compact)),
+        ("member", n_members, lambda compact: _members(n_members, compact)),
+        ("loan", n_loans, lambda compact: _loans(n_loans, n_books, n_members, compact)),
+    ]
+    print(f"{'':8}{'dicts':>14}{'records':>14}{'saved':>8}")
+    for name, n, build in cases:
+        before = _retained(lambda: build(False)) / n
+        after = _retained(lambda: build(True)) / n
+        print(f"{name:<8}{before:10,.0f} B/rec{after:10,.0f} B/rec{1 - after / before:8.0%}")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Instrumentation: the cost of enable_metrics() on a mixed workload.
+
+Runs the same mix of searches, borrow / return pairs, due-date and code
+checks and recommendations with the library functions as they are, after
+enable_metrics() (and disable_metrics(), which must cost nothing), and with
+slow-call profiling switched on. Checks the call counts add up, then
+prints the per-function latency quantiles and writes the Prometheus text
+file.
+
+Usage: python benchmarks/bench_metrics.py [n_rounds]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+from benchmarks.datagen import WORDS, populate
+
+
+def workload(n, member_ids, book_ids):
+    start = time.perf_counter()
+    for i in range(n):
+        member_id, book_id = member_ids[i % len(member_ids)], book_ids[i % len(book_ids)]
+        lib.search_catalog(WORDS[i % len(WORDS)], available=True, limit=10)
+        lib.check_in_out_operations(member_id, book_id, "borrow")
+        lib.check_in_out_operations(member_id, book_id, "return")
+        lib.calculate_due_date(datetime(2025, 1, 1 + i % 28))
+        lib.validate_code(book_id)
+        if i % 10 == 0:
+            lib.recommend_books(member_id=member_id)
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    populate(n_books=5000, n_members=1000, n_loans=50_000)
+    for book in lib.catalog:
+        book["copies_available"] = 3
+    member_ids, book_ids = list(lib.members), [b["id"] for b in lib.catalog]
+    workload(n // 10, member_ids, book_ids)  # warm the caches and the title order
+
+    plain = workload(n, member_ids, book_ids)
+    lib.enable_metrics()
+    measured = workload(n, member_ids, book_ids)
+    lib.disable_metrics()
+    after = workload(n, member_ids, book_ids)
+    directory = tempfile.mkdtemp(prefix="library-profiles-")
+    lib.metrics.reset()
+    lib.enable_metrics(profile_slow=0.005, profile_dir=directory, profile_every=10)
+    profiled = workload(n, member_ids, book_ids)
+    lib.disable_metrics()
+
+    snapshot = lib.metrics.snapshot()
+    assert snapshot["search_catalog"]["calls"] == n
+    assert snapshot["check_in_out_operations"]["calls"] == 2 * n
+    print(f"{n:,} rounds (search, borrow, return, due date, code check; a recommendation every 10th)")
+    print(f"  uninstrumented       {plain:7.2f} s")
+    print(f"  enable_metrics()     {measured:7.2f} s   ({(measured / plain - 1) * 100:+.0f}%)")
+    print(f"  disable_metrics()    {after:7.2f} s")
+    print(f"  + slow-call profiles {profiled:7.2f} s   ({len(os.listdir(directory))} profiles kept)")
+    print(f"  {'function':34} {'calls':>8} {'p50':>9} {'p95':>9} {'p99':>9}  rows scanned")
+    for name, s in sorted(snapshot.items(), key=lambda item: -item[1]["total_s"])[:8]:
+        print(f"  {name:34} {s['calls']:8,} {s['p50_s'] * 1e6:7.0f}us {s['p95_s'] * 1e6:7.0f}us "
+              f"{s['p99_s'] * 1e6:7.0f}us  {s['scanned']}")
+    path = os.path.join(directory, "library.prom")
+    lib.metrics.write_prometheus(path)
+    print(f"Prometheus text: {path} ({os.path.getsize(path):,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
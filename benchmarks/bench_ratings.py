@@ -0,0 +1,115 @@
+"""
+Ratings: running aggregates and the top-rated index vs. re-summing and sorting.
+
+Casts votes from a Zipf-like mix of books (popular books collect thousands
+of ratings, about a third of the votes change a member's earlier rating),
+first the way rate_book() used to (rebuild the book's rating list and
+re-sum it on every vote), then the same bare loop with RatingIndex.vote()
+instead of the re-sum, then through rate_book() itself (locks, journal
+and event included, so it is slower than either bare loop).
+Then answers "highest rated in genre X" by sorting the whole catalog and
+with top_rated_books(), by average and by Bayesian average. Checks that
+the averages and the top lists agree and reports votes/s and queries/s.
+
+Usage: python benchmarks/bench_ratings.py [n_votes] [n_books]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+from src.rating_index import RatingIndex
+from benchmarks.datagen import GENRES, populate
+
+
+def make_votes(n, rng, book_ids, member_ids):
+    weights = [1 / (i + 1) ** 1.1 for i in range(len(book_ids))]
+    books = rng.choices(book_ids, weights, k=n)
+    return [(rng.choice(member_ids[:n // 3 or 1]), b, rng.randint(1, 5)) for b in books]
+
+
+def resum_votes(votes):
+    ratings, averages = {}, {}
+    for member_id, book_id, rating in votes:
+        book_ratings = ratings.setdefault(book_id, {})
+        book_ratings[member_id] = rating
+        values = [r for r in book_ratings.values()]
+        averages[book_id] = round(sum(values) / len(values), 2)
+    return ratings, averages
+
+
+def index_votes(votes):
+    index = RatingIndex()
+    index.add_many((book_id, lib.catalog.get(book_id)) for book_id in lib.catalog.ids())
+    ratings, averages = {}, {}
+    start = time.perf_counter()
+    for member_id, book_id, rating in votes:
+        book_ratings = ratings.setdefault(book_id, {})
+        previous = book_ratings.get(member_id)
+        book_ratings[member_id] = rating
+        total, count = index.vote(book_id, rating, previous)
+        averages[book_id] = round(total / count, 2)
+    return time.perf_counter() - start, averages
+
+
+def sorted_top(ratings, genre, n, bayesian, min_votes=1):
+    prior, weight = lib.rating_index.prior_mean, lib.rating_index.prior_weight
+    scored = []
+    for book in lib.catalog:
+        votes = ratings.get(book["id"])
+        if not votes or len(votes) < min_votes or (book.get("genre") or "").strip().lower() != genre.lower():
+            continue
+        total, count = sum(votes.values()), len(votes)
+        score = (weight * prior + total) / (weight + count) if bayesian else total / count
+        scored.append((-score, -count, book["id"]))
+    scored.sort()
+    return [(book_id, round(-score, 2)) for score, _, book_id in scored[:n]]
+
+
+def main():
+    n_votes = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    n_books = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    rng = populate(n_books=n_books, n_members=20_000, n_loans=0)
+    lib.ratings.clear()
+    lib.average_ratings.clear()
+    lib.rating_index.rebuild(lib.ratings)
+    votes = make_votes(n_votes, rng, list(lib.catalog.ids()), list(lib.members))
+
+    start = time.perf_counter()
+    ratings, averages = resum_votes(votes)
+    resum = time.perf_counter() - start
+
+    running, running_averages = index_votes(votes)
+
+    start = time.perf_counter()
+    for member_id, book_id, rating in votes:
+        lib.rate_book(member_id, book_id, rating)
+    incremental = time.perf_counter() - start
+
+    assert lib.ratings == ratings and lib.average_ratings == averages == running_averages
+    print(f"{n_votes:,} votes on {len(ratings):,} books (most rated: {max(map(len, ratings.values())):,} ratings)")
+    print(f"  re-sum per vote        {n_votes / resum:12,.0f} votes/s")
+    print(f"  RatingIndex.vote()     {n_votes / running:12,.0f} votes/s   ({resum / running:.1f}x, averages match)")
+    print(f"  rate_book()            {n_votes / incremental:12,.0f} votes/s   (locks, journal and event included)")
+
+    for bayesian in (False, True):
+        start = time.perf_counter()
+        expected = [sorted_top(ratings, genre, 10, bayesian) for genre in GENRES]
+        scan = (time.perf_counter() - start) / len(GENRES)
+
+        start = time.perf_counter()
+        for _ in range(100):
+            got = [lib.top_rated_books(10, genre, bayesian) for genre in GENRES]
+        indexed = (time.perf_counter() - start) / (100 * len(GENRES))
+
+        assert got == expected
+        label = "Bayesian" if bayesian else "average"
+        print(f"  top 10 by {label:<8}  sort {scan * 1e3:8.2f} ms   top_rated_books() {indexed * 1e6:7.1f} us   (lists match)")
+    print("sample:", lib.top_rated_books(3, GENRES[0], bayesian=True, min_votes=5))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Recommendations: indexed recommender vs. the full catalog scan.
+
+Checks that recommend_books(mode="indexed") with the default weights
+returns what mode="scan" returns, then times both modes (with co-borrow
+similarity switched on for the indexed one).
+
+Usage: python benchmarks/bench_recommend.py [n_books]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+from benchmarks.datagen import GENRES, populate
+
+
+def main():
+    n_books = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    start = time.perf_counter()
+    rng = populate(n_books=n_books, n_members=20_000, n_loans=200_000)
+    lib.recommend_cache.maxsize = 0  # time the recommender itself, not the result cache
+    print(f"populate ({n_books:,} books, {len(lib.loans):,} loans): {time.perf_counter() - start:.1f} s")
+
+    member_ids = rng.sample(list(lib.members), 20)
+    for member_id in member_ids:
+        lib.members[member_id]["preferences_tags"] = set(rng.sample(GENRES, 1))
+        lib.members[member_id]["preferences_authors"] = {f"Author {rng.randrange(n_books // 20)}"}
+        lib.members[member_id]["loans"] = {}
+
+    for member_id in member_ids[:3]:
+        expected = lib.recommend_books(member_id=member_id, mode="scan")
+        assert lib.recommend_books(member_id=member_id) == expected, member_id
+    print("indexed results match the catalog scan: OK")
+
+    weight = lib.recommender.co_borrow_weight
+    lib.recommender.co_borrow_weight = 1.0
+
+    lib.recommend_books(member_id=member_ids[0])  # first read applies the queued title order
+    start = time.perf_counter()
+    for member_id in member_ids:
+        lib.recommend_books(member_id=member_id)
+    indexed = (time.perf_counter() - start) / len(member_ids)
+
+    start = time.perf_counter()
+    for member_id in member_ids[:3]:
+        lib.recommend_books(member_id=member_id, mode="scan")
+    scan = (time.perf_counter() - start) / 3
+
+    print(f"recommend_books(mode='scan'):     {scan * 1e3:9.1f} ms")
+    print(f"recommend_books(mode='indexed'):  {indexed * 1e3:9.1f} ms")
+    print("sample:", lib.recommend_books(member_id=member_ids[0], limit=5))
+    lib.recommender.co_borrow_weight = weight
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Borrowing report: batch scan vs. materialized aggregates.
+
+Checks that live_borrowing_report() returns exactly what
+generate_borrowing_report() computes while loans are created, returned and
+edited, then times both. tests/test_borrowing_report.py runs the same
+check with checkouts, bulk loads and member / book edits as well.
+
+Usage: python benchmarks/bench_reports.py [n_loans]
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+from benchmarks.datagen import populate
+
+
+def check_consistency(rng, rounds=200):
+    for step in range(rounds):
+        record = rng.choice(lib.loans)
+        action = rng.random()
+        if action < 0.4:
+            record["returned"] = not record.get("returned")
+        elif action < 0.6:
+            record["due_date"] = datetime.now() + timedelta(days=rng.randint(-60, 20), hours=rng.randrange(24))
+        elif action < 0.7:
+            record["return_date"] = None if record.get("return_date") else datetime.now()
+        elif action < 0.8:
+            lib.loans.remove(record)
+        else:
+            lib.loans.append({"member_id": rng.choice(list(lib.members)), "book_id": record["book_id"],
+                              "borrow_date": datetime.now(), "due_date": datetime.now() - timedelta(days=3),
+                              "returned": False})
+        assert lib.live_borrowing_report() == lib.generate_borrowing_report(), f"full report differs at step {step}"
+
+    for days in (7, 30, 365):
+        cutoff = datetime.today().toordinal() - days + 1
+        everything = lib.loans
+        lib.loans = [r for r in everything if r.get("borrow_date") and r["borrow_date"].toordinal() >= cutoff]
+        try:
+            expected = lib.generate_borrowing_report()
+        finally:
+            lib.loans = everything
+        live = dict(lib.live_borrowing_report(window_days=days))
+        assert live.pop("window_days") == days
+        assert live == expected, f"{days}-day window differs"
+
+
+def main():
+    n_loans = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    rng = populate(n_books=2000, n_members=500, n_loans=n_loans)
+    check_consistency(rng)
+    print("live report matches generate_borrowing_report(): OK")
+
+    start = time.perf_counter()
+    for _ in range(10):
+        lib.generate_borrowing_report()
+    batch = (time.perf_counter() - start) / 10
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        lib.live_borrowing_report()
+    cached = (time.perf_counter() - start) / 1000
+
+    start = time.perf_counter()
+    for i in range(200):
+        lib.loans.append({"member_id": "M1", "book_id": lib.catalog[i]["id"], "borrow_date": datetime.now(),
+                          "due_date": datetime.now() + timedelta(days=14), "returned": False})
+        lib.live_borrowing_report()
+    after_write = (time.perf_counter() - start) / 200
+
+    print(f"loans: {len(lib.loans):,}")
+    print(f"generate_borrowing_report (batch):    {batch * 1e3:9.3f} ms")
+    print(f"live_borrowing_report (cached read):  {cached * 1e3:9.3f} ms")
+    print(f"live_borrowing_report (after a loan): {after_write * 1e3:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
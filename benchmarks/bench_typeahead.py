@@ -0,0 +1,99 @@
+"""
+Typeahead: PrefixIndex completions, updates and memory per million titles.
+
+Builds a PrefixIndex over n generated books (bulk load, as
+catalog.bulk_extend() does) with Zipfian loan counts, measured with
+tracemalloc. Then times top-10 completions for prefixes of 1 to 8
+characters cut from random titles and authors, against a scan of the
+normalized titles (what a substring search per keystroke costs), and
+the incremental operations: adding and removing a book, and a loan or
+stock change re-weighting one.
+
+Usage: python benchmarks/bench_typeahead.py [n_books] [n_queries]
+"""
+
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.prefix_index import PrefixIndex, completion_key
+from benchmarks.datagen import make_catalog, zipf_sampler
+
+
+def quantiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+def timed_each(function, args):
+    samples = []
+    for arg in args:
+        start = time.perf_counter()
+        function(arg)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    n_books = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    rng = random.Random(7)
+    books = make_catalog(n_books, rng)
+    items = [(b["id"], b) for b in books]
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = PrefixIndex()
+    index.add_many(items)
+    build = time.perf_counter() - start
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    pick = zipf_sampler([b["id"] for b in books], rng)
+    for _ in range(n_books):
+        index.count(pick(), 1)
+
+    keys = [completion_key(b[rng.choice(("title", "author"))]) for b in rng.sample(books, n_queries)]
+    prefixes = [key[:rng.randint(1, 8)].rstrip() for key in keys]
+    prefixes = [p for p in prefixes if p]
+    index.complete(prefixes[0])  # warm up
+    samples = timed_each(index.complete, prefixes)
+    by_length = {}
+    for prefix, seconds in zip(prefixes, samples):
+        by_length.setdefault(min(len(prefix), 4), []).append(seconds)
+
+    titles = [completion_key(b["title"]) for b in books]
+    scan = timed_each(lambda p: [t for t in titles if p in t], prefixes[:20])
+
+    fresh = [(f"new-{b['id']}", dict(b, id=f"new-{b['id']}")) for b in rng.sample(books, 1000)]
+    adds = timed_each(lambda item: index.add(*item), fresh)
+    removes = timed_each(index.discard, [book_id for book_id, _ in fresh])
+    reweights = timed_each(lambda book_id: index.count(book_id, 1), [pick() for _ in range(10_000)])
+    stats = index.stats()
+
+    print(f"{n_books:,} books -> {stats['entries']:,} entries in runs {stats['runs']}, built in {build:.1f} s")
+    print(f"  memory {memory / 2**20:8.1f} MB   ({memory / n_books * 1e6 / 2**20:,.0f} MB per million titles, "
+          f"{memory / stats['entries']:.0f} bytes per entry)")
+    print(f"  {'operation':30} {'p50':>9} {'p99':>9}")
+    p50, p99 = quantiles(samples)
+    print(f"  {'complete(prefix, 10)':30} {p50 * 1e6:7.0f}us {p99 * 1e6:7.0f}us")
+    for length, values in sorted(by_length.items()):
+        p50, p99 = quantiles(values)
+        label = f"  prefix of {length}{'+' if length == 4 else ''} chars"
+        print(f"  {label:30} {p50 * 1e6:7.0f}us {p99 * 1e6:7.0f}us")
+    p50, p99 = quantiles(scan)
+    print(f"  {'substring scan of titles':30} {p50 * 1e6:7.0f}us {p99 * 1e6:7.0f}us")
+    for name, values in (("add(book)", adds), ("discard(book)", removes), ("count(book, 1)", reweights)):
+        p50, p99 = quantiles(values)
+        print(f"  {name:30} {p50 * 1e6:7.0f}us {p99 * 1e6:7.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Waitlists: Waitlist (deque + member hash) vs. the plain list it replaced.
+
+Builds one popular book's waitlist of n members, then runs the same mix
+against a list (`in`, append, pop(0), index(), remove()) and a Waitlist
+(append, popleft, position(), cancel()): duplicate-join checks, position
+lookups, cancellations and copies coming back in batches of 5. Checks
+that both end with the same queue and reports operations/s, then times
+the same mix through waitlist_management() / notify_waitlist().
+
+Usage: python benchmarks/bench_waitlist.py [n_members] [n_ops]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+from src.waitlist import Waitlist
+from benchmarks.datagen import populate
+
+
+def make_ops(n_ops, n_members, rng):
+    ops = []
+    for _ in range(n_ops):
+        member_id = f"M{rng.randrange(n_members * 2):06d}"
+        kind = rng.random()
+        if kind < 0.4:
+            ops.append(("add", member_id))
+        elif kind < 0.7:
+            ops.append(("position", member_id))
+        elif kind < 0.9:
+            ops.append(("cancel", member_id))
+        else:
+            ops.append(("notify", 5))
+    return ops
+
+
+def run_list(waitlist, ops):
+    for op, arg in ops:
+        if op == "add":
+            if arg not in waitlist:
+                waitlist.append(arg)
+        elif op == "position":
+            if arg in waitlist:
+                waitlist.index(arg)
+        elif op == "cancel":
+            if arg in waitlist:
+                waitlist.remove(arg)
+        else:
+            for _ in range(min(arg, len(waitlist))):
+                waitlist.pop(0)
+    return waitlist
+
+
+def run_waitlist(waitlist, ops):
+    for op, arg in ops:
+        if op == "add":
+            waitlist.append(arg)
+        elif op == "position":
+            waitlist.position(arg)
+        elif op == "cancel":
+            waitlist.cancel(arg)
+        else:
+            waitlist.pop_many(arg)
+    return waitlist
+
+
+def run_library(book_id, ops):
+    for op, arg in ops:
+        if op == "notify":
+            lib.notify_waitlist(book_id, arg)
+        else:
+            lib.waitlist_management(book_id, arg, op)
+
+
+def main():
+    n_members = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    n_ops = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    rng = random.Random(18)
+    initial = [f"M{i:06d}" for i in rng.sample(range(n_members * 2), n_members)]
+    ops = make_ops(n_ops, n_members, rng)
+
+    start = time.perf_counter()
+    expected = run_list(list(initial), ops)
+    plain = time.perf_counter() - start
+
+    start = time.perf_counter()
+    got = run_waitlist(Waitlist(initial), ops)
+    queued = time.perf_counter() - start
+
+    assert got == expected
+    print(f"waitlist of {n_members:,} members, {n_ops:,} operations, {len(got):,} left waiting")
+    print(f"  list          {n_ops / plain:12,.0f} ops/s")
+    print(f"  Waitlist      {n_ops / queued:12,.0f} ops/s   ({plain / queued:.0f}x, queues match)")
+
+    populate(n_books=10, n_members=0, n_loans=0)
+    lib.members.update((f"M{i:06d}", {"name": f"Member {i}"}) for i in range(n_members * 2))
+    book_id = lib.catalog[0]["id"]
+    lib.catalog.get(book_id)["copies_available"] = 0
+    lib.waitlists[book_id] = Waitlist(initial)
+    start = time.perf_counter()
+    run_library(book_id, ops)
+    library = time.perf_counter() - start
+    assert lib.waitlists[book_id] == expected
+    print(f"  waitlist_management() / notify_waitlist()  {n_ops / library:10,.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Synthetic data for the benchmark scripts.
+
+Fills the global structures in library_functions with generated books,
+members, loans and ratings so the scripts can run at sizes far beyond the
+demo data. With zipf=s, loans and ratings favour a few popular books
+(weight 1 / rank ** s) instead of spreading evenly over the catalog.
+"""
+
+import random
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from src import library_functions as lib
+from src.records import MemberRecord
+
+GENRES = ["fiction", "sci-fi", "fantasy", "mystery", "history", "programming", "poetry", "biography"]
+WORDS = ["data", "code", "ring", "dragon", "sea", "star", "clean", "war", "night", "garden",
+         "river", "empire", "ghost", "machine", "winter", "city", "secret", "storm", "light", "stone"]
+
+
+def make_catalog(n_books, rng):
+    """Return n_books catalog dicts with 10-character numeric ids."""
+    return [
+        {
+            "id": f"{1000000000 + i}",
+            "title": " ".join(rng.sample(WORDS, rng.randint(1, 4))).title(),
+            "author": f"Author {rng.randrange(max(1, n_books // 20))}",
+            "genre": rng.choice(GENRES),
+            "tags": set(rng.sample(GENRES, 2)),
+            "copies_total": 3,
+            "copies_available": rng.randint(0, 3),
+        }
+        for i in range(n_books)
+    ]
+
+
+def make_members(n_members):
+    return {
+        f"M{i}": MemberRecord({"name": f"Member {i}", "email": f"m{i}@example.com", "active": True,
+                               "balance": 0.0, "loans": {}})
+        for i in range(n_members)
+    }
+
+
+def zipf_sampler(items, rng, s=1.1):
+    """A function returning one of items, the i-th (0-based) with weight 1 / (i + 1) ** s."""
+    weights = list(accumulate(1 / (i + 1) ** s for i in range(len(items))))
+    total, last = weights[-1], len(items) - 1
+    return lambda: items[min(bisect(weights, rng.random() * total), last)]
+
+
+def _picker(items, rng, zipf):
+    return zipf_sampler(items, rng, zipf) if zipf else (lambda: rng.choice(items))
+
+
+def make_loans(n_loans, book_ids, member_ids, rng, start=datetime(2024, 1, 1), days=700, zipf=None):
+    """Loan records spread over `days` days; roughly 80% of them returned."""
+    pick_book = _picker(book_ids, rng, zipf)
+    loans = []
+    for _ in range(n_loans):
+        borrowed = start + timedelta(days=rng.randrange(days), hours=rng.randrange(24))
+        due = borrowed + timedelta(days=14)
+        record = {"member_id": rng.choice(member_ids), "book_id": pick_book(),
+                  "borrow_date": borrowed, "due_date": due, "returned": False}
+        if rng.random() < 0.8:
+            record["returned"] = True
+            record["return_date"] = borrowed + timedelta(days=rng.randrange(30))
+        loans.append(record)
+    return loans
+
+
+def make_ratings(n_ratings, book_ids, member_ids, rng, zipf=None):
+    """{book_id: {member_id: 1-5}} with up to n_ratings votes around a per-book quality."""
+    pick_book = _picker(book_ids, rng, zipf)
+    quality = {}
+    ratings = {}
+    for _ in range(n_ratings):
+        book_id = pick_book()
+        mean = quality.setdefault(book_id, rng.uniform(2.0, 4.5))
+        ratings.setdefault(book_id, {})[rng.choice(member_ids)] = min(5, max(1, round(rng.gauss(mean, 1.0))))
+    return ratings
+
+
+def populate(n_books=1000, n_members=200, n_loans=5000, seed=326, n_ratings=0, zipf=None):
+    """Replace the global catalog, members, loans and ratings with generated data."""
+    rng = random.Random(seed)
+    lib.catalog.clear()
+    lib.catalog.bulk_extend(make_catalog(n_books, rng))
+    lib.members.clear()
+    lib.members.update(make_members(n_members))
+    book_ids, member_ids = [b["id"] for b in lib.catalog], list(lib.members)
+    lib.loans.clear()
+    lib.loans.bulk_extend(make_loans(n_loans, book_ids, member_ids, rng, zipf=zipf))
+    lib.ratings.clear()
+    lib.ratings.update(make_ratings(n_ratings, book_ids, member_ids, rng, zipf=zipf))
+    lib.average_ratings.clear()
+    lib.average_ratings.update((b, round(sum(v.values()) / len(v), 2)) for b, v in lib.ratings.items())
+    with lib.catalog.lock:
+        lib.rating_index.rebuild(lib.ratings)
+    return rng
@@ -0,0 +1,277 @@
+"""
+Benchmark suite: the public library functions at several data scales.
+
+For each scale N it generates a library of N loans, N / 10 books, N / 20
+members and N / 10 ratings, with Zipfian popularity (a few books get
+most of the loans, votes and lookups). It then times
+search_catalog(), recommend_books(), check_in_out_operations(),
+automated_overdue_notifications(), generate_borrowing_report(),
+calculate_due_date(), rate_book() and validate_code(). The result caches
+are off, so every call does the work.
+
+Each function is called in batches until it has run for --min-time seconds
+and at least --samples batches. The median, p95 and best time per call
+and the calls/s are saved to a JSON file with the Python, NumPy, CPU and
+git details of the run.
+
+--compare reads two such files and lists every function / scale whose
+median time per call changed by more than --threshold (default 10%). It
+exits with status 1 if anything got slower.
+
+Usage: python benchmarks/suite.py [--scales 1e3,1e4,1e5] [--only name,...] [--out results.json]
+       python benchmarks/suite.py --compare baseline.json results.json [--threshold 0.10]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import library_functions as lib
+from benchmarks.bench_isbn import make_codes
+from benchmarks.datagen import GENRES, WORDS, populate, zipf_sampler
+
+ZIPF = 1.1
+TODAY = datetime(2026, 1, 1)
+
+
+# -------------------------------
+# Cases: each takes (scale, rng) and returns call(i), the i-th call of the function
+# -------------------------------
+def case_search_catalog(scale, rng):
+    pick_word, pick_genre = zipf_sampler(WORDS, rng, ZIPF), zipf_sampler(GENRES, rng, ZIPF)
+    queries = []
+    for i in range(1000):
+        kind = i % 4
+        if kind == 0:
+            queries.append({"query": pick_word()})
+        elif kind == 1:
+            queries.append({"query": f"{pick_word()} {pick_word()}", "limit": 20})
+        elif kind == 2:
+            queries.append({"query": pick_word(), "genre": pick_genre(), "available": True})
+        else:
+            queries.append({"author": f"Author {rng.randrange(max(1, len(lib.catalog) // 20))}"})
+    return lambda i: lib.search_catalog(**queries[i % len(queries)])
+
+
+def case_recommend_books(scale, rng):
+    pick_member = zipf_sampler(list(lib.members), rng, ZIPF)
+    member_ids = [pick_member() for _ in range(1000)]
+    return lambda i: lib.recommend_books(member_id=member_ids[i % len(member_ids)])
+
+
+def case_check_in_out_operations(scale, rng):
+    pick_member = zipf_sampler(list(lib.members), rng, ZIPF)
+    pick_book = zipf_sampler(list(lib.catalog.ids()), rng, ZIPF)
+    pairs = [(pick_member(), pick_book()) for _ in range(1000)]
+
+    def call(i):
+        # borrow, then return the same copy: the ledger and stock end where they started
+        member_id, book_id = pairs[i // 2 % len(pairs)]
+        return lib.check_in_out_operations(member_id, book_id, "return" if i % 2 else "borrow")
+    return call
+
+
+def case_automated_overdue_notifications(scale, rng):
+    return lambda i: lib.automated_overdue_notifications(today=TODAY)
+
+
+def case_generate_borrowing_report(scale, rng):
+    return lambda i: lib.generate_borrowing_report(0.5)
+
+
+def case_calculate_due_date(scale, rng):
+    dates = [datetime(2025, 1, 1) + timedelta(hours=rng.randrange(24 * 365)) for _ in range(1000)]
+    return lambda i: lib.calculate_due_date(dates[i % len(dates)], 14)
+
+
+def case_rate_book(scale, rng):
+    pick_member = zipf_sampler(list(lib.members), rng, ZIPF)
+    pick_book = zipf_sampler(list(lib.catalog.ids()), rng, ZIPF)
+    votes = [(pick_member(), pick_book(), rng.randint(1, 5)) for _ in range(1000)]
+    return lambda i: lib.rate_book(*votes[i % len(votes)])
+
+
+def case_validate_code(scale, rng):
+    codes, _ = make_codes(1000, rng)
+    return lambda i: lib.validate_code(codes[i % len(codes)])
+
+
+CASES = {name[len("case_"):]: case for name, case in globals().items() if name.startswith("case_")}
+
+
+# -------------------------------
+# Running
+# -------------------------------
+def build(scale, seed=326):
+    """Generate the library for one scale (the caches off, so calls are timed cold)."""
+    rng = populate(n_books=max(100, scale // 10), n_members=max(50, scale // 20), n_loans=scale,
+                   n_ratings=scale // 10, zipf=ZIPF, seed=seed)
+    pick_genre = zipf_sampler(GENRES, rng, ZIPF)
+    for member in lib.members.values():
+        member["preferences_tags"] = {pick_genre()}
+    for book in lib.catalog:
+        book["copies_available"] = book["copies_total"]
+    lib.search_cache.maxsize = 0
+    lib.recommend_cache.maxsize = 0
+    lib.clear_caches()
+    return rng
+
+
+def measure(call, min_time, min_samples):
+    """Per-call times: batches sized to take about 1 ms, run for min_time seconds and min_samples batches."""
+    start = time.perf_counter()
+    call(0)  # warm-up, and a first estimate of the batch size
+    first = time.perf_counter() - start
+    batch = max(1, min(10_000, int(0.001 / first) if first else 10_000))
+    batch += batch % 2  # keep stateful cases (borrow / return) in pairs
+    samples, i = [], 1
+    deadline = time.perf_counter() + min_time
+    while len(samples) < min_samples or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        for j in range(i, i + batch):
+            call(j)
+        samples.append((time.perf_counter() - start) / batch)
+        i += batch
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "calls": i - 1,
+        "samples": len(samples),
+        "median_s": median,
+        "p95_s": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_s": samples[0],
+        "mean_s": statistics.fmean(samples),
+        "ops_per_s": 1 / median if median else float("inf"),
+    }
+
+
+def run(scales, names, min_time, min_samples):
+    results = []
+    for scale in scales:
+        start = time.perf_counter()
+        build(scale)
+        print(f"scale {scale:,}: {len(lib.loans):,} loans, {len(lib.catalog):,} books, "
+              f"{len(lib.members):,} members, {sum(map(len, lib.ratings.values())):,} ratings "
+              f"({time.perf_counter() - start:.1f} s to generate)")
+        for name in names:
+            call = CASES[name](scale, random.Random(f"{name}/{scale}"))
+            result = {"name": name, "scale": scale, **measure(call, min_time, min_samples)}
+            results.append(result)
+            print(f"  {name:34} {_duration(result['median_s']):>10} /call  "
+                  f"p95 {_duration(result['p95_s']):>10}  {result['ops_per_s']:14,.1f} ops/s")
+    return results
+
+
+def environment():
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "numpy": numpy_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+    }
+
+
+# -------------------------------
+# Comparing
+# -------------------------------
+def compare(baseline, current, threshold):
+    """Rows (name, scale, old, new, ratio, verdict) for the function / scales in both runs."""
+    old = {(r["name"], r["scale"]): r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        key = (result["name"], result["scale"])
+        if key not in old:
+            continue
+        before, after = old[key]["median_s"], result["median_s"]
+        ratio = after / before if before else float("inf")
+        if ratio > 1 + threshold:
+            verdict = "REGRESSION"
+        elif ratio < 1 / (1 + threshold):
+            verdict = "faster"
+        else:
+            verdict = ""
+        rows.append((key[0], key[1], before, after, ratio, verdict))
+    return rows
+
+
+def _duration(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds * 1e9:.0f} ns"
+
+
+def _scale(text):
+    return int(float(text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the public library functions at several scales.")
+    parser.add_argument("--scales", default="1e3,1e4,1e5",
+                        help="comma-separated loan counts, e.g. 1e3,1e4,1e5,1e6,1e7 (default: %(default)s)")
+    parser.add_argument("--only", default=",".join(CASES), help="comma-separated functions to time (default: all)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per function and scale (default: 0.5)")
+    parser.add_argument("--samples", type=int, default=5, help="minimum batches per function and scale (default: 5)")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "RESULTS"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change in median time flagged by --compare (default: 0.10)")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        for label, data in (("baseline", baseline), ("results", current)):
+            env = data["environment"]
+            print(f"{label:9} {env['timestamp']}  Python {env['python']}  {env['cpu_count']} CPU(s)  "
+                  f"commit {(env['git_commit'] or '?')[:10]}")
+        rows = compare(baseline, current, args.threshold)
+        for name, scale, before, after, ratio, verdict in rows:
+            print(f"  {name:34} {scale:>12,}  {_duration(before):>10} -> {_duration(after):>10}  "
+                  f"x{ratio:5.2f}  {verdict}")
+        regressions = sum(1 for row in rows if row[5] == "REGRESSION")
+        print(f"{regressions} regression(s) over {args.threshold:.0%} in {len(rows)} comparison(s)")
+        sys.exit(1 if regressions else 0)
+
+    names = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown functions {unknown}; choose from {sorted(CASES)}")
+    scales = [_scale(s) for s in args.scales.split(",") if s.strip()]
+    data = {
+        "environment": environment(),
+        "settings": {"scales": scales, "zipf": ZIPF, "min_time": args.min_time, "samples": args.samples},
+        "results": run(scales, names, args.min_time, args.samples),
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(data, f, indent=2)
+        print(f"results saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -131,7 +131,7 @@ def demo_loans_and_reports():
     print(l.generate_reports())
 
     # Simulate an overdue book by adjusting due date
-    l._due_date = datetime.now() - timedelta(days=10)
+    l.due_date = datetime.now() - timedelta(days=10)
     print("\nOverdue notifications after date adjustment:")
     print(Loan.overdue_notifications())
     print()
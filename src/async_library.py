@@ -0,0 +1,139 @@
+# asyncio facade over the library functions, for async front ends
+import asyncio
+from contextlib import contextmanager
+
+from src import library_functions as lib
+from src.concurrency import AsyncCirculationLocks
+
+
+class AsyncLibrary:
+    """
+    Awaitable circulation API for an event loop.
+
+    Each operation runs the synchronous library function directly on the
+    loop (they are short, in-memory read-modify-writes), holding asyncio
+    locks for its member and book stripes so competing tasks wait without
+    blocking the loop. When a store is open, the operation's WAL records
+    are made durable in batches: every task finishing in the same window
+    shares one flush, run off the loop in a worker thread. A task keeps
+    its book and member locks until its change is durable, so the next
+    operation on that book never acts on state that could still be lost.
+
+    Use one instance per event loop.
+    """
+
+    def __init__(self, commit_interval=0.0, book_stripes=1024, member_stripes=256):
+        self.locks = AsyncCirculationLocks(book_stripes, member_stripes)
+        self.commit_interval = commit_interval  # seconds a batch stays open for more commits
+        self._waiters = []   # futures resolved by the next flush
+        self._flusher = None
+
+    # -------------------------------
+    # Circulation
+    # -------------------------------
+    async def borrow(self, member_id, book_id, loan_days=14):
+        """Borrow a book; returns check_in_out_operations()'s result once it is durable."""
+        return await self._call((member_id,), (book_id,), lib.check_in_out_operations,
+                                member_id, book_id, "borrow", loan_days)
+
+    async def return_book(self, member_id, book_id):
+        """Return a borrowed book."""
+        return await self._call((member_id,), (book_id,), lib.check_in_out_operations,
+                                member_id, book_id, "return")
+
+    async def reserve(self, member_id, book_id):
+        """Reserve a book or join its waitlist (see reserve_book())."""
+        return await self._call((member_id,), (book_id,), lib.reserve_book, member_id, book_id)
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    async def search(self, query="", author="", genre="", available=None, limit=None, fuzzy=False):
+        """search_catalog(), ranked best first."""
+        return lib.search_catalog(query, author, genre, available, limit, fuzzy)
+
+    async def recommend(self, member_id, limit=10, mode="indexed"):
+        """recommend_books() for member_id."""
+        return lib.recommend_books(member_id=member_id, limit=limit, mode=mode)
+
+    # -------------------------------
+    # Notification streams
+    # -------------------------------
+    async def overdue_notifications(self, today=None, daily_fee=0.25, grace_days=0, batch=256):
+        """
+        Yield the automated_overdue_notifications() messages one at a time,
+        giving the loop back every `batch` messages so other clients are
+        served while a large fan-out is sent.
+        """
+        for i, message in enumerate(lib.overdue_messages(today, daily_fee, grace_days), 1):
+            yield message
+            if i % batch == 0:
+                await asyncio.sleep(0)
+
+    async def notify_waitlist(self, book_id, limit=None):
+        """
+        Pop members off the book's waitlist and yield notify_waitlist()'s
+        result for each, once the pop is durable. limit defaults to
+        one member per available copy (at least one).
+        """
+        book = lib.catalog.get(book_id)
+        if book is None:
+            raise KeyError(f"Book {book_id} not found in catalog.")
+        if limit is None:
+            limit = max(1, book.get("copies_available", 0))
+        for _ in range(limit):
+            async with self.locks.hold(books=(book_id,)):
+                with _deferred():
+                    result = lib.notify_waitlist(book_id, 1)
+                if not result:
+                    return
+                await self._durable()
+            yield result[0]
+
+    # -------------------------------
+    # Internals
+    # -------------------------------
+    async def _call(self, members, books, function, *args):
+        async with self.locks.hold(members, books):
+            with _deferred():
+                result = function(*args)
+            await self._durable()
+        return result
+
+    async def _durable(self):
+        """Wait until everything logged so far is on disk, sharing the flush with other tasks."""
+        if lib.store is None:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_batches())
+        await waiter
+
+    async def _flush_batches(self):
+        while self._waiters:
+            # Let every task that is ready to commit join this batch
+            await asyncio.sleep(self.commit_interval)
+            waiters, self._waiters = self._waiters, []
+            try:
+                store = lib.store
+                if store is not None:
+                    await asyncio.to_thread(store.flush)
+            except Exception as exc:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(exc)
+            else:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+
+
+@contextmanager
+def _deferred():
+    """Run library functions without their own store.sync(); the caller awaits durability."""
+    token = lib.deferred_sync.set(True)
+    try:
+        yield
+    finally:
+        lib.deferred_sync.reset(token)
@@ -0,0 +1,278 @@
+# Nightly batch jobs: loan columns in a memory-mapped file, sharded by member hash over a process pool
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the batch runner needs it
+    np = None
+
+from src import library_functions as lib
+from src.loan_columns import DAY_US, EPOCH_ORDINAL, _epoch_us
+
+COLUMNS = ("member_code", "book_code", "due_day", "due_us", "return_us",
+           "due_is_datetime", "returned", "closed")
+
+
+def shard_of(member_id, shards):
+    """The shard a member's loans go to (a stable hash, the same in every process)."""
+    return zlib.crc32(str(member_id).encode("utf-8")) % shards
+
+
+class BatchRunner:
+    """
+    Runs the nightly jobs (borrowing report, overdue notices, recommendation
+    refresh) over a process pool, with results identical to the serial
+    generate_borrowing_report(), automated_overdue_notifications() and
+    recommend_books().
+
+    open() takes one LoanColumns snapshot of the ledger and writes its
+    columns, a member -> shard table and the member ids and names and book
+    titles (UTF-8 blobs plus offsets) to one file in a temporary directory.
+    Workers map that file read-only with np.memmap, so the loans are never
+    pickled. Each task handles the loans of one member-hash shard and sends
+    back per-member and per-book NumPy partials (or its messages), which
+    are merged in the parent in code / ledger order.
+
+    Recommendations read the in-memory indexes, so refresh_recommendations()
+    forks a pool of its own while holding the catalog and ledger locks, and
+    falls back to a serial loop where fork is unavailable.
+
+    workers <= 1 runs the shards in-process, and so does a small batch:
+    a snapshot of fewer than min_pool_loans loans, or a refresh of fewer
+    than min_pool_members members. Below those sizes starting the pool and
+    shipping results back costs more than the shards take. Use as a
+    context manager, or call open() / close().
+    """
+
+    MIN_POOL_LOANS = 1_000_000
+    MIN_POOL_MEMBERS = 5_000
+
+    def __init__(self, workers=None, shards=None, directory=None, min_pool_loans=None, min_pool_members=None):
+        if np is None:
+            raise ImportError("BatchRunner needs NumPy: pip install numpy")
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.shards = shards or max(1, self.workers) * 4  # several per worker evens out skewed shards
+        self.directory = directory
+        self.min_pool_loans = self.MIN_POOL_LOANS if min_pool_loans is None else min_pool_loans
+        self.min_pool_members = self.MIN_POOL_MEMBERS if min_pool_members is None else min_pool_members
+        self.columns = None   # LoanColumns snapshot (the parent's copy)
+        self._path = None
+        self._layout = None
+        self._pool = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -------------------------------
+    # Snapshot
+    # -------------------------------
+    def open(self):
+        with lib.loans.lock:
+            columns = self.columns = lib.loan_columns()
+        with lib.catalog.lock:
+            titles = []
+            for book_id in columns.books:
+                book = lib.catalog.get(book_id)
+                titles.append(str(book.get("title", "Unknown Title") if book else book_id))
+        names = [str(lib.members.get(m, {"name": "Member"}).get("name", "Member")) for m in columns.members]
+        arrays = {name: getattr(columns, name) for name in COLUMNS}
+        arrays["member_shard"] = np.array([shard_of(m, self.shards) for m in columns.members], dtype=np.int32)
+        arrays["id_blob"], arrays["id_offsets"] = _encode(columns.members)
+        arrays["name_blob"], arrays["name_offsets"] = _encode(names)
+        arrays["title_blob"], arrays["title_offsets"] = _encode(titles)
+        self._tmp = tempfile.mkdtemp(prefix="library-batch-", dir=self.directory)
+        self._path = os.path.join(self._tmp, "loans.columns")
+        self._layout = _write_columns(self._path, arrays)
+        if self.workers > 1 and len(columns) >= self.min_pool_loans:
+            self._pool = ProcessPoolExecutor(self.workers)
+        return self
+
+    @property
+    def pooled(self):
+        """True if the report and overdue jobs run on the process pool."""
+        return self._pool is not None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._path is not None:
+            shutil.rmtree(self._tmp, ignore_errors=True)
+            self._path = None
+
+    # -------------------------------
+    # Jobs
+    # -------------------------------
+    def borrowing_report(self, fine_per_day=0.5, now=None):
+        """generate_borrowing_report(fine_per_day) as of now (default: datetime.today())."""
+        now_us = _epoch_us(now or datetime.today())
+        columns = self.columns
+        borrowed = np.zeros(len(columns.members), dtype=np.int64)
+        overdue, late_days = borrowed.copy(), borrowed.copy()
+        book_counts = np.zeros(len(columns.books), dtype=np.int64)
+        for members, b, o, d, books, counts in self._map(_report_shard, now_us):
+            borrowed[members], overdue[members], late_days[members] = b, o, d
+            np.add.at(book_counts, books, counts)
+        return columns.report_from_totals(borrowed, overdue, late_days, book_counts, fine_per_day)
+
+    def overdue_notifications(self, today=None, daily_fee=0.25, grace_days=0):
+        """automated_overdue_notifications(today, daily_fee, grace_days), messages in ledger order."""
+        if today is None:
+            today = datetime.now().date()
+        elif isinstance(today, datetime):
+            today = today.date()
+        cutoff_day = (today - timedelta(days=grace_days)).toordinal() - EPOCH_ORDINAL
+        parts = self._map(_overdue_shard, today.toordinal() - EPOCH_ORDINAL, cutoff_day, daily_fee)
+        rows = np.concatenate([r for r, _ in parts]) if parts else np.empty(0, dtype=np.int64)
+        texts = [m for _, part in parts for m in part]
+        messages = [texts[i] for i in np.argsort(rows, kind="stable")]
+        return {
+            "total_overdue_items": len(messages),
+            "notified_member_count": len({m["member_id"] for m in messages}),
+            "messages": messages
+        }
+
+    def refresh_recommendations(self, member_ids=None, limit=10, mode="indexed"):
+        """
+        {member_id: recommend_books(member_id=..., limit=..., mode=...)} for
+        every member (or member_ids), also stored in lib.recommend_cache.
+        """
+        member_ids = list(lib.members) if member_ids is None else list(member_ids)
+        groups = [[] for _ in range(self.shards)]
+        for member_id in member_ids:
+            groups[shard_of(member_id, self.shards)].append(member_id)
+        stamp = lib.versions.now()
+        fork = "fork" in multiprocessing.get_all_start_methods()
+        if self.workers > 1 and fork and len(member_ids) >= self.min_pool_members:
+            context = multiprocessing.get_context("fork")
+            with lib.catalog.lock, lib.loans.lock:
+                # A fork pool starts every worker on the first submit, so all of them copy a quiet state
+                pool = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_fresh_locks)
+                futures = [pool.submit(_recommend_group, group, limit, mode) for group in groups if group]
+            parts = [f.result() for f in futures]
+            pool.shutdown()
+        else:
+            parts = [_recommend_group(group, limit, mode) for group in groups if group]
+        results = {}
+        for part in parts:
+            for member_id, result, deps in part:
+                lib.recommend_cache.put((member_id, limit, mode), result, deps, stamp)
+                results[member_id] = list(result)
+        return {member_id: results[member_id] for member_id in member_ids if member_id in results}
+
+    # -------------------------------
+    # Internals
+    # -------------------------------
+    def _map(self, job, *args):
+        tasks = [(self._path, self._layout, shard) + args for shard in range(self.shards)]
+        if self._pool is None:
+            return [job(*task) for task in tasks]
+        return list(self._pool.map(job, *zip(*tasks)))
+
+
+# -------------------------------
+# Column file
+# -------------------------------
+def _encode(strings):
+    data = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(data) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in data], out=offsets[1:])
+    return np.frombuffer(b"".join(data), dtype=np.uint8), offsets
+
+
+def _write_columns(path, arrays):
+    """Write arrays back to back (8-byte aligned); returns the layout [(name, dtype, length, offset)]."""
+    layout, offset = [], 0
+    with open(path, "wb") as f:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            f.write(b"\0" * (-offset % 8))
+            offset += -offset % 8
+            f.write(array.tobytes())
+            layout.append((name, array.dtype.str, len(array), offset))
+            offset += array.nbytes
+    return layout
+
+
+def _read_columns(path, layout):
+    return {name: np.memmap(path, dtype=np.dtype(dtype), mode="r", offset=offset, shape=(length,))
+            if length else np.empty(0, dtype=np.dtype(dtype))
+            for name, dtype, length, offset in layout}
+
+
+def _shard_rows(columns, shard):
+    return np.flatnonzero(columns["member_shard"][columns["member_code"]] == shard)
+
+
+def _string(blob, offsets, i):
+    return bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+
+# -------------------------------
+# Worker tasks (module level, so the pool can pickle them)
+# -------------------------------
+def _report_shard(path, layout, shard, now_us):
+    c = _read_columns(path, layout)
+    rows = _shard_rows(c, shard)
+    due = c["due_us"][rows]
+    end = np.where(c["closed"][rows], c["return_us"][rows], now_us)
+    late = end > due
+    days = np.where(late, (end - due) // DAY_US, 0)
+    members, inverse = np.unique(c["member_code"][rows], return_inverse=True)
+    books, counts = np.unique(c["book_code"][rows], return_counts=True)
+    return (members,
+            np.bincount(inverse, minlength=len(members)),
+            np.bincount(inverse, weights=late, minlength=len(members)).astype(np.int64),
+            np.bincount(inverse, weights=days, minlength=len(members)).astype(np.int64),
+            books, counts)
+
+
+def _overdue_shard(path, layout, shard, today_day, cutoff_day, daily_fee):
+    c = _read_columns(path, layout)
+    rows = _shard_rows(c, shard)
+    rows = rows[~c["returned"][rows] & c["due_is_datetime"][rows] & (c["due_day"][rows] < cutoff_day)]
+    ids, names, titles = {}, {}, {}
+    messages = []
+    for member_code, book_code, due_day in zip(c["member_code"][rows].tolist(), c["book_code"][rows].tolist(),
+                                               c["due_day"][rows].tolist()):
+        name = names.get(member_code)
+        if name is None:
+            ids[member_code] = _string(c["id_blob"], c["id_offsets"], member_code)
+            name = names[member_code] = _string(c["name_blob"], c["name_offsets"], member_code)
+        title = titles.get(book_code)
+        if title is None:
+            title = titles[book_code] = _string(c["title_blob"], c["title_offsets"], book_code)
+        days_overdue = today_day - due_day
+        fee = max(0, days_overdue) * daily_fee
+        text = (
+            f"Hello {name}, "
+            f"'{title}' is overdue by {days_overdue} day(s). "
+            f"Estimated fee so far: ${fee:.2f}. "
+            f"Due date was {date.fromordinal(due_day + EPOCH_ORDINAL)}. Please return or renew."
+        )
+        messages.append({"member_id": ids[member_code], "text": text, "fee": round(fee, 2)})
+    return rows, messages
+
+
+def _fresh_locks():
+    # The forked copies of the catalog and ledger locks are held by the parent's thread
+    lib.catalog.lock = threading.RLock()
+    lib.loans.lock = threading.RLock()
+
+
+def _recommend_group(member_ids, limit, mode):
+    out = []
+    for member_id in member_ids:
+        deps = {("member", member_id), "catalog"}
+        out.append((member_id, lib._recommend(member_id, limit, mode, deps), deps))
+    return out
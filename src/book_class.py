@@ -2,8 +2,15 @@ from src import library_functions as lib
 
 
 class Book:
-    """Represents a book in the library catalog."""
-    
+    """
+    Represents a book in the library catalog.
+
+    A Book is a view over its catalog record: every property reads
+    lib.catalog, so changes made by the library functions show up here.
+    """
+
+    __slots__ = ("_book_id",)
+
     def __init__(self, book_id: str, title: str, author: str, genre: str, copies_total: int = 1):
         """Initialize a Book with validation."""
         if not lib.validate_code(book_id):
@@ -14,25 +21,36 @@ class Book:
             raise ValueError("Copies must be at least 1.")
         
         self._book_id = book_id
-        self._title = title
-        self._author = author
-        self._genre = genre
-        self._copies_total = copies_total
-        self._copies_available = copies_total
 
         book_record = {
-        "id": self._book_id,
-        "title": self._title,
-        "author": self._author,
-        "genre": self._genre,
+        "id": book_id,
+        "title": title,
+        "author": author,
+        "genre": genre,
         "tags": set(),
-        "copies_total": self._copies_total,
-        "copies_available": self._copies_total,
-        "waitlist": []
+        "copies_total": copies_total,
+        "copies_available": copies_total
         }
 
-        # Append to shared global catalog
+        # Append to shared global catalog (the only copy of the book's state)
         lib.catalog.append(book_record)
+        lib.events.publish("book.created", book_id=book_id, title=title, author=author, copies_total=copies_total)
+
+    @classmethod
+    def view(cls, book_id: str):
+        """A Book over an existing catalog record, or None if there is none."""
+        if not lib.catalog.has(book_id):
+            return None
+        book = cls.__new__(cls)
+        book._book_id = book_id
+        return book
+
+    @property
+    def _record(self):
+        record = lib.catalog.get(self._book_id)
+        if record is None:
+            raise KeyError(f"Book {self._book_id} not found in catalog.")
+        return record
     
     # -------------------------------
     # Properties
@@ -44,27 +62,35 @@ class Book:
     
     @property
     def title(self):
-        return self._title
+        return self._record["title"]
     
     @property
     def author(self):
-        return self._author
+        return self._record["author"]
     
     @property
     def genre(self):
-        return self._genre
+        return self._record["genre"]
+
+    @property
+    def copies_total(self):
+        return self._record.get("copies_total", 0)
+
+    @property
+    def copies_available(self):
+        return self._record.get("copies_available", 0)
     
     @property
     def is_available(self):
         """bool: True if at least one copy is available."""
-        return self._copies_available > 0
+        return self.copies_available > 0
     
     # -------------------------------
     # Methods (Integrated)
     # -------------------------------
     def check_availability(self) -> bool:
         """Check global catalog to see if book is available."""
-        return lib.is_book_available(self._title)
+        return lib.is_book_available(self.title)
 
     def add_rating(self, member_id: str, rating: int) -> str:
         """Allow a member to rate this book."""
@@ -80,21 +106,17 @@ class Book:
 
 
     def adjust_copies(self, change: int):
-        """Adjust available copies and update global catalog."""
-        new_count = self._copies_available + change
-        if new_count < 0 or new_count > self._copies_total:
-            raise ValueError("Copy count out of range.")
-
-        # Update this instance
-        self._copies_available = new_count
-
-        # Also update the global catalog entry if it exists
-        for item in lib.catalog:
-            if item.get("id") == self._book_id:
-                item["copies_available"] = new_count
-                break
+        """Adjust available copies in the global catalog."""
+        with lib.circulation(book_id=self._book_id):
+            # Hold the book's lock so a concurrent borrow cannot slip in between
+            record = self._record
+            new_count = record.get("copies_available", 0) + change
+            if new_count < 0 or new_count > record.get("copies_total", 0):
+                raise ValueError("Copy count out of range.")
+            record["copies_available"] = new_count
 
     
     def __str__(self):
         status = "Available" if self.is_available else "Checked out"
-        return f"{self._title} by {self._author} — {status} ({self._copies_available}/{self._copies_total})"
+        record = self._record
+        return f"{record['title']} by {record['author']} — {status} ({self.copies_available}/{self.copies_total})"
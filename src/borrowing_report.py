@@ -0,0 +1,575 @@
+# Materialized borrowing report, kept up to date from loan ledger events
+import heapq
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+
+def _parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d") if isinstance(value, str) else value
+
+
+def loan_facts(record):
+    """
+    How generate_borrowing_report() reads one loan record:
+    (user_id, book_id, due_on, returned_on), with returned_on None while
+    the loan is still open. Returns None for records the report skips.
+    """
+    user_id = record.get("user_id") or record.get("member_id")
+    book_id = record.get("book_id")
+    if not user_id or not book_id:
+        return None
+
+    due_field = record.get("due_date")
+    if isinstance(due_field, datetime):
+        due_on = due_field
+    elif isinstance(due_field, str):
+        due_on = datetime.strptime(due_field, "%Y-%m-%d")
+    else:
+        return None
+
+    if record.get("return_date") is not None:
+        returned_on = _parse_day(record["return_date"])
+    elif record.get("returned") is True:
+        returned_on = due_on
+    else:
+        returned_on = None
+    return user_id, book_id, due_on, returned_on
+
+
+def _borrow_day(record):
+    borrowed = record.get("borrow_date")
+    try:
+        return _parse_day(borrowed).toordinal() if borrowed else None
+    except (ValueError, AttributeError):
+        return None
+
+
+class BorrowingReport:
+    """
+    generate_borrowing_report(), maintained incrementally.
+
+    Registered on the loan ledger with loans.add_listener(), it keeps
+    per-user and per-book counters plus the fixed late days of returned
+    loans as loans are created, returned, edited or removed. Open loans
+    sit in a due-date heap; their fines grow with the clock, so a read
+    only walks the open loans that are already overdue. Each computed
+    report is cached until the next loan change or the next moment an
+    open loan's late-day count would tick over, so repeated polls are O(1).
+
+    Loans moved to a LoanArchive keep their counts: archive(record) only
+    forgets the record, and add_archived() / drop_archived() add or remove
+    an attached archive's totals. Users and books seen in the archive
+    come first in the first-loan order, as in generate_borrowing_report().
+    """
+
+    FIELDS = ("user_id", "member_id", "book_id", "due_date", "return_date", "returned")
+    LOG_LIMIT = 100_000
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._total = 0           # every record, like len(loans)
+        self._facts = {}          # id(record) -> (record, loan_facts(record))
+        self._users = {}          # user -> [borrowed, closed overdue, closed late days], first-loan order
+        self._books = {}          # book -> borrow count, first-loan order
+        self._user_rank = {}
+        self._book_rank = {}
+        self._first_user = {}     # user -> id(record) of the user's first loan
+        self._first_book = {}
+        self._next_rank = 0
+        self._max_seq = -1
+        self._closed_overdue = 0
+        self._closed_days = 0
+        self._open = {}           # id(record) -> (user, due_on) for loans not yet returned
+        self._open_by_user = {}   # user -> {id(record): due_on}
+        self._open_heap = []      # (due_on, id(record)); stale entries are skipped
+        self._by_day = {}         # borrow-day ordinal -> {id(record): record}
+        self._days = []           # sorted borrow-day ordinals
+        self._top_user = None
+        self._top_book = None
+        self._tops_dirty = False
+        self._order_dirty = False
+        self._log = []            # user touched by each change; version = _log_start + len(_log)
+        self._log_start = 0
+        self._cache = {}          # (fine_per_day, window_days) -> cached report state
+        self._archive = None      # attached LoanArchive; its loans are counted but not kept
+
+    @property
+    def version(self) -> int:
+        """Counter that advances on every change to the report's inputs."""
+        return self._log_start + len(self._log)
+
+    # -------------------------------
+    # Ledger listener hooks
+    # -------------------------------
+    def add(self, record):
+        self._enter(record)
+        self._apply(record, loan_facts(record))
+
+    def add_many(self, records):
+        # Bulk load: the tops are found once when read, and the change log restarts
+        self._tops_dirty = True
+        for record in records:
+            self._enter(record)
+            self._apply(record, loan_facts(record), touch=False)
+        self._log_start += len(self._log) + 1
+        self._log = []
+        self._cache.clear()
+
+    def discard(self, record):
+        self._total -= 1
+        self._unapply(record)
+        self._unbucket(record, _borrow_day(record))
+
+    def update(self, record, key, old):
+        if key == "borrow_date":
+            self._unbucket(record, _borrow_day({"borrow_date": old}))
+            self._bucket(record, _borrow_day(record))
+            self._touch(None)
+        elif key in self.FIELDS:
+            rid = id(record)
+            old_facts = self._facts[rid][1]
+            facts = loan_facts(record)
+            if old_facts and facts and old_facts[:2] == facts[:2]:
+                # Same user and book (e.g. a return): only the overdue status moves
+                user = self._users[facts[0]]
+                self._status(rid, user, old_facts, -1)
+                self._status(rid, user, facts, +1)
+                self._facts[rid] = (record, facts)
+                self._touch(facts[0])
+            else:
+                self._unapply(record)
+                self._apply(record, facts)
+                self._order_dirty = True
+
+    def reorder(self):
+        self._order_dirty = True
+        self._cache.clear()
+
+    def clear(self):
+        self._reset()
+
+    def archive(self, record):
+        # Moved to the archive: the counts stay, the record and its borrow-day entry go
+        rid = id(record)
+        self._facts.pop(rid)
+        self._unbucket(record, _borrow_day(record))
+        self._order_dirty = True  # archived users and books now sort first
+        self._cache.clear()
+
+    def add_archived(self, archive):
+        self._archive = archive
+        self._count_archived(archive, +1)
+
+    def drop_archived(self, archive):
+        self._count_archived(archive, -1)
+        self._archive = None
+
+    def _count_archived(self, archive, sign):
+        totals = archive.totals()
+        borrowed = totals["borrowed"].tolist()
+        overdue = totals["overdue"].tolist()
+        late_days = totals["late_days"].tolist()
+        for user_id, b, o, d in zip(archive.members, borrowed, overdue, late_days):
+            user = self._users.setdefault(user_id, [0, 0, 0])
+            user[0] += sign * b
+            user[1] += sign * o
+            user[2] += sign * d
+            if not user[0]:
+                del self._users[user_id]
+        for book_id, n in zip(archive.books, totals["book_counts"].tolist()):
+            self._books[book_id] = self._books.get(book_id, 0) + sign * n
+            if not self._books[book_id]:
+                del self._books[book_id]
+        self._total += sign * len(archive)
+        self._closed_overdue += sign * totals["overdue_total"]
+        self._closed_days += sign * totals["late_days_total"]
+        # Every archived user changed at once: readers of the change log get a full report
+        self._log_start += len(self._log) + 1
+        self._log = []
+        self._order_dirty = True
+        self._tops_dirty = True
+        self._cache.clear()
+
+    # -------------------------------
+    # Aggregate maintenance
+    # -------------------------------
+    def _bucket(self, record, day):
+        if day is None:
+            return
+        if day not in self._by_day:
+            self._by_day[day] = {}
+            insort(self._days, day)
+        self._by_day[day][id(record)] = record
+
+    def _unbucket(self, record, day):
+        bucket = self._by_day.get(day)
+        if bucket is not None:
+            bucket.pop(id(record), None)
+            if not bucket:
+                del self._by_day[day]
+                del self._days[bisect_left(self._days, day)]
+
+    def _enter(self, record):
+        self._total += 1
+        seq = getattr(record, "_seq", None)
+        if seq is not None:
+            if seq <= self._max_seq:
+                self._order_dirty = True  # not an append: first-loan order must be recomputed
+            self._max_seq = max(self._max_seq, seq)
+        self._bucket(record, _borrow_day(record))
+
+    def _touch(self, user_id):
+        self._log.append(user_id)
+        if len(self._log) > self.LOG_LIMIT:
+            drop = len(self._log) // 2
+            del self._log[:drop]
+            self._log_start += drop
+        for state in self._cache.values():
+            state["pending"].add(user_id)
+
+    def _apply(self, record, facts, touch=True):
+        rid = id(record)
+        self._facts[rid] = (record, facts)
+        if facts is None:
+            if touch:
+                self._touch(None)
+            return
+        user_id, book_id = facts[0], facts[1]
+
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = [0, 0, 0]
+            self._user_rank[user_id] = self._next_rank
+            self._first_user[user_id] = rid
+            self._next_rank += 1
+        user[0] += 1
+        if book_id not in self._books:
+            self._books[book_id] = 0
+            self._book_rank[book_id] = self._next_rank
+            self._first_book[book_id] = rid
+            self._next_rank += 1
+        self._books[book_id] += 1
+
+        self._status(rid, user, facts, +1)
+
+        if not self._tops_dirty:
+            top = self._top_user
+            if top is None or user[0] > self._users[top][0] or \
+                    (user[0] == self._users[top][0] and self._user_rank[user_id] < self._user_rank[top]):
+                self._top_user = user_id
+            top = self._top_book
+            count = self._books[book_id]
+            if top is None or count > self._books[top] or \
+                    (count == self._books[top] and self._book_rank[book_id] < self._book_rank[top]):
+                self._top_book = book_id
+        if touch:
+            self._touch(user_id)
+
+    def _status(self, rid, user, facts, sign):
+        # Add (+1) or remove (-1) a loan's open / returned-late contribution
+        _, _, due_on, returned_on = facts
+        if returned_on is None:
+            if sign > 0:
+                self._open[rid] = (facts[0], due_on)
+                self._open_by_user.setdefault(facts[0], {})[rid] = due_on
+                heapq.heappush(self._open_heap, (due_on, rid))
+            else:
+                self._open.pop(rid, None)
+                user_open = self._open_by_user[facts[0]]
+                del user_open[rid]
+                if not user_open:
+                    del self._open_by_user[facts[0]]
+        elif returned_on > due_on:
+            days = (returned_on - due_on).days
+            user[1] += sign
+            user[2] += sign * days
+            self._closed_overdue += sign
+            self._closed_days += sign * days
+
+    def _unapply(self, record):
+        rid = id(record)
+        _, facts = self._facts.pop(rid, (None, None))
+        if facts is None:
+            self._touch(None)
+            return
+        user_id, book_id = facts[0], facts[1]
+        user = self._users[user_id]
+        user[0] -= 1
+        self._books[book_id] -= 1
+        self._tops_dirty = True
+        self._status(rid, user, facts, -1)
+
+        if user[0] == 0:
+            del self._users[user_id]
+            self._first_user.pop(user_id, None)  # users first seen in the archive have no first record
+            self._user_rank.pop(user_id, None)
+        elif self._first_user.get(user_id) == rid:
+            self._order_dirty = True
+        if self._books[book_id] == 0:
+            del self._books[book_id]
+            self._first_book.pop(book_id, None)
+            self._book_rank.pop(book_id, None)
+        elif self._first_book.get(book_id) == rid:
+            self._order_dirty = True
+        self._touch(user_id)
+
+    def _rebuild_order(self):
+        # Re-derive first-loan order of users and books from ledger positions
+        users, books = {}, {}
+        first_user, first_book = {}, {}
+        if self._archive is not None:
+            for user_id in self._archive.members:
+                if user_id in self._users:
+                    users[user_id] = self._users[user_id]
+            for book_id in self._archive.books:
+                if book_id in self._books:
+                    books[book_id] = self._books[book_id]
+        entries = sorted(self._facts.items(), key=lambda item: item[1][0]._seq)
+        for rid, (_, facts) in entries:
+            if facts is None:
+                continue
+            user_id, book_id = facts[0], facts[1]
+            if user_id not in users:
+                users[user_id] = self._users[user_id]
+                first_user[user_id] = rid
+            if book_id not in books:
+                books[book_id] = self._books[book_id]
+                first_book[book_id] = rid
+        for user_id in self._users.keys() - users.keys():
+            users[user_id] = self._users[user_id]  # loans taken out of the ledger with no archive attached
+        for book_id in self._books.keys() - books.keys():
+            books[book_id] = self._books[book_id]
+        self._users, self._books = users, books
+        self._first_user, self._first_book = first_user, first_book
+        self._user_rank = {u: n for n, u in enumerate(users)}
+        self._book_rank = {b: n for n, b in enumerate(books)}
+        self._next_rank = len(users) + len(books)
+        self._max_seq = entries[-1][1][0]._seq if entries else -1
+        self._order_dirty = False
+        self._tops_dirty = True
+        self._cache.clear()
+
+    def _tops(self):
+        if self._tops_dirty:
+            users, books = self._users, self._books
+            self._top_user = max(users, key=lambda u: users[u][0], default=None)
+            self._top_book = max(books, key=books.__getitem__, default=None)
+            self._tops_dirty = False
+        return self._top_user, self._top_book
+
+    def _open_overdue(self, now):
+        """
+        Walk the part of the open-loan heap already past due at now.
+        Returns ({user: [overdue loans, late days]}, valid_until), where
+        valid_until is the earliest time any of these numbers can change.
+        """
+        heap = self._open_heap
+        if len(heap) > 2 * len(self._open) + 64:
+            heap = self._open_heap = [(due_on, rid) for rid, (_, due_on) in self._open.items()]
+            heapq.heapify(heap)
+
+        per_user = {}
+        seen = set()
+        valid_until = datetime.max
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            if i >= len(heap):
+                continue
+            due_on, rid = heap[i]
+            if not now > due_on:
+                # Nothing below this node is overdue yet; it turns overdue right after due_on
+                valid_until = min(valid_until, due_on)
+                continue
+            entry = self._open.get(rid)
+            if entry is not None and entry[1] == due_on and rid not in seen:
+                seen.add(rid)
+                days = (now - due_on).days
+                counts = per_user.setdefault(entry[0], [0, 0])
+                counts[0] += 1
+                counts[1] += days
+                valid_until = min(valid_until, due_on + timedelta(days=days + 1))
+            stack.append(2 * i + 1)
+            stack.append(2 * i + 2)
+        return per_user, valid_until
+
+    def _user_open_overdue(self, user_id, now):
+        """[overdue loans, late days] for one user's open loans at now, and when that next changes."""
+        count = days = 0
+        valid_until = datetime.max
+        for due_on in self._open_by_user.get(user_id, {}).values():
+            if now > due_on:
+                late = (now - due_on).days
+                count += 1
+                days += late
+                valid_until = min(valid_until, due_on + timedelta(days=late + 1))
+            else:
+                valid_until = min(valid_until, due_on)
+        return ([count, days] if count else None), valid_until
+
+    # -------------------------------
+    # Reads
+    # -------------------------------
+    def report(self, fine_per_day=0.5, *, now=None, since=None, window_days=None):
+        """
+        The same dict generate_borrowing_report(fine_per_day) returns.
+
+        since: a version from an earlier report; only users whose entries
+            changed after it (plus users whose open-loan fines are still
+            growing) are listed in "user_activity". "full" is True when
+            the change log no longer reaches back that far.
+        window_days: report on loans borrowed in the last N days only.
+        The result carries a "version" key to pass back as since.
+        Treat returned reports as read-only: they are shared with the cache.
+        """
+        now = now or datetime.today()
+        if self._order_dirty:
+            self._rebuild_order()
+        if window_days is not None:
+            report = self._window_report(fine_per_day, window_days, now)
+        else:
+            report = self._full_report(fine_per_day, now)
+        if since is None:
+            return report
+
+        version = self.version
+        full = since < self._log_start
+        if full:
+            changed = report["user_activity"]
+        else:
+            changed = {u for u in self._log[since - self._log_start:] if u is not None}
+            changed.update(self._cache[(fine_per_day, window_days)]["open_users"])
+            activity = report["user_activity"]
+            changed = {u: activity[u] for u in activity if u in changed} \
+                if len(changed) > len(activity) else {u: activity[u] for u in changed if u in activity}
+        delta = dict(report, user_activity=changed, full=full)
+        delta["version"] = version
+        return delta
+
+    def _full_report(self, rate, now):
+        key = (rate, None)
+        state = self._cache.get(key)
+        if state is not None and not state["pending"] and now < state["valid_until"]:
+            return state["report"]
+
+        if state is None or now >= state["valid_until"]:
+            # Some open loan's late days may have ticked over: walk the overdue heap
+            per_user, valid_until = self._open_overdue(now)
+            if state is None:
+                activity = {}
+                stale = self._users.keys()
+            else:
+                activity = dict(state["report"]["user_activity"])
+                stale = state["pending"] | state["per_user"].keys() | per_user.keys()
+        else:
+            # Nothing ticked over since the last read: only the changed users' open loans move
+            per_user = dict(state["per_user"])
+            valid_until = state["valid_until"]
+            stale = state["pending"]
+            for user_id in stale:
+                counts, until = self._user_open_overdue(user_id, now)
+                valid_until = min(valid_until, until)
+                if counts:
+                    per_user[user_id] = counts
+                else:
+                    per_user.pop(user_id, None)
+            activity = dict(state["report"]["user_activity"])
+
+        added = []
+        for user_id in stale:
+            user = self._users.get(user_id)
+            if user is None:
+                activity.pop(user_id, None)
+                continue
+            borrowed, overdue, days = user
+            extra = per_user.get(user_id)
+            if extra:
+                overdue += extra[0]
+                days += extra[1]
+            entry = {"borrowed": borrowed, "overdue": overdue, "fines": 0.0 + days * rate}
+            if user_id in activity:
+                activity[user_id] = entry
+            else:
+                added.append((self._user_rank[user_id], user_id, entry))
+        for _, user_id, entry in sorted(added, key=lambda item: item[0]):
+            activity[user_id] = entry
+
+        open_overdue = sum(c[0] for c in per_user.values())
+        open_days = sum(c[1] for c in per_user.values())
+        top_user, top_book = self._tops()
+        report = {
+            "total_books_borrowed": self._total,
+            "total_overdue_books": self._closed_overdue + open_overdue,
+            "total_fines_collected": round(0.0 + (self._closed_days + open_days) * rate, 2),
+            "user_activity": activity,
+            "most_active_user": top_user,
+            "most_borrowed_book": top_book,
+        }
+        self._cache[key] = {"report": report, "valid_until": valid_until,
+                            "pending": set(), "per_user": per_user, "open_users": set(per_user)}
+        return report
+
+    def _window_report(self, rate, window_days, now):
+        key = (rate, window_days)
+        state = self._cache.get(key)
+        if state is not None and not state["pending"] and now < state["valid_until"]:
+            return state["report"]
+
+        first_day = now.toordinal() - window_days + 1
+        start = bisect_left(self._days, first_day)
+        records = [r for day in self._days[start:] for r in self._by_day[day].values()]
+        records.sort(key=lambda r: r._seq)
+
+        users = {}
+        book_counts = {}
+        overdue_count = 0
+        late_days = 0
+        archived = 0
+        if self._archive is not None:
+            window = self._archive.window_totals(first_day)
+            archived = window["rows"]
+            for user_id, b, o, d in zip(window["members"], window["borrowed"], window["overdue"], window["late_days"]):
+                users[user_id] = [b, o, d]
+            book_counts = dict(zip(window["books"], window["book_counts"]))
+            overdue_count = window["overdue_total"]
+            late_days = window["late_days_total"]
+        open_users = set()
+        # The window slides at midnight even if nothing else changes
+        valid_until = datetime.fromordinal(now.toordinal() + 1)
+        for record in records:
+            facts = self._facts[id(record)][1]
+            if facts is None:
+                continue
+            user_id, book_id, due_on, returned_on = facts
+            user = users.setdefault(user_id, [0, 0, 0])
+            user[0] += 1
+            book_counts[book_id] = book_counts.get(book_id, 0) + 1
+            if returned_on is None:
+                open_users.add(user_id)
+                returned_on = now
+                if now > due_on:
+                    valid_until = min(valid_until, due_on + timedelta(days=(now - due_on).days + 1))
+                else:
+                    valid_until = min(valid_until, due_on)
+            if returned_on > due_on:
+                days = (returned_on - due_on).days
+                user[1] += 1
+                user[2] += days
+                overdue_count += 1
+                late_days += days
+
+        report = {
+            "total_books_borrowed": archived + len(records),
+            "total_overdue_books": overdue_count,
+            "total_fines_collected": round(0.0 + late_days * rate, 2),
+            "user_activity": {u: {"borrowed": b, "overdue": o, "fines": 0.0 + d * rate}
+                              for u, (b, o, d) in users.items()},
+            "most_active_user": max(users, key=lambda u: users[u][0], default=None),
+            "most_borrowed_book": max(book_counts, key=book_counts.__getitem__, default=None),
+            "window_days": window_days,
+        }
+        self._cache[key] = {"report": report, "valid_until": valid_until,
+                            "pending": set(), "open_users": open_users}
+        return report
@@ -0,0 +1,278 @@
+# Catalog storage: a list of book records with an id -> record index
+import threading
+from collections.abc import Mapping
+from src.concurrency import synchronized
+from src.records import BookRecord
+
+
+class CatalogStore(list):
+    """
+    The global catalog: still a plain list of book dicts to every caller,
+    but inserts, deletes and "id" changes keep a hash index in sync so a
+    book can be found with get(book_id) instead of a linear scan.
+
+    Inserted mappings are stored as BookRecord objects. If two records
+    share an id, the first one in the list is the one the index returns.
+
+    Every change (and the index callbacks it triggers) runs under
+    self.lock, so the catalog can be shared between threads.
+
+    Other indexes (full-text, facets, ...) register with add_index() and
+    receive add(book_id, record), discard(book_id),
+    update(book_id, record, key), reorder() (same records, new catalog
+    order) and clear() calls for indexed records. bulk_extend() hands an
+    index the whole batch through add_many(items) when it has one.
+    """
+
+    def __init__(self, records=()):
+        super().__init__()
+        self.lock = threading.RLock()  # held while the list and its indexes change
+        self._by_id = {}
+        self._seq = {}       # book_id -> position counter (catalog order)
+        self._next_seq = 0
+        self._indexes = []
+        self.extend(records)
+
+    # -------------------------------
+    # Lookup
+    # -------------------------------
+    def get(self, book_id, default=None):
+        """Return the record for book_id in O(1), or default."""
+        return self._by_id.get(book_id, default)
+
+    def has(self, book_id) -> bool:
+        """True if a record with this id is in the catalog."""
+        return book_id in self._by_id
+
+    def ids(self):
+        """All indexed book ids."""
+        return self._by_id.keys()
+
+    def position(self, book_id):
+        """Sort key that orders book ids the way they appear in the catalog."""
+        return self._seq[book_id]
+
+    @synchronized
+    def in_order(self, book_ids):
+        """Records for the given ids, in catalog order."""
+        return [self._by_id[b] for b in sorted(book_ids, key=self._seq.__getitem__)]
+
+    @synchronized
+    def add_index(self, index):
+        """Register a secondary index and load the current records into it."""
+        self._indexes.append(index)
+        for book_id, record in self._by_id.items():
+            index.add(book_id, record)
+
+    @synchronized
+    def remove_index(self, index):
+        """Stop sending changes to a registered index."""
+        self._indexes.remove(index)
+
+    # -------------------------------
+    # Index maintenance
+    # -------------------------------
+    def _adopt(self, record):
+        if not isinstance(record, Mapping):
+            raise TypeError("Catalog entries must be dicts.")
+        if not isinstance(record, BookRecord) or (record._owner is not None and record._owner is not self):
+            record = BookRecord(record)
+        record._owner = self
+        return record
+
+    def _attach(self, record, seq=None):
+        book_id = record.get("id")
+        if book_id is not None and book_id not in self._by_id:
+            self._by_id[book_id] = record
+            if seq is None:
+                seq = self._next_seq
+                self._next_seq += 1
+            self._seq[book_id] = seq
+            for index in self._indexes:
+                index.add(book_id, record)
+
+    def _detach(self, record, book_id=None):
+        if book_id is None:
+            book_id = record.get("id")
+        if self._by_id.get(book_id) is not record:
+            return
+        del self._by_id[book_id]
+        seq = self._seq.pop(book_id)
+        for index in self._indexes:
+            index.discard(book_id)
+        # Hand the id over to the next duplicate still in the list, if any
+        for item in self:
+            if item is not record and item.get("id") == book_id:
+                self._attach(item, seq)
+                break
+
+    def _release(self, record):
+        if not any(item is record for item in self):
+            record._owner = None
+            self._detach(record)
+
+    def _orphan(self, records):
+        live = {id(item) for item in self}
+        for record in records:
+            if id(record) not in live:
+                record._owner = None
+
+    def _reindex(self):
+        self._by_id = {}
+        self._seq = {}
+        self._next_seq = 0
+        for index in self._indexes:
+            index.clear()
+        for record in self:
+            self._attach(record)
+
+    def _renumber(self):
+        # Order changed but membership did not: only positions need refreshing
+        self._seq = {}
+        for n, record in enumerate(self):
+            book_id = record.get("id")
+            if self._by_id.get(book_id) is record:
+                self._seq[book_id] = n
+        self._next_seq = len(self)
+        for index in self._indexes:
+            index.reorder()
+
+    @synchronized
+    def _record_changed(self, record, key, old):
+        if key == "id":
+            self._detach(record, old)
+            self._attach(record)
+        elif self._by_id.get(record.get("id")) is record:
+            for index in self._indexes:
+                index.update(record["id"], record, key)
+
+    # -------------------------------
+    # list API
+    # -------------------------------
+    @synchronized
+    def append(self, record):
+        record = self._adopt(record)
+        super().append(record)
+        self._attach(record)
+
+    @synchronized
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    @synchronized
+    def bulk_extend(self, records):
+        """
+        Append many records, then update each index once for the batch
+        (add_many([(book_id, record), ...]) if the index has it, else add()
+        per record). Returns the number of newly indexed records.
+        """
+        added = []
+        for record in records:
+            record = self._adopt(record)
+            super().append(record)
+            book_id = record.get("id")
+            if book_id is not None and book_id not in self._by_id:
+                self._by_id[book_id] = record
+                self._seq[book_id] = self._next_seq
+                self._next_seq += 1
+                added.append((book_id, record))
+        for index in self._indexes:
+            add_many = getattr(index, "add_many", None)
+            if add_many is not None:
+                add_many(added)
+            else:
+                for book_id, record in added:
+                    index.add(book_id, record)
+        return len(added)
+
+    def __iadd__(self, records):
+        self.extend(records)
+        return self
+
+    @synchronized
+    def insert(self, index, record):
+        record = self._adopt(record)
+        super().insert(index, record)
+        existing = self._by_id.get(record.get("id"))
+        if existing is not None and existing is not record:
+            # An insert ahead of an existing duplicate changes which one is first
+            self._reindex()
+        else:
+            self._attach(record)
+            if self[-1] is not record:
+                self._renumber()
+
+    @synchronized
+    def remove(self, record):
+        for i, item in enumerate(self):
+            if item is record or item == record:
+                del self[i]
+                return
+        raise ValueError("CatalogStore.remove(x): x not in catalog")
+
+    @synchronized
+    def pop(self, index=-1):
+        record = super().pop(index)
+        self._release(record)
+        return record
+
+    @synchronized
+    def clear(self):
+        for record in self:
+            record._owner = None
+        super().clear()
+        self._reindex()
+
+    @synchronized
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            old = list(super().__getitem__(index))
+            super().__setitem__(index, [self._adopt(r) for r in value])
+            self._orphan(old)
+            self._reindex()
+        else:
+            old = super().__getitem__(index)
+            record = self._adopt(value)
+            super().__setitem__(index, record)
+            self._release(old)
+            if self._by_id.get(record.get("id"), record) is not record:
+                self._reindex()
+            else:
+                self._attach(record)
+
+    @synchronized
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            old = list(super().__getitem__(index))
+            super().__delitem__(index)
+            self._orphan(old)
+            self._reindex()
+        else:
+            record = super().__getitem__(index)
+            super().__delitem__(index)
+            self._release(record)
+
+    @synchronized
+    def __imul__(self, n):
+        super().__imul__(n)
+        if n <= 0:
+            self._reindex()
+        return self
+
+    def _reordered(self):
+        if len(self._by_id) == len(self):
+            self._renumber()
+        else:
+            # Duplicates present: which copy comes first may have changed
+            self._reindex()
+
+    @synchronized
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._reordered()
+
+    @synchronized
+    def reverse(self):
+        super().reverse()
+        self._reordered()
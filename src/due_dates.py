@@ -0,0 +1,141 @@
+# Business-day arithmetic for due dates: closed-form weekday skipping + holiday calendar
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only the array batch path uses it
+    np = None
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _to_ordinal(day):
+    return day if isinstance(day, int) else day.toordinal()
+
+
+class HolidayCalendar:
+    """
+    Sorted list of library closing days (as date ordinals).
+
+    Lookups are bisect range counts, so a due-date calculation costs
+    O(log H) per holiday hit instead of a per-day membership test.
+    Weekend holidays are tracked separately so they are not skipped twice.
+    """
+
+    def __init__(self, days=()):
+        self._all = []       # every holiday
+        self._weekdays = []  # holidays falling Monday-Friday
+        for day in days:
+            self.add(day)
+
+    def __len__(self):
+        return len(self._all)
+
+    def __contains__(self, day):
+        o = _to_ordinal(day)
+        i = bisect_left(self._all, o)
+        return i < len(self._all) and self._all[i] == o
+
+    def __iter__(self):
+        return (date.fromordinal(o) for o in self._all)
+
+    def add(self, day):
+        """Add a closing day (date, datetime or ordinal)."""
+        o = _to_ordinal(day)
+        if o in self:
+            return
+        insort(self._all, o)
+        if date.fromordinal(o).weekday() < 5:
+            insort(self._weekdays, o)
+
+    def remove(self, day):
+        o = _to_ordinal(day)
+        if o not in self:
+            raise KeyError(day)
+        del self._all[bisect_left(self._all, o)]
+        i = bisect_left(self._weekdays, o)
+        if i < len(self._weekdays) and self._weekdays[i] == o:
+            del self._weekdays[i]
+
+    def clear(self):
+        self._all = []
+        self._weekdays = []
+
+    def count(self, after, through, weekdays_only=True):
+        """Holidays d with after < d <= through (ordinals)."""
+        days = self._weekdays if weekdays_only else self._all
+        return bisect_right(days, through) - bisect_right(days, after)
+
+    def ordinals(self):
+        return list(self._all)
+
+
+def _add_weekdays(day, n):
+    """Ordinal of the n-th Monday-Friday strictly after ordinal day (n >= 0)."""
+    if n == 0:
+        return day
+    weekday = (day + 6) % 7
+    if weekday >= 5:
+        # Counting from a weekend is the same as counting from the Friday before
+        day -= weekday - 4
+        weekday = 4
+    weeks, rest = divmod(weekday + n, 5)
+    return day - weekday + 7 * weeks + rest
+
+
+def add_business_days(day, n, skip_weekends=True, calendar=None):
+    """
+    Ordinal of the n-th open day strictly after ordinal `day`.
+    Open days exclude weekends (if skip_weekends) and calendar holidays.
+    Whole weeks are added in one step; holidays inside the span push the
+    result forward by the number found, repeated until none are left.
+    """
+    step = _add_weekdays if skip_weekends else (lambda d, k: d + k)
+    result = step(day, n)
+    if calendar is None or not len(calendar):
+        return result
+    start = day
+    while True:
+        extra = calendar.count(start, result, weekdays_only=skip_weekends)
+        if not extra:
+            return result
+        start, result = result, step(result, extra)
+
+
+def due_date(borrow_date, loan_days, skip_weekends=True, calendar=None):
+    """borrow_date moved forward by loan_days open days, keeping its time of day."""
+    start = borrow_date.toordinal()
+    end = add_business_days(start, loan_days, skip_weekends, calendar)
+    return borrow_date + timedelta(days=end - start)
+
+
+def due_dates(borrow_dates, loan_days=14, skip_weekends=True, calendar=None):
+    """
+    Batch due dates. borrow_dates is a sequence of datetimes, or a NumPy
+    datetime64 array (then the work is done by np.busday_offset and a
+    datetime64 array is returned). loan_days is one int or one per loan.
+    """
+    if np is not None and isinstance(borrow_dates, np.ndarray):
+        days = np.asarray(loan_days)
+        if np.any(days <= 0):
+            raise ValueError("loan_days must be greater than 0")
+        start = borrow_dates.astype("datetime64[D]")
+        holidays = np.array(calendar.ordinals() if calendar is not None else [], dtype=np.int64)
+        end = np.busday_offset(
+            start, days, roll="backward",
+            weekmask="1111100" if skip_weekends else "1111111",
+            holidays=(holidays - EPOCH_ORDINAL).astype("datetime64[D]"),
+        )
+        return borrow_dates + (end - start)
+
+    if isinstance(loan_days, int):
+        loan_days = [loan_days] * len(borrow_dates)
+    results = []
+    for borrowed, days in zip(borrow_dates, loan_days):
+        if not isinstance(borrowed, datetime):
+            raise TypeError("borrow_date must be a datetime object")
+        if days <= 0:
+            raise ValueError("loan_days must be greater than 0")
+        results.append(due_date(borrowed, days, skip_weekends, calendar))
+    return results
@@ -0,0 +1,268 @@
+# In-process event bus: typed change events, a bounded ring buffer, batched delivery and a replayable file sink
+import os
+import pickle
+import threading
+import time
+
+from src.storage import _read_frames, _write_frame
+
+EVENT_TYPES = frozenset({
+    "book.created",        # Book(): book_id, title, author, copies_total
+    "member.created",      # Member(): member_id, name, email
+    "loan.created",        # Loan(): member_id, book_id, due_date
+    "loan.borrowed",       # check_in_out_operations / user_account borrow: member_id, book_id, due_at
+    "loan.returned",       # check_in_out_operations / user_account return: member_id, book_id, returned_at, fine
+    "account.paid",        # user_account pay: member_id, amount, balance
+    "reservation.added",   # reserve_book with a copy free: member_id, book_id
+    "waitlist.joined",     # reserve_book / waitlist_management add: book_id, member_id, position
+    "waitlist.notified",   # waitlist_management notify / notify_waitlist: book_id, member_id
+    "waitlist.cancelled",  # waitlist_management cancel: book_id, member_id
+    "rating.set",          # rate_book: book_id, member_id, rating, previous, average
+    "reminder.scheduled",  # schedule_reminder: member_id, book_id, due_date, index
+})
+
+
+class Event:
+    """One state change: a bus-wide sequence number, its type (EVENT_TYPES), a wall-clock time and its fields."""
+
+    __slots__ = ("seq", "type", "time", "data")
+
+    def __init__(self, seq, type, time, data):
+        self.seq = seq
+        self.type = type
+        self.time = time
+        self.data = data
+
+    def __repr__(self):
+        return f"Event({self.seq}, {self.type!r}, {self.data!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Event):
+            return NotImplemented
+        return (self.seq, self.type, self.time, self.data) == (other.seq, other.type, other.time, other.data)
+
+    def __reduce__(self):
+        return (Event, (self.seq, self.type, self.time, self.data))
+
+
+class Subscription:
+    """A handler registered with EventBus.subscribe(), its read position and delivery counters."""
+
+    def __init__(self, handler, batch_size, types, cursor):
+        self.handler = handler
+        self.batch_size = batch_size
+        self.types = types       # frozenset of event types, or None for all
+        self.cursor = cursor     # seq of the next event to deliver
+        self.delivered = 0
+        self.dropped = 0         # events lost to overflow="drop"
+        self.errors = 0          # handler calls that raised
+        self.last_error = None
+
+
+class EventBus:
+    """
+    Publish / subscribe for library state changes.
+
+    publish() stores each event in a ring buffer of `capacity` slots and
+    returns at once; a dispatcher thread hands every subscriber the
+    events it has not seen yet, up to batch_size per handler call, in
+    publication order. Each subscriber has its own cursor into the ring,
+    so a slow one only holds back the buffer, not the other subscribers.
+
+    When the slowest subscriber is a whole buffer behind, overflow="block"
+    makes publish() wait for it (backpressure on the library functions);
+    overflow="drop" moves that subscriber's cursor past the oldest event
+    instead and counts it in Subscription.dropped. Events published from a
+    handler never block. Handlers run on the dispatcher thread and must not
+    wait on the library's circulation locks. A handler that raises is
+    counted in Subscription.errors and keeps receiving events.
+
+    With no subscribers publish() stores nothing, so an unused bus costs
+    one check per change.
+    """
+
+    def __init__(self, capacity=65536, overflow="block"):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if overflow not in ("block", "drop"):
+            raise ValueError("overflow must be 'block' or 'drop'")
+        self.capacity = capacity
+        self.overflow = overflow
+        self._ring = [None] * capacity
+        self._next = 0            # seq of the next event published
+        self._subscriptions = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.published = 0
+        self.waits = 0            # times publish() waited for a slow subscriber
+
+    # -------------------------------
+    # Subscribers
+    # -------------------------------
+    def subscribe(self, handler, *, batch_size=256, types=None):
+        """
+        Call handler(list[Event]) with every later event (only those in
+        `types`, if given). Returns the Subscription.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if types is not None:
+            types = frozenset(types)
+            unknown = types - EVENT_TYPES
+            if unknown:
+                raise ValueError(f"Unknown event types: {sorted(unknown)}")
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("event bus is closed")
+            subscription = Subscription(handler, batch_size, types, self._next)
+            self._subscriptions = self._subscriptions + [subscription]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-bus", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._cond:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+            self._cond.notify_all()
+
+    # -------------------------------
+    # Publishing
+    # -------------------------------
+    def publish(self, type, **data):
+        """Record one event; returns it, or None when nobody is subscribed."""
+        if type not in EVENT_TYPES:
+            raise ValueError(f"Unknown event type: {type!r}")
+        if not self._subscriptions:
+            return None
+        with self._cond:
+            while self._subscriptions and self._next - self._slowest() >= self.capacity:
+                if self.overflow == "drop" or threading.current_thread() is self._thread:
+                    for subscription in self._subscriptions:
+                        if self._next - subscription.cursor >= self.capacity:
+                            subscription.cursor += 1
+                            subscription.dropped += 1
+                    break
+                self.waits += 1
+                self._cond.wait()
+            event = Event(self._next, type, time.time(), data)
+            self._ring[self._next % self.capacity] = event
+            self._next += 1
+            self.published += 1
+            self._cond.notify_all()
+        return event
+
+    def flush(self, timeout=None):
+        """Wait until every subscriber has handled every event published so far. False on timeout."""
+        if threading.current_thread() is self._thread:
+            return False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._next
+            while any(s.cursor < target for s in self._subscriptions):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Deliver what is buffered, then stop the dispatcher thread."""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            subscriptions = [{"handler": getattr(s.handler, "__name__", type(s.handler).__name__),
+                              "lag": self._next - s.cursor, "delivered": s.delivered,
+                              "dropped": s.dropped, "errors": s.errors} for s in self._subscriptions]
+            return {"published": self.published, "buffered": self._next - self._slowest(),
+                    "capacity": self.capacity, "waits": self.waits, "subscriptions": subscriptions}
+
+    # -------------------------------
+    # Dispatcher
+    # -------------------------------
+    def _slowest(self):
+        return min((s.cursor for s in self._subscriptions), default=self._next)
+
+    def _run(self):
+        cond, ring, capacity = self._cond, self._ring, self.capacity
+        while True:
+            with cond:
+                while not self._closed and all(s.cursor >= self._next for s in self._subscriptions):
+                    cond.wait()
+                if self._closed:
+                    return
+                work = []
+                for subscription in self._subscriptions:
+                    start = subscription.cursor
+                    end = min(self._next, start + subscription.batch_size)
+                    if end > start:
+                        work.append((subscription, [ring[seq % capacity] for seq in range(start, end)], end))
+            for subscription, events, end in work:
+                if subscription.types is not None:
+                    events = [e for e in events if e.type in subscription.types]
+                if events:
+                    try:
+                        subscription.handler(events)
+                    except Exception as exc:
+                        subscription.errors += 1
+                        subscription.last_error = exc
+                with cond:
+                    subscription.cursor = max(subscription.cursor, end)
+                    subscription.delivered += len(events)
+                    cond.notify_all()
+
+
+# -------------------------------
+# File sink and replay
+# -------------------------------
+class FileSink:
+    """
+    Subscriber that appends each batch to `path` as one CRC-checked pickle
+    frame (the storage WAL format), for replay() in another process.
+    With fsync=True every batch is on disk before the next is handled.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self._file = open(path, "ab")
+        self.__name__ = f"FileSink({path!r})"
+
+    def __call__(self, events):
+        _write_frame(self._file, pickle.dumps(events, pickle.HIGHEST_PROTOCOL))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def read_events(path, after=-1):
+    """Yield the events a FileSink wrote to path with seq > after; stops at a torn final frame."""
+    with open(path, "rb") as f:
+        for _, payload in _read_frames(f):
+            for event in pickle.loads(payload):
+                if event.seq > after:
+                    yield event
+
+
+def replay(path, handler, after=-1, batch_size=256):
+    """Feed the events saved at path (seq > after) to handler in batches. Returns the last seq seen."""
+    batch, last = [], after
+    for event in read_events(path, after):
+        batch.append(event)
+        last = event.seq
+        if len(batch) >= batch_size:
+            handler(batch)
+            batch = []
+    if batch:
+        handler(batch)
+    return last
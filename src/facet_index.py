@@ -0,0 +1,161 @@
+# Secondary indexes for the catalog's author / genre / availability filters
+from bisect import bisect_left, insort
+from src.utils import fold_text, split_words
+
+
+class FacetIndex:
+    """
+    Maintained id sets for the search_catalog() filters:
+        - genre (trimmed, lowercased) -> book ids
+        - author (folded)             -> book ids, and author word -> authors
+        - ids with copies available, and ids with none left
+
+    Registered on the catalog with catalog.add_index(); availability sets
+    move as "copies_available" changes, so a faceted query is a handful
+    of set intersections instead of a catalog scan.
+    """
+
+    def __init__(self):
+        self._by_genre = {}
+        self._by_author = {}     # folded author -> book ids
+        self._author_words = {}  # author word -> folded authors containing it
+        self._words = []         # the author words, sorted, for prefix lookups
+        self._available = set()
+        self._unavailable = set()
+        self._keys = {}  # book_id -> (genre key, author key), to undo an entry
+
+    # -------------------------------
+    # Catalog listener hooks
+    # -------------------------------
+    def add(self, book_id, record):
+        genre = record.get("genre")
+        genre_key = genre.strip().lower() if isinstance(genre, str) else None
+        author = record.get("author")
+        author_key = fold_text(author) if isinstance(author, str) else ""
+        if genre_key is not None:
+            self._by_genre.setdefault(genre_key, set()).add(book_id)
+        ids = self._by_author.get(author_key)
+        if ids is None:
+            ids = self._by_author[author_key] = set()
+            for w in set(split_words(author_key)):
+                authors = self._author_words.get(w)
+                if authors is None:
+                    authors = self._author_words[w] = set()
+                    insort(self._words, w)
+                authors.add(author_key)
+        ids.add(book_id)
+        self._keys[book_id] = (genre_key, author_key)
+        self._set_availability(book_id, record)
+
+    def discard(self, book_id):
+        keys = self._keys.pop(book_id, None)
+        if keys is None:
+            return
+        genre_key, author_key = keys
+        if genre_key is not None:
+            self._remove(self._by_genre, genre_key, book_id)
+        self._remove(self._by_author, author_key, book_id)
+        if author_key not in self._by_author:
+            for w in set(split_words(author_key)):
+                self._remove(self._author_words, w, author_key)
+                if w not in self._author_words:
+                    del self._words[bisect_left(self._words, w)]
+        self._available.discard(book_id)
+        self._unavailable.discard(book_id)
+
+    def update(self, book_id, record, key):
+        if key == "copies_available":
+            self._set_availability(book_id, record)
+        elif key in ("genre", "author"):
+            self.discard(book_id)
+            self.add(book_id, record)
+
+    def reorder(self):
+        pass  # id sets do not depend on catalog order
+
+    def clear(self):
+        self.__init__()
+
+    @staticmethod
+    def _remove(index, key, book_id):
+        ids = index[key]
+        ids.discard(book_id)
+        if not ids:
+            del index[key]
+
+    def _set_availability(self, book_id, record):
+        copies = record.get("copies_available", 0) or 0
+        self._available.discard(book_id)
+        self._unavailable.discard(book_id)
+        if copies > 0:
+            self._available.add(book_id)
+        elif copies == 0:
+            self._unavailable.add(book_id)
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    def genre_ids(self, genre):
+        return self._by_genre.get(genre.strip().lower(), set())
+
+    def author_ids(self, author):
+        """
+        Ids whose (folded) author contains author as a substring, or None
+        for an empty filter. Only the distinct authors that can contain it
+        are checked: those with its inner words, or with a word starting
+        with its second word, or containing its only word.
+        """
+        a = fold_text(author)
+        if not a:
+            return None
+        pieces = split_words(a)
+        if len(pieces) > 2:
+            # Words with a separator on both sides are whole author words
+            authors = min((self._author_words.get(w, ()) for w in pieces[1:-1]), key=len)
+        elif len(pieces) == 2:
+            # The word after a separator starts an author word
+            authors = set()
+            for w in self._words_from(pieces[1]):
+                authors.update(self._author_words[w])
+        elif pieces:
+            authors = set()
+            for w in self._words:
+                if pieces[0] in w:
+                    authors.update(self._author_words[w])
+        else:
+            authors = self._by_author
+        ids = set()
+        for key in authors:
+            if a in key:
+                ids.update(self._by_author[key])
+        return ids
+
+    def _words_from(self, prefix):
+        """Author words starting with prefix."""
+        words = self._words
+        i = bisect_left(words, prefix)
+        while i < len(words) and words[i].startswith(prefix):
+            yield words[i]
+            i += 1
+
+    def available_ids(self, available=True):
+        return self._available if available else self._unavailable
+
+    def candidates(self, author="", genre="", available=None):
+        """
+        Intersect the filter sets, smallest first.
+        Returns a new set of book ids, or None if no filter was given.
+        """
+        sets = []
+        if genre.strip():
+            sets.append(self.genre_ids(genre))
+        if author.strip():
+            ids = self.author_ids(author)
+            if ids is not None:
+                sets.append(ids)
+        if available is not None:
+            sets.append(self.available_ids(available))
+        if not sets:
+            return None
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
@@ -0,0 +1,139 @@
+# Trigram index over the search vocabulary, for typo-tolerant matching
+from collections import Counter
+from src.utils import STOP_WORDS
+
+
+def max_typos(word):
+    """Edits a query word may be from an indexed term: none under 4 characters or with digits, 1 under 8, else 2."""
+    if len(word) < 4 or not word.isalpha() or word in STOP_WORDS:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+def trigrams(term):
+    """The distinct trigrams of term, padded with "$" at both ends."""
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def letters(term):
+    """Bit set of the characters in term (folded onto 64 bits; a collision only loosens the check)."""
+    mask = 0
+    for c in term:
+        mask |= 1 << (ord(c) & 63)
+    return mask
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance between a and b: insertions,
+    deletions, substitutions and swaps of adjacent characters count one
+    edit each. Returns limit + 1 once the distance exceeds limit (meant
+    for the small limits of max_typos()).
+    """
+    # A shared prefix or suffix costs nothing
+    shortest = min(len(a), len(b))
+    head = 0
+    while head < shortest and a[head] == b[head]:
+        head += 1
+    tail = 0
+    while tail < shortest - head and a[-1 - tail] == b[-1 - tail]:
+        tail += 1
+    a, b = a[head:len(a) - tail], b[head:len(b) - tail]
+    over = limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return over
+    if not a or not b:
+        return len(a) + len(b)
+    if limit <= 1:
+        # One edit leaves a single character, or a swapped pair, between the shared ends
+        if limit and len(a) == len(b) and (len(a) == 1 or (len(a) == 2 and a == b[::-1])):
+            return 1
+        return over
+
+    # a and b now differ in their first characters: the first edit deletes,
+    # inserts or substitutes one of them, or swaps two
+    best = min(edit_distance(a[1:], b[1:], limit - 1),
+               edit_distance(a[1:], b, limit - 1),
+               edit_distance(a, b[1:], limit - 1))
+    if best and len(a) > 1 and len(b) > 1 and a[0] == b[1] and a[1] == b[0]:
+        best = min(best, edit_distance(a[2:], b[2:], limit - 1))
+    return min(best + 1, over)
+
+
+class FuzzyIndex:
+    """
+    Finds the indexed terms within a few edits of a misspelled word
+    ("tolkein" -> "tolkien", "hobit" -> "hobbit").
+
+    Holds the search vocabulary (the TextIndex terms, kept in step through
+    TextIndex.set_vocabulary()) and a posting set of terms per trigram. A
+    term within d edits of a word of n trigrams shares at least n - 4d of
+    them (one edit changes at most four) and differs from it in at most
+    2d distinct letters, so only the terms passing both counts go through
+    edit_distance(). The cost grows with the vocabulary sharing the word's
+    trigrams, not with the catalog.
+    """
+
+    def __init__(self):
+        self._grams = {}  # trigram -> set of terms
+        self._terms = {}  # term -> letters(term)
+
+    def __len__(self):
+        return len(self._terms)
+
+    # -------------------------------
+    # Vocabulary hooks (TextIndex)
+    # -------------------------------
+    def add(self, term):
+        if term in self._terms:
+            return
+        self._terms[term] = letters(term)
+        for gram in trigrams(term):
+            self._grams.setdefault(gram, set()).add(term)
+
+    def discard(self, term):
+        if self._terms.pop(term, None) is None:
+            return
+        for gram in trigrams(term):
+            terms = self._grams[gram]
+            terms.discard(term)
+            if not terms:
+                del self._grams[gram]
+
+    def clear(self):
+        self._grams = {}
+        self._terms = {}
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    def similar(self, word, max_edits=None):
+        """
+        Indexed terms within max_edits (default max_typos(word)) edits of
+        word, as a list of (term, edits), closest first. word itself comes
+        first with 0 edits when it is indexed.
+        """
+        if max_edits is None:
+            max_edits = max_typos(word)
+        found = [(word, 0)] if word in self._terms else []
+        if max_edits <= 0:
+            return found
+
+        grams = trigrams(word)
+        need = max(1, len(grams) - 4 * max_edits)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        shared.pop(word, None)
+
+        size, mask, terms = len(word), letters(word), self._terms
+        for term, count in shared.items():
+            if (count < need or abs(len(term) - size) > max_edits
+                    or (terms[term] ^ mask).bit_count() > 2 * max_edits):
+                continue
+            edits = edit_distance(word, term, max_edits)
+            if edits <= max_edits:
+                found.append((term, edits))
+        found.sort(key=lambda hit: (hit[1], hit[0]))
+        return found
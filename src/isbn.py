@@ -0,0 +1,123 @@
+# Batch code validation: NumPy digit arrays for ISBN checksums + ISBN-10 -> ISBN-13 normalization
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; without it codes are checked one by one
+    np = None
+
+_WIDTH = 24  # bytes kept per code; longer codes (hyphens included) take the per-code path
+_ZERO, _NINE = ord("0"), ord("9")
+if np is not None:
+    _W10 = np.arange(10, 0, -1, dtype=np.int16)
+    _W13 = np.tile(np.array([1, 3], np.int16), 7)[:13]
+    _W10_TO_13 = np.tile(np.array([3, 1], np.int16), 5)[:9]  # weights of an ISBN-10 body inside "978..."
+    _COLUMNS = np.arange(_WIDTH)
+    _ALNUM = np.array([chr(i).isalnum() for i in range(128)] + [False] * 128)
+_PREFIX_SUM = 9 * 1 + 7 * 3 + 8 * 1  # checksum contribution of the "978" prefix
+
+
+def validate_codes(codes):
+    """
+    validate_code() for a batch of strings, plus the canonical ISBN-13.
+
+    Returns (valid, isbn13): a list of bools and, per code, its ISBN-13
+    form ("978" + the ISBN-10 body + a new check digit for a valid ISBN-10,
+    the digits for a valid ISBN-13) or None for library IDs and invalid
+    codes. The codes are copied once into a NumPy (n, 24) byte array where
+    checksums are computed, ISBN-10s converted and library IDs checked
+    against an ASCII alphanumeric table; only codes with separators are
+    cleaned one by one. Non-ASCII and over-long codes follow
+    validate_code() per code. A code int() cannot read counts as invalid
+    instead of raising ValueError as validate_code() does.
+    """
+    codes = list(codes)
+    n = len(codes)
+    if np is None or not n:
+        pairs = [_scalar(_clean(c)) for c in codes]
+        return [ok for ok, _ in pairs], [canon for _, canon in pairs]
+
+    lengths = np.fromiter(map(len, codes), np.int64, n)
+    slow = lengths > _WIDTH
+    try:
+        chars = np.array(codes, dtype=f"S{_WIDTH}")
+    except UnicodeEncodeError:
+        ascii_only = np.fromiter((c.isascii() for c in codes), bool, n)
+        slow |= ~ascii_only
+        chars = np.array([c if ok else "" for c, ok in zip(codes, ascii_only.tolist())], dtype=f"S{_WIDTH}")
+    chars = chars.view(np.uint8).reshape(n, _WIDTH)
+
+    hyphenated = np.flatnonzero(((chars == ord("-")) | (chars == ord(" "))).any(axis=1) & ~slow)
+    if len(hyphenated):
+        cleaned = [codes[i].replace("-", "").replace(" ", "") for i in hyphenated.tolist()]
+        chars[hyphenated] = np.array(cleaned, dtype=f"S{_WIDTH}").view(np.uint8).reshape(-1, _WIDTH)
+        lengths[hyphenated] = np.fromiter(map(len, cleaned), np.int64, len(cleaned))
+
+    first = chars[:, 0]
+    isbn_like = (first == _ZERO) | (first == _NINE)
+    valid = np.zeros(n, bool)
+    canon = np.zeros((n, 13), np.uint8)
+
+    rows = np.flatnonzero(isbn_like & (lengths == 10))
+    digits = chars[rows, :10] - np.uint8(_ZERO)  # wraps around below "0", so one compare tests for a digit
+    is_x = (chars[rows, :10] | 0x20) == ord("x")
+    ok = (is_x | (digits <= 9)).all(axis=1) & (np.where(is_x, 10, digits) @ _W10 % 11 == 0)
+    valid[rows] = ok
+    # An ISBN-10 whose body has an X cannot be carried over to ISBN-13
+    ok &= ~is_x[:, :9].any(axis=1)
+    rows, body = rows[ok], digits[ok, :9]
+    canon[rows, :3] = (9 + _ZERO, 7 + _ZERO, 8 + _ZERO)
+    canon[rows, 3:12] = body + _ZERO
+    canon[rows, 12] = (10 - (_PREFIX_SUM + body @ _W10_TO_13) % 10) % 10 + _ZERO
+
+    rows = np.flatnonzero(isbn_like & (lengths == 13))
+    digits = chars[rows, :13] - np.uint8(_ZERO)
+    ok = (digits <= 9).all(axis=1) & (digits @ _W13 % 10 == 0)
+    valid[rows] = ok
+    canon[rows[ok]] = chars[rows[ok], :13]
+
+    # Library IDs: 5-20 alphanumeric characters
+    rows = np.flatnonzero(~(isbn_like & ((lengths == 10) | (lengths == 13))) & (lengths >= 5) & (lengths <= 20))
+    padding = _COLUMNS >= lengths[rows, None]
+    valid[rows] = (_ALNUM[chars[rows]] | padding).all(axis=1)
+
+    has_isbn13 = canon[:, 0] != 0
+    isbn13 = np.full(n, None, object)
+    isbn13[has_isbn13] = canon[has_isbn13].astype(np.uint32).view("<U13").ravel()
+    isbn13 = isbn13.tolist()
+    valid = valid.tolist()
+
+    # Non-ASCII codes (Unicode digits int() accepts, letters upper() expands)
+    # and codes cut off by the array width follow validate_code() one by one
+    for i in np.flatnonzero(slow).tolist():
+        valid[i], isbn13[i] = _scalar(_clean(codes[i]))
+    return valid, isbn13
+
+
+def isbn13(code):
+    """The canonical ISBN-13 of one code, or None if it is not a valid ISBN."""
+    return _scalar(_clean(code))[1]
+
+
+def _clean(code):
+    return code.replace("-", "").replace(" ", "").upper()
+
+
+def _scalar(code):
+    """(valid, ISBN-13 or None) for a cleaned code, the rules of validate_code()."""
+    length = len(code)
+    if length in (10, 13) and code[0] in "09":
+        try:
+            values = [10 if ch == "X" and length == 10 else int(ch) for ch in code]
+        except ValueError:  # a character int() cannot read
+            return False, None
+        if length == 10:
+            if sum(v * w for v, w in zip(values, range(10, 0, -1))) % 11:
+                return False, None
+            if 10 in values[:9]:
+                return True, None
+            body = values[:9]
+            check = (10 - (_PREFIX_SUM + sum(v * (3 if i % 2 == 0 else 1) for i, v in enumerate(body))) % 10) % 10
+            return True, "978" + "".join(map(str, body)) + str(check)
+        if sum(v * (1 if i % 2 == 0 else 3) for i, v in enumerate(values)) % 10:
+            return False, None
+        return True, "".join(map(str, values))
+    return 5 <= length <= 20 and code.isalnum(), None
@@ -1,20 +1,271 @@
 # Main function library (fully flattened version — no class wrapper)
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta, timezone
 from collections import defaultdict, Counter
-import re, unicodedata
+import heapq, inspect, re, sys, threading
 from decimal import Decimal, ROUND_HALF_UP
+from src.catalog_store import CatalogStore
+from src.concurrency import CirculationLocks
+from src.due_dates import HolidayCalendar, add_business_days, due_dates
+from src.events import EventBus
+from src.facet_index import FacetIndex
+from src.fuzzy_index import FuzzyIndex
+from src.isbn import validate_codes as _validate_codes
+from src.loan_archive import LoanArchive
+from src.loan_ledger import LoanLedger
+from src.member_directory import MemberDirectory
+from src.borrowing_report import BorrowingReport
+from src.loan_columns import LoanColumns
+from src.metrics import MetricsRegistry
+from src.prefix_index import PrefixIndex, typed_keys
+from src.rating_index import RatingIndex
+from src.recommender import CoBorrowIndex, ContentIndex, Recommender
+from src.result_cache import CatalogVersions, LoanVersions, ResultCache, Versions
+from src.storage import LibraryStore
+from src.text_index import TextIndex
+from src.utils import STOP_WORDS, fold_text, split_words
+from src.waitlist import Waitlist
 
 # -------------------------------------
 # Global Data Structures
 # -------------------------------------
-catalog = []         # list of {"id","title","author","genre","copies_total","copies_available"}
-members = {}         # dict of member_id: {"name","email","phone"}
+catalog = CatalogStore()  # list of {"id","title","author","genre","copies_total","copies_available"}, indexed by id
+search_index = TextIndex()  # token -> book ids over title/author/genre/tags, kept in sync with catalog
+facet_index = FacetIndex()  # genre / author word -> book ids, plus available and unavailable id sets
+fuzzy_index = FuzzyIndex()  # trigram -> search_index terms, for search_catalog(fuzzy=True)
+search_index.set_vocabulary(fuzzy_index)
+catalog.add_index(search_index)
+catalog.add_index(facet_index)
+
+members = MemberDirectory()  # dict of member_id: {"name","email","phone"}; reports MemberRecord edits
 reminders = []       # list of {"member_id","book_id","due_date", "message"}
-loans = []           # list of {"member_id","book_id","loan_date","due_date","returned": bool}
+loans = LoanLedger()  # list of {"member_id","book_id","borrow_date","due_date","returned": bool}, indexed by member/book/due date
 reservations = {}    # member_id -> list of book_ids
-waitlists = {}       # book_id   -> list of member_ids
+waitlists = {}       # book_id   -> Waitlist of member_ids (the only waitlist; see waitlist_of())
 ratings = {}         # book_id -> {member_id: rating}
 average_ratings = {} # book_id -> average_rating
+rating_index = RatingIndex()  # running rating sum / count per book, top-rated orders per genre
+catalog.add_index(rating_index)
+materialized_report = BorrowingReport()  # generate_borrowing_report() aggregates, updated on every loan change
+loans.add_listener(materialized_report)
+content_index = ContentIndex()  # tag / author -> book ids and title order for recommend_books()
+catalog.add_index(content_index)
+co_borrow = CoBorrowIndex()  # book -> {book: members who borrowed both}, from the loan ledger
+loans.add_listener(co_borrow)
+typeahead_index = PrefixIndex()  # normalized title / author prefixes -> completions weighted by loans and stock
+catalog.add_index(typeahead_index)
+loans.add_listener(typeahead_index.loan_counts)
+recommender = Recommender(catalog, content_index, co_borrow, rating_index=rating_index)
+versions = Versions()  # change stamps per book / member / tag group for the result caches below
+catalog.add_index(CatalogVersions(versions))
+loans.add_listener(LoanVersions(versions, co_borrow))
+members.on_change = lambda member_id: versions.bump(("member", member_id))  # e.g. edited preferences
+search_cache = ResultCache(versions, maxsize=1024, ttl=300.0)      # search_catalog() rankings by normalized query + filters
+recommend_cache = ResultCache(versions, maxsize=4096, ttl=300.0)   # recommend_books() results by member
+holiday_calendar = HolidayCalendar()  # library closing days skipped by calculate_due_date (sorted, bisect lookups)
+store = None  # LibraryStore once open_store() is called; every change is then written to its WAL
+locks = CirculationLocks()  # striped per-book / per-member locks for concurrent circulation
+reminders_lock = threading.Lock()  # appends to reminders must keep their journaled index
+events = EventBus()  # typed change events for downstream subscribers (dashboards, search, e-mail)
+deferred_sync = ContextVar("deferred_sync", default=False)  # True while the caller makes changes durable itself (AsyncLibrary)
+metrics = MetricsRegistry()  # call counts, latency histograms and rows scanned, once enable_metrics() is called
+loan_archive = None  # LoanArchive of returned loans moved out of `loans`, once open_archive() is called
+auto_archive = None  # archive the returned loans whenever this many are live (see open_archive())
+
+
+# ----------------------------------------------------
+# Durable storage (snapshot + write-ahead log)
+# ----------------------------------------------------
+def open_store(path, **options):
+    """
+    Load the library state saved under directory `path` into the globals and
+    log every later change there. A new directory starts from the current
+    in-memory state. Options (batch_size, max_delay, fsync, checkpoint_bytes)
+    are passed to LibraryStore.
+    """
+    global store
+    close_store()
+    state = {"catalog": catalog, "loans": loans, "members": members, "reservations": reservations,
+             "waitlists": waitlists, "ratings": ratings, "average_ratings": average_ratings,
+             "reminders": reminders}
+    store = LibraryStore(path, state, **options).open()
+    if loan_archive is not None:
+        loans.attach_archive(loan_archive)  # drops reloaded loans the archive already holds
+    with catalog.lock:
+        rating_index.rebuild(ratings)
+    versions.bump_all()  # members and the other dicts were reloaded in place
+    return store
+
+
+def close_store():
+    """Flush the WAL and stop logging changes."""
+    global store
+    if store is not None:
+        store.close()
+        store = None
+
+
+# ----------------------------------------------------
+# Loan archive (returned loans in memory-mapped columns)
+# ----------------------------------------------------
+def open_archive(path, fsync=True, auto=None):
+    """
+    Open (or create) the loan archive in directory `path` and count it in
+    the borrowing reports, recommendations and loan_columns(). With
+    auto=N, returning a book archives the returned loans once N of them
+    are in the ledger. Needs NumPy. Open it before or after open_store();
+    the WAL logs archived loans as removed.
+    """
+    global loan_archive, auto_archive
+    close_archive()
+    archive = LoanArchive(path, fsync=fsync).open()
+    with loans.lock:
+        loans.attach_archive(archive)
+        loan_archive, auto_archive = archive, auto
+    if store is not None:
+        store.sync()
+    return archive
+
+
+def close_archive():
+    """Stop counting the archived loans and close the archive files."""
+    global loan_archive, auto_archive
+    with loans.lock:
+        if loan_archive is not None:
+            loans.detach_archive()
+            loan_archive.close()
+        loan_archive, auto_archive = None, None
+
+
+def archive_loans(before=None):
+    """
+    Move the returned loans (returned before `before`, a datetime, if
+    given) from the ledger to the archive. Returns how many moved. Loans
+    the archive cannot store exactly (string dates, extra fields, ...)
+    stay in the ledger.
+    """
+    if loan_archive is None:
+        raise RuntimeError("No loan archive is open; call open_archive() first.")
+    with loans.lock:
+        moved = [r for r in loans if LoanArchive.accepts(r)
+                 and (before is None or (r.get("return_date") or r["due_date"]) < before)]
+        if not moved:
+            return 0
+        loan_archive.append(moved)  # committed first: a crash now leaves copies that open_archive() drops
+        loans.take(moved)
+    if store is not None:
+        store.sync()  # the next crash must not find a second batch of copies
+    return len(moved)
+
+
+# ----------------------------------------------------
+# Concurrency (per-book / per-member locks)
+# ----------------------------------------------------
+@contextmanager
+def circulation(member_id=None, book_id=None):
+    """
+    Hold the member's and the book's locks for a read-modify-write, then make
+    the operation's WAL records durable (outside the locks, so concurrent
+    operations share fsyncs). With deferred_sync set, the caller syncs later.
+    """
+    with locks.hold((member_id,), (book_id,)):
+        yield
+    if store is not None and not deferred_sync.get():
+        store.sync()
+
+
+def journal(name, key):
+    """
+    Log a change to global `name`[key] (members, reservations, ...) if a
+    store is open. A members change also outdates that member's cached
+    recommendations.
+    """
+    if name == "members":
+        versions.bump(("member", key))
+    if store is not None:
+        store.touch(name, key)
+
+
+# ----------------------------------------------------
+# Result caches (search_catalog / recommend_books)
+# ----------------------------------------------------
+def cache_stats():
+    """Size, hit / miss / eviction / expiration / invalidation counters of each result cache."""
+    return {"search": search_cache.stats(), "recommend": recommend_cache.stats()}
+
+
+def clear_caches():
+    """Drop every cached search and recommendation result."""
+    search_cache.clear()
+    recommend_cache.clear()
+
+
+# ----------------------------------------------------
+# Instrumentation (opt-in call metrics)
+# ----------------------------------------------------
+def enable_metrics(profile_slow=None, profile_dir=None, profile_every=1, allocations=False):
+    """
+    Wrap every public function here and the Book / Member / Loan / Search
+    methods so each call is counted and timed in `metrics` (allocations:
+    also count the memory blocks each call leaves allocated). With
+    profile_slow (seconds) and profile_dir, every profile_every-th call runs
+    under cProfile and the profiles of calls at least that slow are kept.
+    """
+    from src.book_class import Book
+    from src.loan_class import Loan
+    from src.member_class import Member
+    from src.search_class import Search
+
+    disable_metrics()
+    metrics.allocations = allocations
+    module = sys.modules[__name__]
+    names = [name for name, value in vars(module).items()
+             if inspect.isfunction(value) and value.__module__ == __name__ and not name.startswith("_")
+             and name not in ("enable_metrics", "disable_metrics")
+             and not inspect.isgeneratorfunction(getattr(value, "__wrapped__", None))]  # skip context managers
+    metrics.instrument(module, names)
+    for cls in (Book, Member, Loan, Search):
+        methods = [name for name, value in vars(cls).items()
+                   if isinstance(value, (staticmethod, classmethod)) or inspect.isfunction(value)
+                   if name == "__init__" or not name.startswith("_")]
+        metrics.instrument(cls, methods, prefix=f"{cls.__name__}.")
+    metrics.profile_slow(profile_slow, profile_dir, every=profile_every)
+    return metrics
+
+
+def disable_metrics():
+    """Restore the uninstrumented functions (the counters are kept until metrics.reset())."""
+    metrics.uninstrument()
+    metrics.profile_slow(None)
+
+
+# ----------------------------------------------------
+# Loan ledger helpers (shared by the check-out / return paths)
+# ----------------------------------------------------
+def _local_naive(dt):
+    """Convert an aware timestamp to naive local time, matching Loan records."""
+    return dt.astimezone().replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def _ledger_borrow(member_id, book_id, borrowed_at, due_at):
+    return loans.register({
+        "member_id": member_id,
+        "book_id": book_id,
+        "borrow_date": _local_naive(borrowed_at),
+        "due_date": _local_naive(due_at),
+        "returned": False,
+    })
+
+
+def _ledger_return(member_id, book_id, returned_at):
+    loan = loans.find_open(member_id, book_id)
+    if loan is not None:
+        loan["return_date"] = _local_naive(returned_at)
+        loan["returned"] = True
+        if auto_archive is not None and len(loans) - loans.open_count() >= auto_archive:
+            archive_loans()
+    return loan
 
 
 # ----------------------------------------------------
@@ -24,7 +275,11 @@ def is_book_available(title):
     t = title.strip().lower()
     for item in catalog:
         if item["title"].strip().lower() == t:
+            if metrics.enabled:
+                metrics.scanned("catalog", catalog.position(item["id"]) + 1)
             return item["copies_available"] > 0
+    if metrics.enabled:
+        metrics.scanned("catalog", len(catalog))
     return False
 
 
@@ -32,9 +287,13 @@ def is_book_available(title):
 # SIMPLE function (5-10 lines) Reminder Scheduling (Matthew)
 # ----------------------------------------------------
 def schedule_reminder(member_id, book_id, due_date):
-    if member_id in members and any(b["id"] == book_id for b in catalog):
+    if member_id in members and catalog.has(book_id):
         message = f"Reminder: Book ID {book_id} is due on {due_date}."
-        reminders.append({"member_id": member_id, "book_id": book_id, "due_date": due_date, "message": message})
+        with reminders_lock:
+            reminders.append({"member_id": member_id, "book_id": book_id, "due_date": due_date, "message": message})
+            journal("reminders", len(reminders) - 1)
+            events.publish("reminder.scheduled", member_id=member_id, book_id=book_id, due_date=due_date,
+                           index=len(reminders) - 1)
         return True
     return False
 
@@ -42,58 +301,137 @@ def schedule_reminder(member_id, book_id, due_date):
 # ----------------------------------------------------
 # MEDIUM (15–25 lines) Search and Filter Catalog (Matthew)
 # ----------------------------------------------------
-def search_catalog(query: str = "", author: str = "", genre: str = "", available: bool = None):
-    results = []
-    q = query.strip().lower()
-    a = author.strip().lower()
-    g = genre.strip().lower()
-    
-    for item in catalog:
-        title_match = (q in item["title"].strip().lower()) or (q in item["author"].strip().lower()) if q else True
-        author_match = a in item["author"].strip().lower() if a else True
-        genre_match = (g == item["genre"].strip().lower()) if g else True
-        availability_match = (item["copies_available"] > 0) if available is True else (item["copies_available"] == 0) if available is False else True
+def search_catalog(query: str = "", author: str = "", genre: str = "", available: bool = None, limit: int = None,
+                   fuzzy: bool = False):
+    tokens = format_search_query(query)["tokens"] if query.strip() else []
+    if query.strip() and not tokens:
+        # Only stop words ("the", "of the"): match them as a phrase, never drop the query
+        words = split_words(fold_text(query))
+        if not words:
+            return []
+        tokens = [" ".join(words)]
+    author_key = fold_text(author) if author.strip() else ""
+    genre_key = genre.strip().lower()
+    with catalog.lock:  # index reads must not interleave with a concurrent update
+        if not (tokens or author_key or genre_key):
+            # No query or text filter: the catalog itself, in order
+            if available is None:
+                results = list(catalog)
+                if metrics.enabled:
+                    metrics.scanned("catalog", len(results))
+                return results[:limit] if limit is not None else results
+            candidates = facet_index.candidates(available=available)
+            if metrics.enabled:
+                metrics.scanned("catalog", len(candidates))
+            if limit is not None:
+                return [catalog.get(bid) for bid in heapq.nsmallest(limit, candidates, key=catalog.position)]
+            return catalog.in_order(candidates)
+
+        # The ranking does not depend on stock, so one cached ranking serves
+        # every available / limit combination and checkouts never outdate it
+        key = (tuple(tokens), author_key, genre_key, bool(fuzzy and tokens))
+        ranked = search_cache.get(key)
+        if ranked is None:
+            stamp = versions.now()
+            ranked = _ranked_ids(tokens, author, genre, fuzzy)
+            search_cache.put(key, ranked, ("catalog",), stamp)
+            if metrics.enabled:
+                metrics.scanned("catalog", len(ranked))
+
+        if limit is not None:
+            limit = max(limit, 0)
+        if available is None:
+            return [catalog.get(bid) for bid in ranked[:limit]]
+        results = []
+        checked = 0
+        for bid in ranked:
+            if limit is not None and len(results) == limit:
+                break
+            book = catalog.get(bid)
+            checked += 1
+            copies = book.get("copies_available", 0) or 0
+            if (copies > 0) if available else (copies == 0):
+                results.append(book)
+        if metrics.enabled:
+            metrics.scanned("catalog", checked)
+        return results
+
 
-        if title_match and author_match and genre_match and availability_match:
-            results.append(item)
-    return results
+def typeahead(prefix: str, limit: int = 10, field: str = None):
+    """
+    Completions for a search box as the patron types: the `limit` titles
+    and authors starting with `prefix` (or with a later word of it), most
+    borrowed and in-stock first. Matching uses format_search_query()'s
+    normalization, except that the word being typed is kept even when it
+    is a stop word ("a" -> "Atwood"). field: "title" or "author" to get
+    only those. Returns a list of {"text", "field", "book_id", "score"}.
+    """
+    if field not in (None, "title", "author"):
+        raise ValueError("field must be 'title', 'author' or None")
+    keys = typed_keys(prefix)
+    if not keys:
+        return []
+    return typeahead_index.complete(keys, limit, field)
+
+
+def _ranked_ids(tokens, author, genre, fuzzy=False):
+    """Ids matching the query tokens and author / genre filters, best first."""
+    # Filters first: intersect the maintained genre / author sets
+    candidates = facet_index.candidates(author, genre)
+
+    if fuzzy and tokens:
+        # Exact matches (0 edits) first, then the books whose words needed fewest corrections
+        hits = search_index.fuzzy_search(tokens, fuzzy_index, candidates)
+        if hits is not None:
+            return [bid for bid, _, _ in sorted(hits, key=lambda hit: (hit[1], -hit[2], catalog.position(hit[0])))]
+
+    # Keyword part: posting-list lookup in the inverted index, ranked by BM25
+    hits = search_index.search(tokens, candidates) if tokens else None
+    if hits is None:
+        return sorted(candidates, key=catalog.position)
+    return [bid for bid, _ in sorted(hits, key=lambda hit: (-hit[1], catalog.position(hit[0])))]
 
 
 # ----------------------------------------------------
 # COMPLEX (30+ lines) Automated Overdue Notifications (Matthew)
 # ----------------------------------------------------
 def automated_overdue_notifications(today: datetime | None = None, daily_fee: float = 0.25, grace_days: int = 0):
+    messages = [] # list of {"member_id", "message", "fee"}  
+    notified_member_ids = set()
+
+    for message in overdue_messages(today, daily_fee, grace_days):
+        notified_member_ids.add(message["member_id"])
+        messages.append(message)
+
+    return {
+        "total_overdue_items": len(messages),
+        "notified_member_count": len(notified_member_ids),
+        "messages": messages
+    }
+
+
+def overdue_messages(today: datetime | None = None, daily_fee: float = 0.25, grace_days: int = 0):
+    """Yield one {"member_id", "text", "fee"} notice per overdue loan (see automated_overdue_notifications)."""
     if today is None:
         today = datetime.now().date()
+    elif isinstance(today, datetime):
+        today = today.date()
     cutoff_date = today - timedelta(days=grace_days)
 
-    messages = [] # list of {"member_id", "message", "fee"}  
-    total_overdue_items = 0
-    notified_member_ids = set()
-
-    for loan in loans:
-        if loan["returned"]:
-            continue
+    # The ledger's due-date heap yields only open loans due before the cutoff
+    for loan in loans.due_before(cutoff_date):
+        if metrics.enabled:
+            metrics.scanned("loans")
         due_date = loan["due_date"]
-        if not isinstance(due_date, datetime):
-            continue
-        if due_date.date() >= cutoff_date:
-            continue
 
-        book = None
-        for b in catalog:
-            if b["id"] == loan["book_id"]:
-                book = b
-                break
+        book = catalog.get(loan["book_id"])
         title = book.get("title","Unknown Title") if book else str(loan["book_id"])
 
         member = members.get(loan["member_id"], {"name": "Member"})
         member_id = loan["member_id"]
 
-        days_overdue = (today - due_date).days
+        days_overdue = (today - due_date.date()).days
         fee = max(0, days_overdue) * daily_fee
-        total_overdue_items += 1
-        notified_member_ids.add(member_id)
 
         text = (
             f"Hello {member.get('name','Member')}, "
@@ -101,46 +439,41 @@ def automated_overdue_notifications(today: datetime | None = None, daily_fee: fl
             f"Estimated fee so far: ${fee:.2f}. "
             f"Due date was {due_date.date()}. Please return or renew."
         )
-        messages.append({"member_id": member_id, "text": text, "fee": round(fee, 2)})
-
-    return {
-        "total_overdue_items": total_overdue_items,
-        "notified_member_count": len(notified_member_ids),
-        "messages": messages
-    }
+        yield {"member_id": member_id, "text": text, "fee": round(fee, 2)}
 
 
 # ----------------------------------------------------
 # SIMPLE function (5-10 lines) RESERVE BOOK (ABI)
 # ----------------------------------------------------
 def reserve_book(member_id: str, book_id: str) -> str:
-    book = None
-    for item in catalog:
-        if item["id"] == book_id:
-            book = item
-            break
+    book = catalog.get(book_id)
     if book is None:
         return f"Book '{book_id}' not found in catalog."
 
-    if member_id not in reservations:
-        reservations[member_id] = []
+    with circulation(member_id, book_id):
+        if member_id not in reservations:
+            reservations[member_id] = []
+            journal("reservations", member_id)
 
-    if book_id in reservations[member_id]:
-        return f"You have already reserved book '{book_id}'."
+        if book_id in reservations[member_id]:
+            return f"You have already reserved book '{book_id}'."
 
-    copies_left = int(book.get("copies_available", 0))
-    if copies_left > 0:
-        reservations[member_id].append(book_id)
-        book["copies_available"] = copies_left - 1
-        return f"Book '{book_id}' reserved for member '{member_id}'."
+        copies_left = int(book.get("copies_available", 0))
+        if copies_left > 0:
+            reservations[member_id].append(book_id)
+            journal("reservations", member_id)
+            book["copies_available"] = copies_left - 1
+            events.publish("reservation.added", member_id=member_id, book_id=book_id)
+            return f"Book '{book_id}' reserved for member '{member_id}'."
 
-    if book_id not in waitlists:
-        waitlists[book_id] = []
-    if member_id in waitlists[book_id]:
-        return f"You are already on the waitlist for book '{book_id}'."
+        waitlist = waitlist_of(book_id)
+        if member_id in waitlist:
+            return f"You are already on the waitlist for book '{book_id}'."
 
-    waitlists[book_id].append(member_id)
-    return f"No copies available. Member '{member_id}' added to the waitlist for '{book_id}'."
+        waitlist.append(member_id)
+        journal("waitlists", book_id)
+        events.publish("waitlist.joined", book_id=book_id, member_id=member_id, position=len(waitlist))
+        return f"No copies available. Member '{member_id}' added to the waitlist for '{book_id}'."
 
 
 # ----------------------------------------------------
@@ -150,27 +483,48 @@ def rate_book(member_id, book_id, rating):
     if rating < 1 or rating > 5:
         raise ValueError("Rating must be between 1 and 5 stars.")
 
-    if book_id not in ratings:
-        ratings[book_id] = {}
-
-    has_previous_rating = False
-    if member_id in ratings[book_id]:
-        has_previous_rating = True
-
-    ratings[book_id][member_id] = rating
+    with circulation(book_id=book_id):
+        if book_id not in ratings:
+            ratings[book_id] = {}
+
+        has_previous_rating = False
+        if member_id in ratings[book_id]:
+            has_previous_rating = True
+
+        previous = ratings[book_id].get(member_id)
+        ratings[book_id][member_id] = rating
+
+        with catalog.lock:
+            sum_of_ratings, total_ratings = rating_index.vote(book_id, rating, previous)
+        new_average = round(sum_of_ratings / total_ratings, 2)
+        average_ratings[book_id] = new_average
+        if recommender.rating_weight:  # only the indexed recommendations read ratings, and only when weighted
+            versions.bump("ratings")
+        journal("ratings", book_id)
+        journal("average_ratings", book_id)
+        events.publish("rating.set", book_id=book_id, member_id=member_id, rating=rating, previous=previous,
+                       average=new_average)
+
+        if has_previous_rating:
+            message = f"Updated rating for book '{book_id}' to {rating} stars. New average: {new_average}"
+        else:
+            message = f"Rated book '{book_id}' with {rating} stars. Average now: {new_average}"
 
-    rating_values = [user_rating for user_rating in ratings[book_id].values()]
-    total_ratings = len(rating_values)
-    sum_of_ratings = sum(rating_values)
-    new_average = round(sum_of_ratings / total_ratings, 2)
-    average_ratings[book_id] = new_average
+        return message
 
-    if has_previous_rating:
-        message = f"Updated rating for book '{book_id}' to {rating} stars. New average: {new_average}"
-    else:
-        message = f"Rated book '{book_id}' with {rating} stars. Average now: {new_average}"
 
-    return message
+def top_rated_books(limit: int = 10, genre: str = "", bayesian: bool = False, min_votes: int = 1):
+    """
+    The highest rated catalog books, optionally within one genre, as
+    [(book_id, score)] best first (ties: more votes first, then id).
+    score is the average rating rounded to 2 places, or with bayesian=True
+    the Bayesian average that pulls books with few votes towards
+    rating_index.prior_mean. Books with fewer than min_votes ratings are
+    left out.
+    """
+    with catalog.lock:
+        best = rating_index.top(max(limit, 0), genre.strip() or None, bayesian, min_votes)
+    return [(book_id, round(score, 2)) for book_id, score in best]
 
 
 # ----------------------------------------------------
@@ -211,18 +565,46 @@ def validate_isbn13_format(isbn_code):
     return total_sum % 10 == 0
 
 
+def validate_codes(codes):
+    """
+    Batch validate_code(): returns (valid, isbn13), a list of bools and the
+    canonical ISBN-13 of each code (ISBN-10s converted, None for library
+    IDs and invalid codes), so one book is keyed the same under both forms.
+    Checksums run on NumPy digit arrays when NumPy is installed.
+    """
+    return _validate_codes(codes)
+
+
 # ----------------------------------------------------
 # COMPLEX (30+ lines) Generating Borrowing Report (ABI)
 # ----------------------------------------------------
 def generate_borrowing_report(fine_per_day=0.5):
     total_borrowed = len(loans)
     overdue_count = 0
-    total_fines = 0.0
+    total_late_days = 0
 
     users = defaultdict(lambda: {"borrowed": 0, "overdue": 0, "fines": 0.0})
+    late_days = defaultdict(int)
     book_counts = Counter()
     current_date = datetime.today()
 
+    # Archived loans were all returned: start from the archive's per-member and per-book totals
+    archive = loan_archive
+    if archive is not None:
+        totals = archive.totals()
+        total_borrowed += len(archive)
+        overdue_count = totals["overdue_total"]
+        total_late_days = totals["late_days_total"]
+        for user_id, borrowed, overdue, days in zip(archive.members, totals["borrowed"].tolist(),
+                                                    totals["overdue"].tolist(), totals["late_days"].tolist()):
+            users[user_id]["borrowed"] = borrowed
+            users[user_id]["overdue"] = overdue
+            if days:
+                late_days[user_id] = days
+        book_counts.update(dict(zip(archive.books, totals["book_counts"].tolist())))
+    if metrics.enabled:
+        metrics.scanned("loans", len(loans))
+
     for record in loans:
         user_id = record.get("user_id") or record.get("member_id")
         book_id = record.get("book_id")
@@ -256,11 +638,16 @@ def generate_borrowing_report(fine_per_day=0.5):
 
         if returned_on > due_on:
             days_late = (returned_on - due_on).days
-            fine_amount = days_late * fine_per_day
             users[user_id]["overdue"] += 1
-            users[user_id]["fines"] += fine_amount
+            late_days[user_id] += days_late
             overdue_count += 1
-            total_fines += fine_amount
+            total_late_days += days_late
+
+    # Fines are late days x rate, summed as whole days first so the
+    # incrementally maintained report (live_borrowing_report) matches exactly
+    for user_id, days in late_days.items():
+        users[user_id]["fines"] = 0.0 + days * fine_per_day
+    total_fines = 0.0 + total_late_days * fine_per_day
 
     most_active = max(users, key=lambda u: users[u]["borrowed"], default=None)
     top_book = book_counts.most_common(1)[0][0] if book_counts else None
@@ -275,11 +662,41 @@ def generate_borrowing_report(fine_per_day=0.5):
     }
     return report
 
+
+def live_borrowing_report(fine_per_day=0.5, *, since=None, window_days=None):
+    """
+    generate_borrowing_report() served from the materialized aggregates
+    that the loan ledger keeps up to date, so polling it is cheap.
+        since: version from an earlier result; only changed users are listed
+        window_days: only loans borrowed in the last N days (e.g. 7, 30, 365)
+    """
+    with loans.lock:
+        return materialized_report.report(fine_per_day, since=since, window_days=window_days)
+
+
+def loan_columns(records=None):
+    """
+    Columnar NumPy snapshot of the loans (or of `records`) for batch jobs
+    such as month-end reconciliation. Its borrowing_report(), overdue()
+    and member_totals() give the same numbers as the row-by-row functions.
+    The loans include the archived ones (copied in front of the ledger's);
+    loan_archive.columns() reads those alone without copying.
+    Needs NumPy; raises ImportError without it.
+    """
+    if records is not None:
+        return LoanColumns.from_records(records)
+    with loans.lock:
+        live = LoanColumns.from_records(loans)
+        if loan_archive is None:
+            return live
+        return LoanColumns.concat([loan_archive.columns(), live])
+
 # ----------------------------------------------------
 # Simple Function (5-10 lines) Calculate Due Date (kaliza)
 # Calculate the due date for a borrowed library item.
 # ----------------------------------------------------
-def calculate_due_date(borrow_date: datetime, loan_days: int = 14, skip_weekends: bool = True) -> datetime:
+def calculate_due_date(borrow_date: datetime, loan_days: int = 14, skip_weekends: bool = True,
+                       calendar: HolidayCalendar = None) -> datetime:
     """Calculate the due date for a borrowed library item."""
 
     if not isinstance(borrow_date, datetime):
@@ -289,26 +706,29 @@ def calculate_due_date(borrow_date: datetime, loan_days: int = 14, skip_weekends
     if loan_days <= 0:
         raise ValueError("loan_days must be greater than 0")
     # makes sure the number of loan days is positive (you can’t borrow for 0 or negative days)
-    
-    due_date = borrow_date
-    # start counting from the date the book was borrowed
 
-    days_added = 0
-    # keeps track of how many valid days have been counted so far
+    start = borrow_date.toordinal()
+    # start counting from the date the book was borrowed
 
-    while days_added < loan_days:
-        due_date += timedelta(days=1)
-        # move forward by one day
+    end = add_business_days(start, loan_days, skip_weekends,
+                            holiday_calendar if calendar is None else calendar)
+    # jump whole weeks at once (5 weekdays = 7 days) instead of stepping day by day;
+    # if skip_weekends is True, Saturdays (5) and Sundays (6) are not counted,
+    # and days in the holiday calendar are never counted
 
-        if skip_weekends and due_date.weekday() in (5, 6):
-            continue
-        # if skip_weekends is True, skip Saturdays (5) and Sundays (6)
+    return borrow_date + timedelta(days=end - start)
+    # keep the borrow time of day and return the due date
 
-        days_added += 1
-        # only count this day if it’s not a weekend
 
-    return due_date
-    # once we’ve added all valid loan days, return the due date
+def calculate_due_dates(borrow_dates, loan_days=14, skip_weekends: bool = True,
+                        calendar: HolidayCalendar = None):
+    """
+    Batch calculate_due_date(): one due date per borrow date.
+    loan_days is a single int or one length per loan. A NumPy datetime64
+    array of borrow dates is handled with np.busday_offset and returns an array.
+    """
+    return due_dates(borrow_dates, loan_days, skip_weekends,
+                     holiday_calendar if calendar is None else calendar)
 
 
 # ----------------------------------------------------
@@ -327,6 +747,8 @@ def member_count(active_only: bool = True) -> int:
 
     count = 0
     # start a counter at zero to count members
+    if metrics.enabled:
+        metrics.scanned("members", len(users))
 
     for udata in users.values():
         # loop through every user’s information inside the dictionary
@@ -348,51 +770,59 @@ def check_in_out_operations(user_id: str, isbn: str, action: str = "borrow", loa
     """Manage check-in and check-out operations for library books."""
     
     users = members
-    catalog_list = catalog
 
     if user_id not in users:
         raise KeyError(f"User {user_id} not found")
     # makes sure the user exists in the system
 
-    book = None
-    for item in catalog_list:
-        if item.get("id") == isbn:
-            book = item
-            break
+    book = catalog.get(isbn)
+    # O(1) lookup through the catalog's id index
     if book is None:
         raise KeyError(f"Book {isbn} not found")
     # makes sure the book exists in the catalog
 
-    user = users[user_id]
-    # get that specific user’s data
-
-    if action == "borrow":
-        if book.get("copies_available", 0) <= 0:
-            raise ValueError(f"No available copies of {book.get('title', 'Unknown')}")
-        book["copies_available"] -= 1
-
-        loans = user.setdefault("loans", {})
-        if isbn in loans and loans[isbn].get("returned_at") is None:
-            raise ValueError("This book is already borrowed and not yet returned.")
-
-        borrowed_at = datetime.now(timezone.utc)
-        due_at = calculate_due_date(borrowed_at, loan_days)
-        loans[isbn] = {"borrowed_at": borrowed_at, "due_at": due_at, "returned_at": None}
-
-        return {"user": user_id, "book": isbn, "status": "borrowed", "due_at": due_at}
-
-    elif action == "return":
-        loans = user.get("loans", {})
-        if isbn not in loans or loans[isbn].get("returned_at"):
-            raise ValueError("Book not currently borrowed or already returned.")
-
-        book["copies_available"] = book.get("copies_available", 0) + 1
-        loans[isbn]["returned_at"] = datetime.now(timezone.utc)
+    with circulation(user_id, isbn):
+        user = users[user_id]
+        # get that specific user’s data
+
+        if action == "borrow":
+            if book.get("copies_available", 0) <= 0:
+                raise ValueError(f"No available copies of {book.get('title', 'Unknown')}")
+
+            loans = user.setdefault("loans", {})
+            if isbn in loans and loans[isbn].get("returned_at") is None:
+                raise ValueError("This book is already borrowed and not yet returned.")
+            book["copies_available"] -= 1
+            # only take the copy once the loan is known to be valid
+
+            borrowed_at = datetime.now(timezone.utc)
+            due_at = calculate_due_date(borrowed_at, loan_days)
+            loans[isbn] = {"borrowed_at": borrowed_at, "due_at": due_at, "returned_at": None}
+            _ledger_borrow(user_id, isbn, borrowed_at, due_at)
+            # record the loan in the global ledger (open-loan, member, book and due-date indexes)
+            journal("members", user_id)
+            # save the member's updated loan list if a store is open
+            events.publish("loan.borrowed", member_id=user_id, book_id=isbn, due_at=due_at)
+
+            return {"user": user_id, "book": isbn, "status": "borrowed", "due_at": due_at}
+
+        elif action == "return":
+            loans = user.get("loans", {})
+            if isbn not in loans or loans[isbn].get("returned_at"):
+                raise ValueError("Book not currently borrowed or already returned.")
+
+            book["copies_available"] = book.get("copies_available", 0) + 1
+            loans[isbn]["returned_at"] = datetime.now(timezone.utc)
+            _ledger_return(user_id, isbn, loans[isbn]["returned_at"])
+            # moves the ledger record out of the open set
+            journal("members", user_id)
+            events.publish("loan.returned", member_id=user_id, book_id=isbn, returned_at=loans[isbn]["returned_at"],
+                           fine=None)
+
+            return {"user": user_id, "book": isbn, "status": "returned", "returned_at": loans[isbn]["returned_at"]}
 
-        return {"user": user_id, "book": isbn, "status": "returned", "returned_at": loans[isbn]["returned_at"]}
-
-    else:
-        raise ValueError("Invalid action. Use 'borrow' or 'return'.")
+        else:
+            raise ValueError("Invalid action. Use 'borrow' or 'return'.")
 
 
 # ----------------------------------------------------
@@ -400,41 +830,99 @@ def check_in_out_operations(user_id: str, isbn: str, action: str = "borrow", loa
 # Add users to waitlist when a book is unavailable and notify them when available
 # ----------------------------------------------------
 def waitlist_management(isbn: str, user_id: str, action: str = "add") -> dict:
-    """Manage a book's waitlist for unavailable items."""
+    """
+    Manage a book's waitlist for unavailable items.
+    action: "add", "notify" (the member at the front), "cancel" or "position".
+    """
     
-    book = None
-    for item in catalog:
-        if item.get("id") == isbn:
-            book = item
-            break
+    book = catalog.get(isbn)
     if book is None:
         raise KeyError(f"Book {isbn} not found in catalog.")
     if user_id not in members:
         raise KeyError(f"User {user_id} not found.")
 
-    waitlist = book.setdefault("waitlist", [])
+    with circulation(book_id=isbn):
+        waitlist = waitlist_of(isbn)
+
+        if action == "add":
+            if book.get("copies_available", 0) > 0:
+                return {"message": f"Book '{book.get('title', 'Unknown')}' is available; no need for waitlist."}
+            if user_id in waitlist:
+                return {"message": f"User {user_id} is already on the waitlist for {isbn}."}
+
+            waitlist.append(user_id)
+            journal("waitlists", isbn)
+            events.publish("waitlist.joined", book_id=isbn, member_id=user_id, position=len(waitlist))
+            return {"isbn": isbn, "waitlist": waitlist}
+
+        elif action == "notify":
+            if not waitlist:
+                return {"message": f"No users on the waitlist for {isbn}."}
+            next_user = waitlist.popleft()
+            journal("waitlists", isbn)
+            events.publish("waitlist.notified", book_id=isbn, member_id=next_user)
+            return _notice(book, isbn, next_user)
+
+        elif action == "cancel":
+            if not waitlist.cancel(user_id):
+                return {"message": f"User {user_id} is not on the waitlist for {isbn}."}
+            journal("waitlists", isbn)
+            events.publish("waitlist.cancelled", book_id=isbn, member_id=user_id)
+            return {"isbn": isbn, "cancelled": user_id, "waiting": len(waitlist)}
+
+        elif action == "position":
+            return {"isbn": isbn, "user": user_id, "position": waitlist.position(user_id), "waiting": len(waitlist)}
 
-    if action == "add":
-        if book.get("copies_available", 0) > 0:
-            return {"message": f"Book '{book.get('title', 'Unknown')}' is available; no need for waitlist."}
-        if user_id in waitlist:
-            return {"message": f"User {user_id} is already on the waitlist for {isbn}."}
+        else:
+            raise ValueError("Invalid action. Use 'add', 'notify', 'cancel' or 'position'.")
 
-        waitlist.append(user_id)
-        return {"isbn": isbn, "waitlist": waitlist}
 
-    elif action == "notify":
-        if not waitlist:
-            return {"message": f"No users on the waitlist for {isbn}."}
-        next_user = waitlist.pop(0)
-        return {
-            "isbn": isbn,
-            "notify_user": next_user,
-            "message": f"Notify {next_user}: '{book.get('title', 'Unknown')}' is now available."
-        }
+def notify_waitlist(isbn: str, count: int = None) -> list:
+    """
+    Take the next `count` members off a book's waitlist in one step (e.g. when
+    several copies come back at once) and return a "notify" result for each,
+    front of the queue first. count defaults to one member per available copy.
+    """
+    book = catalog.get(isbn)
+    if book is None:
+        raise KeyError(f"Book {isbn} not found in catalog.")
+
+    with circulation(book_id=isbn):
+        if count is None:
+            count = book.get("copies_available", 0) or 0
+        waitlist = waitlist_of(isbn)
+        notified = waitlist.pop_many(max(count, 0))
+        if notified:
+            journal("waitlists", isbn)
+        for member_id in notified:
+            events.publish("waitlist.notified", book_id=isbn, member_id=member_id)
+        return [_notice(book, isbn, member_id) for member_id in notified]
+
 
-    else:
-        raise ValueError("Invalid action. Use 'add' or 'notify'.")
+def waitlist_of(book_id):
+    """
+    The Waitlist of book_id in `waitlists`, created on first use. A catalog
+    record that still carries its own "waitlist" list (older data) has it
+    moved into the Waitlist, so reserve_book() and waitlist_management()
+    always share one queue. Callers hold the book's lock.
+    """
+    waitlist = waitlists.get(book_id)
+    if waitlist is None:
+        waitlist = waitlists[book_id] = Waitlist()
+    book = catalog.get(book_id)
+    if book is not None and "waitlist" in book:
+        for member_id in book.pop("waitlist") or ():
+            waitlist.append(member_id)
+        journal("waitlists", book_id)
+    return waitlist
+
+
+def _notice(book, isbn, member_id):
+    return {
+        "isbn": isbn,
+        "notify_user": member_id,
+        "message": f"Notify {member_id}: '{book.get('title', 'Unknown')}' is now available."
+    }
 
 
 # ----------------------------------------------------
@@ -447,18 +935,12 @@ def format_search_query(q):
         - normalized text (cleaned)
         - list of tokens (words/phrases)
     """
-    s = (q or "").strip().lower()
-    s = "".join(
-        c for c in unicodedata.normalize("NFKD", s)
-        if not unicodedata.combining(c)
-    )
+    s = fold_text(q)
     phrases = [m.strip('"') for m in re.findall(r'"([^"]*)"', s)]
     s = re.sub(r'"[^"]*"', " ", s)
-    s = re.sub(r"[^\w\-]+", " ", s).strip()
-    stop = {"the","a","an","and","or","of","for","to","in","on","at","by","with","from"}
     toks = []
-    for t in s.split():
-        if t and t not in stop:
+    for t in split_words(s):
+        if t and t not in STOP_WORDS:
             toks.append(t)
     for p in phrases:
         if p:
@@ -490,96 +972,122 @@ def user_account(
     def money(x):
         return Decimal(str(x)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
-    catalog_dict = {b.get("id"): b for b in catalog}
-    users = members
-
-    if action == "validate":
-        u = user_obj or (users.get(user_id) if user_id else None)
-        if not u or not u.get("active", True):
-            raise ValueError("Account disabled/missing")
-        if not (u.get("name") or "").strip():
-            raise ValueError("Name required")
-        email = (u.get("email") or "").strip()
-        if "@" not in email or "." not in email.split("@")[-1]:
-            raise ValueError("Invalid email")
-        return True
-
-    if action == "borrow":
-        u = users.get(user_id)
-        b = catalog_dict.get(isbn)
-        if not u or not b:
-            raise KeyError("User or book not found")
-        user_account(action="validate", user_obj=u)
-        if b.get("copies_available", 0) <= 0:
-            raise ValueError("No copies")
-        loans = u.setdefault("loans", {})
-        if isbn in loans and loans[isbn].get("returned_at") is None:
-            raise ValueError("Already borrowed")
-        now = datetime.now(timezone.utc)
-        due = now + timedelta(days=loan_days)
-        b["copies_available"] = int(b.get("copies_available", 0)) - 1
-        loans[isbn] = {"borrowed_at": now, "due_at": due, "returned_at": None}
-        return loans[isbn]
-
-    if action == "return":
-        u = users.get(user_id)
-        b = catalog_dict.get(isbn)
-        if not u:
-            raise KeyError("User not found")
-        loans = u.setdefault("loans", {})
-        loan = loans.get(isbn)
-        if not loan or loan.get("returned_at") is not None:
-            raise KeyError("No active loan")
-        now = datetime.now(timezone.utc)
-        loan["returned_at"] = now
-        due_date = loan["due_at"].date()
-        days_late = (now.date() - due_date).days
-        effective_late = max(0, days_late - max(0, grace_days))
-        fine = Decimal("0.00")
-        if effective_late > 0:
-            fine = money(Decimal(effective_late) * money(daily_rate))
-            u["balance"] = money(Decimal(u.get("balance", "0.00")) + fine)
-        if b is not None:
-            b["copies_available"] = int(b.get("copies_available", 0)) + 1
-        return {
-            "isbn": isbn,
-            "returned_at": now,
-            "days_late": max(0, days_late),
-            "effective_late": effective_late,
-            "fine": money(fine),
-            "balance": money(Decimal(u.get("balance", "0.00"))),
-        }
-
-    if action == "pay":
-        u = users.get(user_id)
-        if not u:
-            raise KeyError("User not found")
-        amt = money(pay_amount or 0)
-        if amt <= 0:
-            raise ValueError("Payment must be > 0")
-        current = money(Decimal(u.get("balance", "0.00")))
-        new_balance = current - amt
-        if new_balance < 0:
-            new_balance = Decimal("0.00")
-        u["balance"] = money(new_balance)
-        return {"paid": amt, "balance": money(new_balance)}
-
-    raise ValueError(f"Unknown action: {action!r}")
+    with circulation(user_id, isbn):
+        users = members
+
+        if action == "validate":
+            u = user_obj or (users.get(user_id) if user_id else None)
+            if not u or not u.get("active", True):
+                raise ValueError("Account disabled/missing")
+            if not (u.get("name") or "").strip():
+                raise ValueError("Name required")
+            email = (u.get("email") or "").strip()
+            if "@" not in email or "." not in email.split("@")[-1]:
+                raise ValueError("Invalid email")
+            return True
+
+        if action == "borrow":
+            u = users.get(user_id)
+            b = catalog.get(isbn)
+            if not u or not b:
+                raise KeyError("User or book not found")
+            user_account(action="validate", user_obj=u)
+            if b.get("copies_available", 0) <= 0:
+                raise ValueError("No copies")
+            loans = u.setdefault("loans", {})
+            if isbn in loans and loans[isbn].get("returned_at") is None:
+                raise ValueError("Already borrowed")
+            now = datetime.now(timezone.utc)
+            due = now + timedelta(days=loan_days)
+            b["copies_available"] = int(b.get("copies_available", 0)) - 1
+            loans[isbn] = {"borrowed_at": now, "due_at": due, "returned_at": None}
+            _ledger_borrow(user_id, isbn, now, due)
+            journal("members", user_id)
+            events.publish("loan.borrowed", member_id=user_id, book_id=isbn, due_at=due)
+            return loans[isbn]
+
+        if action == "return":
+            u = users.get(user_id)
+            b = catalog.get(isbn)
+            if not u:
+                raise KeyError("User not found")
+            loans = u.setdefault("loans", {})
+            loan = loans.get(isbn)
+            if not loan or loan.get("returned_at") is not None:
+                raise KeyError("No active loan")
+            now = datetime.now(timezone.utc)
+            loan["returned_at"] = now
+            _ledger_return(user_id, isbn, now)
+            due_date = loan["due_at"].date()
+            days_late = (now.date() - due_date).days
+            effective_late = max(0, days_late - max(0, grace_days))
+            fine = Decimal("0.00")
+            if effective_late > 0:
+                fine = money(Decimal(effective_late) * money(daily_rate))
+                u["balance"] = money(Decimal(u.get("balance", "0.00")) + fine)
+            if b is not None:
+                b["copies_available"] = int(b.get("copies_available", 0)) + 1
+            journal("members", user_id)
+            events.publish("loan.returned", member_id=user_id, book_id=isbn, returned_at=now, fine=money(fine))
+            return {
+                "isbn": isbn,
+                "returned_at": now,
+                "days_late": max(0, days_late),
+                "effective_late": effective_late,
+                "fine": money(fine),
+                "balance": money(Decimal(u.get("balance", "0.00"))),
+            }
+
+        if action == "pay":
+            u = users.get(user_id)
+            if not u:
+                raise KeyError("User not found")
+            amt = money(pay_amount or 0)
+            if amt <= 0:
+                raise ValueError("Payment must be > 0")
+            current = money(Decimal(u.get("balance", "0.00")))
+            new_balance = current - amt
+            if new_balance < 0:
+                new_balance = Decimal("0.00")
+            u["balance"] = money(new_balance)
+            journal("members", user_id)
+            events.publish("account.paid", member_id=user_id, amount=amt, balance=money(new_balance))
+            return {"paid": amt, "balance": money(new_balance)}
+
+        raise ValueError(f"Unknown action: {action!r}")
 
 
 # ----------------------------------------------------
 # COMPLEX (30+ lines)  Recommendation System (Rood)
 # ----------------------------------------------------
-def recommend_books(*, member_id, limit=10):
+def recommend_books(*, member_id, limit=10, mode="indexed"):
     """
     Recommend books based on:
         - Tags the user likes
         - Authors the user likes
         - Tags from books the user borrowed before
         - Prefer books that are in stock
+        - Books other members borrowed alongside the user's (mode="indexed",
+          when recommender.co_borrow_weight is set)
     Returns a list of (isbn, score), highest score first.
+
+    mode="indexed" answers from the precomputed recommender indexes;
+    mode="scan" scores every catalog item (the original algorithm).
     """
-    catalog_dict = {b.get("id"): b for b in catalog}
+    if mode not in ("indexed", "scan"):
+        raise ValueError("mode must be 'indexed' or 'scan'")
+    key = (member_id, limit, mode)
+    cached = recommend_cache.get(key)
+    if cached is not None:
+        return list(cached)
+    stamp = versions.now()
+    deps = {("member", member_id), "catalog"}
+    result = _recommend(member_id, limit, mode, deps)
+    recommend_cache.put(key, result, deps, stamp)
+    return list(result)
+
+
+def _recommend(member_id, limit, mode, deps):
     user = members.get(member_id, {})
 
     prefs_tags = set(user.get("preferences_tags", set()))
@@ -588,11 +1096,22 @@ def recommend_books(*, member_id, limit=10):
 
     borrowed_isbns = set(member_loans_dict.keys())
     if not borrowed_isbns:
-        borrowed_isbns = {ln["book_id"] for ln in loans if ln.get("member_id") == member_id}
+        borrowed_isbns = {ln["book_id"] for ln in loans.for_member(member_id)}
+        if loan_archive is not None:
+            borrowed_isbns |= loan_archive.books_of(member_id)
+
+    if mode == "indexed" and isinstance(limit, int) and limit >= 0:
+        with catalog.lock, loans.lock:
+            result = recommender.recommend(borrowed_isbns, prefs_tags, prefs_authors, limit, deps)
+        if metrics.enabled:  # the books scored one by one are the ("book", id) dependencies
+            metrics.scanned("catalog", sum(1 for d in deps if isinstance(d, tuple) and d[0] == "book"))
+        return result
+
+    deps.add("stock")
 
     history_tag_counts = {}
     for isbn in borrowed_isbns:
-        b = catalog_dict.get(isbn)
+        b = catalog.get(isbn)
         if not b:
             continue
         for t in set(b.get("tags", set())):
@@ -606,7 +1125,7 @@ def recommend_books(*, member_id, limit=10):
         score = float(tag_matches)
         if author in prefs_authors:
             score += 1.5
-        if author and any((catalog_dict.get(i) or {}).get("author") == author for i in borrowed_isbns):
+        if author and any((catalog.get(i) or {}).get("author") == author for i in borrowed_isbns):
             score += 0.5
         if qty and qty > 0:
             score += 0.3
@@ -615,15 +1134,17 @@ def recommend_books(*, member_id, limit=10):
         return score
 
     scored = []
-    for isbn, b in catalog_dict.items():
+    if metrics.enabled:
+        metrics.scanned("catalog", len(catalog))
+    for isbn in catalog.ids():
         if isbn in borrowed_isbns:
             continue
-        s = score_book(b)
+        s = score_book(catalog.get(isbn))
         if s > 0:
             scored.append((isbn, s))
 
     scored.sort(
-        key=lambda item: (item[1], (catalog_dict[item[0]].get("title") or ""), item[0]),
+        key=lambda item: (item[1], (catalog.get(item[0]).get("title") or ""), item[0]),
         reverse=True
     )
     return scored[:limit]
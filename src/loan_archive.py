@@ -0,0 +1,372 @@
+# Append-only, memory-mapped columnar archive for returned loans, read zero-copy with NumPy
+import json
+import os
+import struct
+import threading
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the archive needs it
+    np = None
+
+from src.concurrency import synchronized
+from src.loan_columns import DAY_US, EPOCH_ORDINAL, LoanColumns, _epoch_us
+from src.storage import _fsync_dir
+
+META_FILE = "archive.json"
+FORMAT = 1
+COLUMNS = (                       # name, little-endian dtype
+    ("member_code", "<i4"),       # code into .members (first-appearance order)
+    ("book_code", "<i4"),         # code into .books
+    ("borrow_us", "<i8"),         # microseconds since 1970-01-01
+    ("due_us", "<i8"),
+    ("return_us", "<i8"),         # return_date, or due_date when the loan has none
+    ("borrow_day", "<i4"),        # days since 1970-01-01
+    ("due_day", "<i4"),
+    ("return_day", "<i4"),
+    ("has_return_date", "|b1"),   # False: returned is True but the record had no return_date
+)
+FIELDS = ("member_id", "book_id", "borrow_date", "due_date", "returned", "return_date")
+_LENGTH = struct.Struct("<I")
+EPOCH = datetime(1970, 1, 1)
+
+
+class LoanArchive:
+    """
+    Returned loans, moved out of the loan ledger into fixed-width column
+    files (COLUMNS) in one directory, with member and book ids
+    dictionary-encoded. Rows are only ever appended, so readers map each
+    column read-only with np.memmap and share the pages with the OS
+    cache; columns() hands them out as a LoanColumns without copying.
+
+    append() writes (and with fsync=True syncs) the new rows and ids,
+    then commits them by atomically replacing archive.json with the new
+    row and id counts. open() cuts every file back to the committed
+    lengths, so a crash mid-append loses nothing that was committed and
+    leaves no partial rows. archive.json also records how many rows the
+    last append added; LoanLedger.attach_archive() drops live loans that
+    are still listed after a crash between the commit and their removal.
+
+    Only returned loans that can be rebuilt exactly are accepted (see
+    accepts()): string member and book ids, naive datetimes and no fields
+    beyond FIELDS. A member's rows are found through a member -> rows
+    index (an argsort of member_code) that is rebuilt once the rows
+    appended since make up a tenth of the archive; newer rows are scanned.
+    """
+
+    def __init__(self, path, fsync=True):
+        if np is None:
+            raise ImportError("LoanArchive needs NumPy: pip install numpy")
+        self.path = path
+        self.fsync = fsync
+        self.lock = threading.RLock()
+        self.members = []        # code -> member id
+        self.books = []          # code -> book id
+        self._member_codes = {}  # member id -> code
+        self._book_codes = {}
+        self._rows = 0
+        self._last_batch = 0
+        self._views = None       # {column: memmap} for the first _rows rows
+        self._totals = None      # cached per-member / per-book aggregates, see totals()
+        self._windows = {}
+        self._member_index = None  # (rows indexed, row order by member code, start offsets)
+        self._files = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._rows
+
+    # -------------------------------
+    # Files
+    # -------------------------------
+    @synchronized
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+        meta_path = os.path.join(self.path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("format") != FORMAT:
+                raise ValueError(f"Unsupported loan archive format: {meta.get('format')!r}")
+        else:
+            meta = {"format": FORMAT, "rows": 0, "last_batch": 0,
+                    "members": 0, "member_bytes": 0, "books": 0, "book_bytes": 0}
+        self._rows, self._last_batch = meta["rows"], meta["last_batch"]
+        self._files = {}
+        for name, dtype in COLUMNS:
+            self._files[name] = self._open_file(f"{name}.col", self._rows * np.dtype(dtype).itemsize)
+        self._files["members"] = self._open_file("members.ids", meta["member_bytes"])
+        self._files["books"] = self._open_file("books.ids", meta["book_bytes"])
+        self.members = _read_ids(os.path.join(self.path, "members.ids"), meta["members"])
+        self.books = _read_ids(os.path.join(self.path, "books.ids"), meta["books"])
+        self._member_codes = {m: i for i, m in enumerate(self.members)}
+        self._book_codes = {b: i for i, b in enumerate(self.books)}
+        self._invalidate()
+        return self
+
+    def _open_file(self, name, length):
+        f = open(os.path.join(self.path, name), "a+b")
+        f.truncate(length)  # drop anything written after the last commit
+        return f
+
+    @synchronized
+    def close(self):
+        if self._files is not None:
+            for f in self._files.values():
+                f.close()
+            self._files = None
+        self._invalidate()
+
+    def _invalidate(self):
+        self._views = None
+        self._totals = None
+        self._windows = {}
+
+    # -------------------------------
+    # Appending
+    # -------------------------------
+    @staticmethod
+    def accepts(record):
+        """True for a returned loan the archive can store and rebuild exactly."""
+        if record.get("returned") is not True or any(key not in FIELDS for key in record):
+            return False
+        if type(record.get("member_id")) is not str or type(record.get("book_id")) is not str:
+            return False
+        for key in ("borrow_date", "due_date", "return_date"):
+            value = record.get(key)
+            if value is None and key == "return_date":
+                continue
+            if type(value) is not datetime or value.tzinfo is not None or value < EPOCH:
+                return False
+        return True
+
+    @synchronized
+    def append(self, records):
+        """Archive the records (all accepted by accepts()) as one commit. Returns the new row count."""
+        if self._files is None:
+            raise RuntimeError("loan archive is not open")
+        records = list(records)
+        if not records:
+            return self._rows
+        new_members, new_books = [], []
+        columns = {name: [] for name, _ in COLUMNS}
+        for record in records:
+            if not self.accepts(record):
+                raise ValueError(f"Loan cannot be archived: {dict(record)!r}")
+            member_id, book_id = record["member_id"], record["book_id"]
+            code = self._member_codes.get(member_id)
+            if code is None:
+                code = self._member_codes[member_id] = len(self.members)
+                self.members.append(member_id)
+                new_members.append(member_id)
+            columns["member_code"].append(code)
+            code = self._book_codes.get(book_id)
+            if code is None:
+                code = self._book_codes[book_id] = len(self.books)
+                self.books.append(book_id)
+                new_books.append(book_id)
+            columns["book_code"].append(code)
+            borrowed, due = record["borrow_date"], record["due_date"]
+            returned = record.get("return_date")
+            columns["borrow_us"].append(_epoch_us(borrowed))
+            columns["due_us"].append(_epoch_us(due))
+            columns["return_us"].append(_epoch_us(returned if returned is not None else due))
+            columns["borrow_day"].append(borrowed.toordinal() - EPOCH_ORDINAL)
+            columns["due_day"].append(due.toordinal() - EPOCH_ORDINAL)
+            columns["return_day"].append((returned or due).toordinal() - EPOCH_ORDINAL)
+            columns["has_return_date"].append(returned is not None)
+
+        files = self._files
+        for name, dtype in COLUMNS:
+            files[name].write(np.array(columns[name], dtype=dtype).tobytes())
+        files["members"].write(_encode_ids(new_members))
+        files["books"].write(_encode_ids(new_books))
+        for f in files.values():
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._rows += len(records)
+        self._last_batch = len(records)
+        self._commit()
+        self._invalidate()
+        return self._rows
+
+    def _commit(self):
+        meta = {"format": FORMAT, "rows": self._rows, "last_batch": self._last_batch,
+                "members": len(self.members), "member_bytes": self._files["members"].tell(),
+                "books": len(self.books), "book_bytes": self._files["books"].tell()}
+        path = os.path.join(self.path, META_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        if self.fsync:
+            _fsync_dir(self.path)
+
+    # -------------------------------
+    # Column views
+    # -------------------------------
+    @synchronized
+    def views(self):
+        """{column: read-only array} over the committed rows (np.memmap, no copy)."""
+        if self._views is None:
+            self._views = {
+                name: np.memmap(os.path.join(self.path, f"{name}.col"), dtype=dtype, mode="r", shape=(self._rows,))
+                if self._rows else np.empty(0, dtype=dtype)
+                for name, dtype in COLUMNS
+            }
+        return self._views
+
+    def columns(self):
+        """The archive as a LoanColumns (column arrays are the file mappings themselves)."""
+        v = self.views()
+        n = self._rows
+        everywhere = np.broadcast_to(np.True_, (n,))  # every archived loan is returned and closed
+        columns = {name: v[name] for name in ("member_code", "book_code", "borrow_day", "due_day",
+                                               "return_day", "due_us", "return_us")}
+        columns.update(due_is_datetime=everywhere, returned=everywhere, closed=everywhere)
+        return LoanColumns(columns, self.members, self.books, n)
+
+    # -------------------------------
+    # Aggregates
+    # -------------------------------
+    @synchronized
+    def totals(self):
+        """
+        generate_borrowing_report() inputs over all archived loans:
+        {"borrowed", "overdue", "late_days"} arrays per member code,
+        "book_counts" per book code, and the overall "overdue" and
+        "late_days" sums. Kept until the next append.
+        """
+        if self._totals is None:
+            self._totals = self._aggregate(slice(None))
+        return self._totals
+
+    @synchronized
+    def window_totals(self, first_ordinal):
+        """
+        The same for the loans borrowed on or after day first_ordinal, with
+        members and books listed in order of their first loan in the window:
+        {"rows", "members", "borrowed", "overdue", "late_days", "books",
+        "book_counts", "overdue_total", "late_days_total"}.
+        """
+        window = self._windows.get(first_ordinal)
+        if window is None:
+            v = self.views()
+            rows = np.flatnonzero(v["borrow_day"] >= first_ordinal - EPOCH_ORDINAL)
+            totals = self._aggregate(rows)
+            members = _first_seen(v["member_code"][rows])
+            books = _first_seen(v["book_code"][rows])
+            window = self._windows[first_ordinal] = {
+                "rows": len(rows),
+                "members": [self.members[c] for c in members.tolist()],
+                "borrowed": totals["borrowed"][members].tolist(),
+                "overdue": totals["overdue"][members].tolist(),
+                "late_days": totals["late_days"][members].tolist(),
+                "books": [self.books[c] for c in books.tolist()],
+                "book_counts": totals["book_counts"][books].tolist(),
+                "overdue_total": totals["overdue_total"],
+                "late_days_total": totals["late_days_total"],
+            }
+        return window
+
+    def _aggregate(self, rows):
+        v = self.views()
+        member_code, book_code = v["member_code"][rows], v["book_code"][rows]
+        late = v["return_us"][rows] > v["due_us"][rows]
+        days = np.where(late, (v["return_us"][rows] - v["due_us"][rows]) // DAY_US, 0)
+        m, b = len(self.members), len(self.books)
+        overdue = np.bincount(member_code, weights=late, minlength=m).astype(np.int64)
+        late_days = np.bincount(member_code, weights=days, minlength=m).astype(np.int64)
+        return {
+            "borrowed": np.bincount(member_code, minlength=m),
+            "overdue": overdue,
+            "late_days": late_days,
+            "book_counts": np.bincount(book_code, minlength=b),
+            "overdue_total": int(overdue.sum()),
+            "late_days_total": int(late_days.sum()),
+        }
+
+    # -------------------------------
+    # Rows
+    # -------------------------------
+    @synchronized
+    def rows_of(self, member_id):
+        """Row numbers of a member's archived loans, oldest first."""
+        code = self._member_codes.get(member_id)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        member_code = self.views()["member_code"]
+        index = self._member_index
+        if index is None or (self._rows - index[0]) * 10 > self._rows:
+            order = np.argsort(member_code, kind="stable")
+            starts = np.searchsorted(member_code[order], np.arange(len(self.members) + 1))
+            index = self._member_index = (self._rows, order, starts)
+        indexed, order, starts = index
+        rows = order[starts[code]:starts[code + 1]] if code + 1 < len(starts) else order[:0]
+        tail = np.flatnonzero(member_code[indexed:] == code) + indexed
+        return np.concatenate([rows, tail]) if len(tail) else rows
+
+    def books_of(self, member_id):
+        """Set of book ids the member borrowed, by the archived loans."""
+        codes = np.unique(self.views()["book_code"][self.rows_of(member_id)])
+        return {self.books[c] for c in codes.tolist()}
+
+    def records(self, rows=None):
+        """Rebuild loan dicts for the given rows (default: all), in row order."""
+        v = self.views()
+        rows = np.arange(self._rows) if rows is None else np.asarray(rows)
+        data = zip(*(v[name][rows].tolist() for name in ("member_code", "book_code", "borrow_us",
+                                                          "due_us", "return_us", "has_return_date")))
+        for member_code, book_code, borrowed, due, returned, has_return_date in data:
+            record = {"member_id": self.members[member_code], "book_id": self.books[book_code],
+                      "borrow_date": _from_us(borrowed), "due_date": _from_us(due), "returned": True}
+            if has_return_date:
+                record["return_date"] = _from_us(returned)
+            yield record
+
+    def for_member(self, member_id):
+        """A member's archived loans as dicts, oldest first."""
+        return list(self.records(self.rows_of(member_id)))
+
+    def last_batch(self):
+        """The rows added by the most recent append() (for crash recovery)."""
+        return list(self.records(np.arange(self._rows - self._last_batch, self._rows)))
+
+
+def _from_us(us):
+    return EPOCH + timedelta(microseconds=us)
+
+
+def _first_seen(codes):
+    """Distinct codes in order of first appearance."""
+    unique, first = np.unique(codes, return_index=True)
+    return unique[np.argsort(first, kind="stable")]
+
+
+def _encode_ids(ids):
+    out = bytearray()
+    for value in ids:
+        data = value.encode("utf-8")
+        out += _LENGTH.pack(len(data)) + data
+    return bytes(out)
+
+
+def _read_ids(path, count):
+    with open(path, "rb") as f:
+        data = f.read()
+    ids, offset = [], 0
+    for _ in range(count):
+        (size,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        ids.append(data[offset:offset + size].decode("utf-8"))
+        offset += size
+    return ids
@@ -2,29 +2,39 @@ from datetime import datetime
 from src import library_functions as lib
 
 class Loan:
-    """Represents a loan transaction."""
-    
+    """
+    Represents a loan transaction.
+
+    A Loan is a view over its record in lib.loans, so returns and due-date
+    changes made anywhere are what the object reports.
+    """
+
+    __slots__ = ("_record",)
+
     def __init__(self, member_id: str, book_id: str, borrow_date: datetime = None, loan_days: int = 14):
         """Initialize a Loan record and append to the global loan list."""
         if not member_id.strip() or not book_id.strip():
             raise ValueError("Member ID and Book ID cannot be empty.")
         
-        self._member_id = member_id
-        self._book_id = book_id
-        self._borrow_date = borrow_date or datetime.now()
-        self._loan_days = loan_days
-        self._due_date = lib.calculate_due_date(self._borrow_date, loan_days)
-        self._returned = False
+        borrow_date = borrow_date or datetime.now()
 
-        # Automatically add to the global loans list
+        # Automatically add to the global loan ledger (indexed by member, book and due date)
         loan_record = {
-            "member_id": self._member_id,
-            "book_id": self._book_id,
-            "borrow_date": self._borrow_date,
-            "due_date": self._due_date,
-            "returned": self._returned
+            "member_id": member_id,
+            "book_id": book_id,
+            "borrow_date": borrow_date,
+            "due_date": lib.calculate_due_date(borrow_date, loan_days),
+            "returned": False
         }
-        lib.loans.append(loan_record)
+        self._record = lib.loans.register(loan_record)
+        lib.events.publish("loan.created", member_id=member_id, book_id=book_id, due_date=loan_record["due_date"])
+
+    @classmethod
+    def view(cls, record):
+        """A Loan over a record already in lib.loans."""
+        loan = cls.__new__(cls)
+        loan._record = record
+        return loan
 
     
     # -------------------------------
@@ -32,22 +42,34 @@ class Loan:
     # -------------------------------
     @property
     def member_id(self):
-        return self._member_id
+        return self._record.get("user_id") or self._record.get("member_id")
 
     @property
     def book_id(self):
-        return self._book_id
+        return self._record["book_id"]
+
+    @property
+    def borrow_date(self):
+        return self._record.get("borrow_date")
 
     @property
     def due_date(self):
-        return self._due_date
+        return self._record["due_date"]
+
+    @due_date.setter
+    def due_date(self, value):
+        self._record["due_date"] = value  # the ledger re-indexes the loan by its new due date
+
+    @property
+    def returned(self):
+        return bool(self._record.get("returned"))
 
     # -------------------------------
     # Methods (Integrated)
     # -------------------------------
     def is_overdue(self):
         """Check if this loan is overdue."""
-        return datetime.now() > self._due_date
+        return datetime.now() > self.due_date
 
     @staticmethod
     def generate_reports():
@@ -61,4 +83,4 @@ class Loan:
     
     def __str__(self):
         status = "Overdue" if self.is_overdue() else "On time"
-        return f"Loan(Member: {self._member_id}, Book: {self._book_id}, Due: {self._due_date.date()}, Status: {status})"
+        return f"Loan(Member: {self.member_id}, Book: {self.book_id}, Due: {self.due_date.date()}, Status: {status})"
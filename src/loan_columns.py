@@ -0,0 +1,198 @@
+# Columnar loan snapshot with vectorized (NumPy) fines and report aggregates
+from datetime import datetime, date
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only this fast path needs it
+    np = None
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+DAY_US = 86_400_000_000
+NO_TIME = np.iinfo(np.int64).min if np is not None else None  # marks a missing timestamp
+
+
+def _epoch_us(dt):
+    """Microseconds since 1970-01-01 in integer arithmetic (aware values as UTC)."""
+    offset = dt.utcoffset()
+    if offset is not None:
+        dt = dt.replace(tzinfo=None) - offset
+    seconds = (dt.toordinal() - EPOCH_ORDINAL) * 86_400 + dt.hour * 3_600 + dt.minute * 60 + dt.second
+    return seconds * 1_000_000 + dt.microsecond
+
+
+def _parse(value):
+    return datetime.strptime(value, "%Y-%m-%d") if isinstance(value, str) else value
+
+
+class LoanColumns:
+    """
+    Struct-of-arrays copy of a list of loan records for batch jobs:
+        borrow_day, due_day, return_day   int64 days since 1970-01-01 (-1 if missing)
+        due_us, return_us                 int64 microseconds, for the report's
+                                          exact "returned after due" comparisons
+        member_code, book_code            int32 codes into .members / .books
+        valid, due_is_datetime, returned, closed   bool masks
+
+    Codes are handed out in order of first appearance, so ties in the
+    aggregates resolve the same way max() and Counter.most_common() do in
+    the pure-Python functions. Build with LoanColumns.from_records().
+    """
+
+    DTYPES = {"member_code": "int32", "book_code": "int32", "borrow_day": "int64", "due_day": "int64",
+              "return_day": "int64", "due_us": "int64", "return_us": "int64",
+              "due_is_datetime": "bool", "returned": "bool", "closed": "bool"}
+
+    def __init__(self, columns, members, books, total):
+        self.__dict__.update(columns)
+        self.members = members
+        self.books = books
+        self.total = total
+
+    def __len__(self):
+        return len(self.due_us)
+
+    @classmethod
+    def from_records(cls, records):
+        """Encode loan dicts (e.g. library_functions.loans). Requires NumPy."""
+        if np is None:
+            raise ImportError("LoanColumns needs NumPy: pip install numpy")
+        member_codes, book_codes = {}, {}
+        rows = []
+        total = 0
+        for record in records:
+            total += 1
+            user_id = record.get("user_id") or record.get("member_id")
+            book_id = record.get("book_id")
+            due = record.get("due_date")
+            if not user_id or not book_id or not isinstance(due, (datetime, str)):
+                continue  # generate_borrowing_report() skips these too
+            due = _parse(due)
+            returned = record.get("returned")
+            ret = record.get("return_date")
+            if ret is not None:
+                ret = _parse(ret)
+            elif returned is True:
+                ret = due
+            borrowed = record.get("borrow_date")
+            if isinstance(borrowed, str):
+                borrowed = _parse(borrowed)
+            rows.append((
+                member_codes.setdefault(user_id, len(member_codes)),
+                book_codes.setdefault(book_id, len(book_codes)),
+                borrowed.toordinal() - EPOCH_ORDINAL if isinstance(borrowed, date) else -1,
+                due.toordinal() - EPOCH_ORDINAL,
+                ret.toordinal() - EPOCH_ORDINAL if ret is not None else -1,
+                _epoch_us(due),
+                _epoch_us(ret) if ret is not None else NO_TIME,
+                isinstance(record.get("due_date"), datetime),
+                bool(returned),
+                ret is not None,
+            ))
+
+        dtypes = list(cls.DTYPES.items())
+        table = np.array(rows, dtype=dtypes) if rows else np.empty(0, dtype=dtypes)
+        columns = {name: np.ascontiguousarray(table[name]) for name, _ in dtypes}
+        return cls(columns, list(member_codes), list(book_codes), total)
+
+    @classmethod
+    def concat(cls, parts):
+        """
+        One LoanColumns of several, in order (e.g. the loan archive's, then
+        the live ledger's). Member and book codes are re-numbered so they
+        stay in order of first appearance across all parts.
+        """
+        member_codes, book_codes = {}, {}
+        columns = {name: [] for name in cls.DTYPES}
+        for part in parts:
+            members = np.array([member_codes.setdefault(m, len(member_codes)) for m in part.members], dtype=np.int32)
+            books = np.array([book_codes.setdefault(b, len(book_codes)) for b in part.books], dtype=np.int32)
+            for name in cls.DTYPES:
+                columns[name].append(getattr(part, name))
+            columns["member_code"][-1] = members[part.member_code] if len(members) else part.member_code
+            columns["book_code"][-1] = books[part.book_code] if len(books) else part.book_code
+        columns = {name: np.concatenate(arrays).astype(cls.DTYPES[name], copy=False) if arrays
+                   else np.empty(0, dtype=cls.DTYPES[name]) for name, arrays in columns.items()}
+        return cls(columns, list(member_codes), list(book_codes), sum(part.total for part in parts))
+
+    # -------------------------------
+    # Borrowing report (generate_borrowing_report semantics)
+    # -------------------------------
+    def days_late(self, now=None):
+        """Whole days each loan was (or still is) late at now; -1 where it is not late."""
+        now_us = _epoch_us(now or datetime.today())
+        end = np.where(self.closed, self.return_us, now_us)
+        late = end > self.due_us
+        return np.where(late, (end - self.due_us) // DAY_US, -1)
+
+    def fines(self, fine_per_day=0.5, now=None):
+        """Fine per loan (0.0 when not late)."""
+        days = self.days_late(now)
+        return np.where(days >= 0, days, 0) * fine_per_day
+
+    def member_totals(self, now=None):
+        """Per member code: (loans, overdue loans, late days), via np.bincount."""
+        days = self.days_late(now)
+        n = len(self.members)
+        late = days >= 0
+        return (
+            np.bincount(self.member_code, minlength=n),
+            np.bincount(self.member_code, weights=late, minlength=n).astype(np.int64),
+            np.bincount(self.member_code, weights=np.where(late, days, 0), minlength=n).astype(np.int64),
+        )
+
+    def top_books(self, n=10):
+        """[(book_id, loans)] for the n most borrowed books, ties in first-loan order."""
+        return self._top(np.bincount(self.book_code, minlength=len(self.books)), n)
+
+    def borrowing_report(self, fine_per_day=0.5, now=None):
+        """The same dict generate_borrowing_report() builds, computed column-wise."""
+        borrowed, overdue, late_days = self.member_totals(now)
+        return self.report_from_totals(borrowed, overdue, late_days,
+                                       np.bincount(self.book_code, minlength=len(self.books)), fine_per_day)
+
+    def report_from_totals(self, borrowed, overdue, late_days, book_counts, fine_per_day=0.5):
+        """
+        borrowing_report() from per-member-code (loans, overdue loans, late
+        days) and per-book-code loan counts, e.g. merged from shards.
+        """
+        borrowed, overdue, late_days = borrowed.tolist(), overdue.tolist(), late_days.tolist()
+        activity = {
+            member: {"borrowed": b, "overdue": o, "fines": 0.0 + d * fine_per_day}
+            for member, b, o, d in zip(self.members, borrowed, overdue, late_days)
+        }
+        top = self._top(book_counts, 1)
+        return {
+            "total_books_borrowed": self.total,
+            "total_overdue_books": sum(overdue),
+            "total_fines_collected": round(0.0 + sum(late_days) * fine_per_day, 2),
+            "user_activity": activity,
+            "most_active_user": self.members[int(np.argmax(borrowed))] if self.members else None,
+            "most_borrowed_book": top[0][0] if top else None,
+        }
+
+    def _top(self, counts, n):
+        order = np.argsort(-counts, kind="stable")[:n]
+        return [(self.books[i], int(counts[i])) for i in order]
+
+    # -------------------------------
+    # Overdue notices (automated_overdue_notifications semantics)
+    # -------------------------------
+    def overdue(self, today=None, daily_fee=0.25, grace_days=0):
+        """
+        Open loans due before today - grace_days.
+        Returns (row indexes, days overdue, fee) arrays in record order.
+        """
+        today = today or datetime.now().date()
+        if isinstance(today, datetime):
+            today = today.date()
+        today_day = today.toordinal() - EPOCH_ORDINAL
+        mask = ~self.returned & self.due_is_datetime & (self.due_day < today_day - grace_days)
+        rows = np.flatnonzero(mask)
+        days = today_day - self.due_day[rows]
+        return rows, days, np.maximum(days, 0) * daily_fee
+
+    def overdue_fees_by_member(self, today=None, daily_fee=0.25, grace_days=0):
+        """{member_id: total estimated fee} over the overdue loans."""
+        rows, _, fees = self.overdue(today, daily_fee, grace_days)
+        totals = np.bincount(self.member_code[rows], weights=fees, minlength=len(self.members))
+        return {self.members[i]: float(totals[i]) for i in np.flatnonzero(totals)}
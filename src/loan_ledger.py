@@ -0,0 +1,401 @@
+# Loan ledger: the global loan list with open-loan, member, book and due-date indexes
+import heapq
+import threading
+from collections.abc import Mapping
+from datetime import datetime
+from src.concurrency import synchronized
+from src.records import LoanRecord
+
+
+def _member_key(record):
+    return record.get("user_id") or record.get("member_id")
+
+
+def _due_key(record):
+    due = record.get("due_date")
+    return due.date().toordinal() if isinstance(due, datetime) else None
+
+
+class LoanLedger(list):
+    """
+    The global loans list. It still behaves like a list of loan dicts,
+    but it also keeps:
+        - the open (not returned) loans
+        - member id -> loans and book id -> loans
+        - a min-heap of open loans keyed by due date, so the loans due
+          before a cutoff can be found without walking the whole history
+
+    Changes, lookups and listener callbacks run under self.lock, so the
+    ledger can be shared between threads.
+
+    Inserted mappings are stored as LoanRecord objects that report their
+    own changes, so setting loan["returned"] = True moves the loan out
+    of the open set. Listeners registered with add_listener() receive
+    add(record), discard(record), update(record, key, old), reorder()
+    (records kept but their order changed) and clear(). bulk_extend()
+    hands a listener the whole batch through add_many(records) when it
+    has one.
+
+    Returned loans can be moved to a LoanArchive with take(). The ledger's
+    own lookups only see the live loans; listeners that define them also
+    get archive(record) instead of discard(record) for a taken loan, and
+    add_archived(archive) / drop_archived(archive) when an archive is
+    attached or detached, so their aggregates can keep covering the
+    archived history.
+    """
+
+    def __init__(self, records=()):
+        super().__init__()
+        self.lock = threading.RLock()  # held while the list, its indexes and listeners change
+        self._listeners = []
+        self.archive = None  # LoanArchive holding the loans moved out by take(), once attached
+        self._reset()
+        self.extend(records)
+
+    def _reset(self):
+        self._next_seq = 0
+        self._open = {}        # seq -> record, loans not yet returned
+        self._by_member = {}   # member id -> {seq: record}
+        self._by_book = {}     # book id -> {seq: record}
+        self._due = {}         # seq -> due-date ordinal of open loans in the heap
+        self._due_heap = []    # (due-date ordinal, seq); stale entries are skipped lazily
+
+    # -------------------------------
+    # Lookup
+    # -------------------------------
+    @synchronized
+    def register(self, record):
+        """Append a loan and return the stored record."""
+        self.append(record)
+        return self[-1]
+
+    @synchronized
+    def open_loans(self):
+        """Loans not yet returned, oldest first."""
+        return [self._open[s] for s in sorted(self._open)]
+
+    def open_count(self) -> int:
+        return len(self._open)
+
+    @synchronized
+    def for_member(self, member_id):
+        """All loans (open and returned) for a member, oldest first."""
+        loans = self._by_member.get(member_id, {})
+        return [loans[s] for s in sorted(loans)]
+
+    @synchronized
+    def for_book(self, book_id):
+        """All loans (open and returned) of a book, oldest first."""
+        loans = self._by_book.get(book_id, {})
+        return [loans[s] for s in sorted(loans)]
+
+    @synchronized
+    def find_open(self, member_id, book_id):
+        """The most recent open loan of book_id by member_id, or None."""
+        loans = self._by_member.get(member_id, {})
+        for seq in sorted(loans, reverse=True):
+            record = loans[seq]
+            if seq in self._open and record.get("book_id") == book_id:
+                return record
+        return None
+
+    @synchronized
+    def due_before(self, cutoff):
+        """
+        Open loans whose due date (a datetime) falls before cutoff (a date),
+        in ledger order. Walks only the part of the heap that is due
+        before the cutoff, so it costs O(k log k) for k matches.
+        """
+        limit = cutoff.toordinal()
+        heap = self._due_heap
+        found = []
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            if i >= len(heap):
+                continue
+            key, seq = heap[i]
+            if key >= limit:
+                continue  # everything below this node is due later
+            if self._due.get(seq) == key:
+                found.append(seq)
+            stack.append(2 * i + 1)
+            stack.append(2 * i + 2)
+        # A loan re-indexed with the same due date can appear twice in the heap
+        return [self._open[s] for s in sorted(set(found))]
+
+    def position(self, record):
+        """Sort key giving the record's place in the ledger."""
+        return record._seq
+
+    @synchronized
+    def add_listener(self, listener):
+        """Register a listener and replay the archive and the current loans into it."""
+        self._listeners.append(listener)
+        if self.archive is not None and hasattr(listener, "add_archived"):
+            listener.add_archived(self.archive)
+        for record in self:
+            listener.add(record)
+
+    @synchronized
+    def remove_listener(self, listener):
+        """Stop sending changes to a registered listener."""
+        self._listeners.remove(listener)
+
+    # -------------------------------
+    # Archive
+    # -------------------------------
+    @synchronized
+    def attach_archive(self, archive):
+        """
+        Count `archive` (a LoanArchive) as part of the history in the
+        listeners' aggregates. Live loans that are copies of the archive's
+        last batch (left behind by a crash between archiving and take())
+        are removed first.
+        """
+        if self.archive is not None:
+            self.detach_archive()
+        copies = {}
+        for candidate in archive.last_batch():
+            for record in self.for_member(candidate["member_id"]):
+                if id(record) not in copies and dict(record) == candidate:
+                    copies[id(record)] = record
+                    break
+        self._remove_all(copies, archived=False)
+        self.archive = archive
+        for listener in self._listeners:
+            if hasattr(listener, "add_archived"):
+                listener.add_archived(archive)
+
+    @synchronized
+    def detach_archive(self):
+        """Stop counting the attached archive; returns it."""
+        archive, self.archive = self.archive, None
+        if archive is not None:
+            for listener in self._listeners:
+                if hasattr(listener, "drop_archived"):
+                    listener.drop_archived(archive)
+        return archive
+
+    @synchronized
+    def take(self, records):
+        """
+        Remove loans that were just appended to the attached archive. The
+        listeners see archive(record) where they define it (their
+        aggregates already include it), discard(record) otherwise.
+        """
+        self._remove_all({id(r): r for r in records}, archived=True)
+
+    def _remove_all(self, records, archived):
+        # Remove {id: record} in one pass over the list (remove() would rescan it per record)
+        records = {rid: r for rid, r in records.items() if r._owner is self}
+        if not records:
+            return
+        super().__setitem__(slice(None), [r for r in self if id(r) not in records])
+        for record in records.values():
+            self._unindex(record, _member_key(record), record.get("book_id"))
+            record._owner = None
+            for listener in self._listeners:
+                moved = getattr(listener, "archive", None) if archived else None
+                if moved is not None:
+                    moved(record)
+                else:
+                    listener.discard(record)
+
+    # -------------------------------
+    # Index maintenance
+    # -------------------------------
+    def _adopt(self, record):
+        if not isinstance(record, Mapping):
+            raise TypeError("Loan entries must be dicts.")
+        if not isinstance(record, LoanRecord) or (record._owner is not None and record._owner is not self):
+            record = LoanRecord(record)
+        return record
+
+    def _attach(self, record):
+        if record._owner is self:
+            return  # the same record listed twice is indexed once
+        record._owner = self
+        seq = record._seq = self._next_seq
+        self._next_seq += 1
+        self._index(record, seq)
+        for listener in self._listeners:
+            listener.add(record)
+
+    def _index(self, record, seq, push=heapq.heappush):
+        self._by_member.setdefault(_member_key(record), {})[seq] = record
+        self._by_book.setdefault(record.get("book_id"), {})[seq] = record
+        if not record.get("returned"):
+            self._open[seq] = record
+            key = _due_key(record)
+            if key is not None:
+                self._due[seq] = key
+                push(self._due_heap, (key, seq))
+
+    def _unindex(self, record, member_id, book_id):
+        seq = record._seq
+        for index, key in ((self._by_member, member_id), (self._by_book, book_id)):
+            loans = index.get(key)
+            if loans is not None:
+                loans.pop(seq, None)
+                if not loans:
+                    del index[key]
+        self._open.pop(seq, None)
+        self._due.pop(seq, None)
+        if len(self._due_heap) > 2 * len(self._due) + 64:
+            # Too many stale heap entries: rebuild from the live ones
+            self._due_heap = [(k, s) for s, k in self._due.items()]
+            heapq.heapify(self._due_heap)
+
+    def _detach(self, record):
+        self._unindex(record, _member_key(record), record.get("book_id"))
+        record._owner = None
+        for listener in self._listeners:
+            listener.discard(record)
+
+    def _release(self, records):
+        live = {id(item) for item in self}
+        for record in records:
+            if id(record) not in live and record._owner is self:
+                self._detach(record)
+
+    @synchronized
+    def _record_changed(self, record, key, old):
+        if key in ("user_id", "member_id", "book_id", "returned", "due_date"):
+            before = {**record, key: old}
+            self._unindex(record, _member_key(before), before.get("book_id"))
+            self._index(record, record._seq)
+        for listener in self._listeners:
+            listener.update(record, key, old)
+
+    def _renumber(self):
+        # Ledger order changed: re-sequence every record (keeps heap keys valid)
+        self._reset()
+        for record in self:
+            record._owner = None
+        for record in self:
+            if record._owner is self:
+                continue
+            record._owner = self
+            record._seq = self._next_seq
+            self._next_seq += 1
+            self._index(record, record._seq)
+        for listener in self._listeners:
+            listener.reorder()
+
+    # -------------------------------
+    # list API
+    # -------------------------------
+    @synchronized
+    def append(self, record):
+        record = self._adopt(record)
+        super().append(record)
+        self._attach(record)
+
+    @synchronized
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    @synchronized
+    def bulk_extend(self, records):
+        """
+        Append many loans, then heapify the due dates once and update each
+        listener once for the batch (add_many(records) if the listener
+        has it, else add() per record). Returns the number of loans added.
+        """
+        added = []
+        for record in records:
+            record = self._adopt(record)
+            super().append(record)
+            if record._owner is self:
+                continue  # the same record listed twice is indexed once
+            record._owner = self
+            seq = record._seq = self._next_seq
+            self._next_seq += 1
+            self._index(record, seq, push=list.append)
+            added.append(record)
+        heapq.heapify(self._due_heap)
+        for listener in self._listeners:
+            add_many = getattr(listener, "add_many", None)
+            if add_many is not None:
+                add_many(added)
+            else:
+                for record in added:
+                    listener.add(record)
+        return len(added)
+
+    def __iadd__(self, records):
+        self.extend(records)
+        return self
+
+    @synchronized
+    def insert(self, index, record):
+        record = self._adopt(record)
+        super().insert(index, record)
+        self._attach(record)
+        if self[-1] is not record:
+            self._renumber()
+
+    @synchronized
+    def remove(self, record):
+        for i, item in enumerate(self):
+            if item is record or item == record:
+                del self[i]
+                return
+        raise ValueError("LoanLedger.remove(x): x not in ledger")
+
+    @synchronized
+    def pop(self, index=-1):
+        record = super().pop(index)
+        self._release([record])
+        return record
+
+    @synchronized
+    def clear(self):
+        for record in self:
+            record._owner = None
+        super().clear()
+        self._reset()
+        for listener in self._listeners:
+            listener.clear()
+            if self.archive is not None and hasattr(listener, "add_archived"):
+                listener.add_archived(self.archive)
+
+    @synchronized
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            old = list(super().__getitem__(index))
+            new = [self._adopt(r) for r in value]
+        else:
+            old = [super().__getitem__(index)]
+            new = [self._adopt(value)]
+            value = new[0]
+        super().__setitem__(index, new if isinstance(index, slice) else value)
+        self._release(old)
+        for record in new:
+            self._attach(record)
+        self._renumber()
+
+    @synchronized
+    def __delitem__(self, index):
+        old = super().__getitem__(index)
+        super().__delitem__(index)
+        self._release(old if isinstance(index, slice) else [old])
+
+    @synchronized
+    def __imul__(self, n):
+        old = list(self)
+        super().__imul__(n)
+        self._release(old)
+        return self
+
+    @synchronized
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._renumber()
+
+    @synchronized
+    def reverse(self):
+        super().reverse()
+        self._renumber()
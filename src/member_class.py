@@ -1,8 +1,16 @@
 from src import library_functions as lib
+from src.records import MemberRecord
 
 class Member:
-    """Represents a library member and account actions."""
-    
+    """
+    Represents a library member and account actions.
+
+    A Member is a view over lib.members[member_id]: the stored record is
+    the only copy of the member's state.
+    """
+
+    __slots__ = ("_member_id",)
+
     def __init__(self, member_id: str, name: str, email: str, active: bool = True, tags: set = None, authors: set = None):
         """Initialize a Member."""
         if not member_id.strip():
@@ -13,24 +21,35 @@ class Member:
             raise ValueError("Invalid email address.")
         
         self._member_id = member_id
-        self._name = name
-        self._email = email
-        self._active = active
-        self._balance = 0.0
-        self._loans = {}
-        self._preferences_tags = tags if tags else set()
-        self._preferences_authors = authors if authors else set()
 
         # --- Append to global members dictionary ---
-        lib.members[self._member_id] = {
-            "name": self._name,
-            "email": self._email,
-            "active": self._active,
-            "balance": self._balance,
-            "loans": self._loans,
-            "preferences_tags": self._preferences_tags,
-            "preferences_authors": self._preferences_authors
-        }
+        lib.members[self._member_id] = MemberRecord({
+            "name": name,
+            "email": email,
+            "active": active,
+            "balance": 0.0,
+            "loans": {},
+            "preferences_tags": tags if tags else set(),
+            "preferences_authors": authors if authors else set()
+        })
+        lib.journal("members", self._member_id)
+        lib.events.publish("member.created", member_id=member_id, name=name, email=email)
+
+    @classmethod
+    def view(cls, member_id: str):
+        """A Member over an existing members entry, or None if there is none."""
+        if member_id not in lib.members:
+            return None
+        member = cls.__new__(cls)
+        member._member_id = member_id
+        return member
+
+    @property
+    def _record(self):
+        record = lib.members.get(self._member_id)
+        if record is None:
+            raise KeyError(f"User {self._member_id} not found")
+        return record
     
     # -------------------------------
     # Properties
@@ -41,15 +60,32 @@ class Member:
 
     @property
     def name(self):
-        return self._name
+        return self._record["name"]
 
     @property
     def email(self):
-        return self._email
+        return self._record["email"]
     
     @property
     def active(self):
-        return self._active
+        return self._record.get("active", True)
+
+    @property
+    def balance(self):
+        return self._record.get("balance", 0.0)
+
+    @property
+    def loans(self):
+        """{book_id: {"borrowed_at", "due_at", "returned_at"}} from the stored record."""
+        return self._record.get("loans", {})
+
+    @property
+    def preferences_tags(self):
+        return self._record.get("preferences_tags", set())
+
+    @property
+    def preferences_authors(self):
+        return self._record.get("preferences_authors", set())
 
     # -------------------------------
     # Methods (Integrated)
@@ -61,12 +97,12 @@ class Member:
     def borrow_book(self, book_id: str):
         """Borrow a book."""
         result = lib.check_in_out_operations(self._member_id, book_id, action="borrow")
-        return f"{self._name} borrowed {book_id}, due {result['due_at'].date()}"
+        return f"{self.name} borrowed {book_id}, due {result['due_at'].date()}"
 
     def return_book(self, book_id: str):
         """Return a borrowed book."""
         result = lib.check_in_out_operations(self._member_id, book_id, action="return")
-        return f"{self._name} returned {book_id} on {result['returned_at'].date()}"
+        return f"{self.name} returned {book_id} on {result['returned_at'].date()}"
 
     def pay_balance(self, amount):
         """Pay a fine or balance using user_account()."""
@@ -78,4 +114,4 @@ class Member:
         return lib.member_count(active_only=True)
     
     def __str__(self):
-        return f"{self._name} ({self._email}) - Active: {self._active}"
+        return f"{self.name} ({self.email}) - Active: {self.active}"
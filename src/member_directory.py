@@ -0,0 +1,87 @@
+# The members global: a dict that reports edits made to its MemberRecords
+from src.records import MemberRecord
+
+
+class MemberDirectory(dict):
+    """
+    member_id -> member entry, like a plain dict.
+
+    MemberRecord entries are adopted (their _owner set), so a direct edit
+    such as members[m]["preferences_authors"] = {...} calls
+    on_change(member_id), the same as journal("members", member_id)
+    after a library function changes a member. Plain dict entries are
+    kept as they are and not tracked. Changes inside a value (adding to a
+    preferences set in place) are not seen either: assign a new value.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.on_change = None  # called with the member id of an edited record
+        self._ids = {}         # id(record) -> member id, for the adopted records
+        self.update(*args, **kwargs)
+
+    # -------------------------------
+    # Record hook (TrackedRecord)
+    # -------------------------------
+    def _record_changed(self, record, key, old):
+        member_id = self._ids.get(id(record))
+        if member_id is not None and self.on_change is not None and dict.get(self, member_id) is record:
+            self.on_change(member_id)
+
+    def _adopt(self, member_id, value):
+        if isinstance(value, MemberRecord) and (value._owner is None or value._owner is self):
+            value._owner = self
+            self._ids[id(value)] = member_id
+
+    def _release(self, value):
+        if isinstance(value, MemberRecord) and value._owner is self:
+            value._owner = None
+            self._ids.pop(id(value), None)
+
+    # -------------------------------
+    # dict API
+    # -------------------------------
+    def __setitem__(self, member_id, value):
+        old = dict.get(self, member_id)
+        if old is not None and old is not value:
+            self._release(old)
+        super().__setitem__(member_id, value)
+        self._adopt(member_id, value)
+
+    def __delitem__(self, member_id):
+        self._release(self[member_id])
+        super().__delitem__(member_id)
+
+    def update(self, *args, **kwargs):
+        for member_id, value in dict(*args, **kwargs).items():
+            self[member_id] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, member_id, default=None):
+        if member_id not in self:
+            self[member_id] = default
+        return self[member_id]
+
+    def pop(self, member_id, *default):
+        if member_id in self:
+            self._release(self[member_id])
+        return super().pop(member_id, *default)
+
+    def popitem(self):
+        member_id, value = super().popitem()
+        self._release(value)
+        return member_id, value
+
+    def clear(self):
+        for value in self.values():
+            self._release(value)
+        super().clear()
+
+    def copy(self):
+        return dict(self)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))  # snapshots store a plain dict
@@ -0,0 +1,308 @@
+# Opt-in instrumentation: per-function call counts, latency histograms, rows scanned, Prometheus export, slow-call profiles
+import cProfile
+import inspect
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import wraps
+
+# Upper bounds (seconds) of the latency histogram buckets: 1 us to 10 s in 1-2.5-5 steps, then +Inf
+BUCKETS = tuple(m * 10.0 ** e for e in range(-6, 1) for m in (1, 2.5, 5)) + (10.0,)
+
+
+class CallStats:
+    """Counters for one instrumented function."""
+
+    __slots__ = ("count", "errors", "total", "max", "buckets", "scanned", "blocks")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+        self.scanned = {}    # kind ("catalog", "loans", "members") -> rows read
+        self.blocks = 0      # net memory blocks allocated (sys.getallocatedblocks() after - before)
+
+    def quantile(self, q):
+        """Estimate of the q-quantile latency, interpolated inside its bucket (like histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                if i == len(BUCKETS):
+                    return self.max
+                low = BUCKETS[i - 1] if i else 0.0
+                return min(self.max, low + (BUCKETS[i] - low) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+
+class MetricsRegistry:
+    """
+    Call metrics for functions and methods wrapped by instrument().
+
+    Each call records its latency in a histogram (BUCKETS), whether it
+    raised and the rows it read as reported through scanned(). With
+    allocations=True it also records the net memory blocks each call left
+    allocated; sys.getallocatedblocks() walks the allocator's arenas, so
+    that costs a few microseconds per call on a large heap. Rows a nested instrumented call reads
+    count towards its callers too. Nothing is wrapped until instrument(),
+    and uninstrument() puts the original functions back, so a registry
+    that is not enabled costs the callers nothing but the `enabled` checks
+    around scanned().
+
+    profile_slow() runs a sample of the outermost calls under cProfile and
+    keeps the profile of those slower than a threshold.
+    """
+
+    def __init__(self, allocations=False):
+        self.enabled = False
+        self.allocations = allocations
+        self._stats = {}
+        self._patched = []   # (owner, attribute, original) in the order they were wrapped
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profile = None
+        self.slow_calls = deque(maxlen=1000)  # (name, seconds, profile path or None), most recent last
+
+    # -------------------------------
+    # Wrapping
+    # -------------------------------
+    def instrument(self, owner, names, prefix=""):
+        """Replace owner.<name> (a module or class attribute) for each name with a measured wrapper."""
+        for name in names:
+            raw = inspect.getattr_static(owner, name)
+            if isinstance(raw, (staticmethod, classmethod)):
+                wrapped = type(raw)(self._wrap(prefix + name, raw.__func__))
+            else:
+                wrapped = self._wrap(prefix + name, raw)
+            self._patched.append((owner, name, raw))
+            setattr(owner, name, wrapped)
+        self.enabled = bool(self._patched)
+
+    def uninstrument(self):
+        """Put back every original function, most recently wrapped first."""
+        while self._patched:
+            owner, name, raw = self._patched.pop()
+            setattr(owner, name, raw)
+        self.enabled = False
+
+    def _wrap(self, name, function):
+        with self._lock:
+            stats = self._stats.setdefault(name, CallStats())
+        if inspect.isgeneratorfunction(function):
+            return self._wrap_generator(stats, function)
+
+        local, lock = self._local, self._lock
+        perf_counter, allocated = time.perf_counter, sys.getallocatedblocks
+
+        @wraps(function)
+        def measured(*args, **kwargs):
+            try:
+                frames = local.frames
+            except AttributeError:
+                frames = local.frames = []
+            frame = {}
+            frames.append(frame)
+            blocks = allocated() if self.allocations else 0
+            profile = self._start_profile(stats, frames) if self._profile is not None else None
+            failed = True
+            start = perf_counter()
+            try:
+                result = function(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = perf_counter() - start
+                if profile is not None:
+                    profile.disable()
+                    local.profiling = False
+                frames.pop()
+                if frame and frames:
+                    parent = frames[-1]
+                    for kind, n in frame.items():
+                        parent[kind] = parent.get(kind, 0) + n
+                if self.allocations:
+                    blocks = allocated() - blocks
+                with lock:
+                    stats.count += 1
+                    stats.errors += failed
+                    stats.total += elapsed
+                    if elapsed > stats.max:
+                        stats.max = elapsed
+                    stats.buckets[bisect_left(BUCKETS, elapsed)] += 1
+                    stats.blocks += blocks
+                    for kind, n in frame.items():
+                        stats.scanned[kind] = stats.scanned.get(kind, 0) + n
+                if self._profile is not None:
+                    self._slow(name, elapsed, profile)
+        return measured
+
+    def _wrap_generator(self, stats, function):
+        # Times each resume of the generator, so only the work done for the consumer counts
+        local = self._local
+
+        @wraps(function)
+        def measured(*args, **kwargs):
+            generator = function(*args, **kwargs)
+            elapsed, failed, scanned = 0.0, False, {}
+            try:
+                while True:
+                    try:
+                        frames = local.frames
+                    except AttributeError:
+                        frames = local.frames = []
+                    frame = {}
+                    frames.append(frame)
+                    start = time.perf_counter()
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    except BaseException:
+                        failed = True
+                        raise
+                    finally:
+                        elapsed += time.perf_counter() - start
+                        frames.pop()
+                        for kind, n in frame.items():
+                            scanned[kind] = scanned.get(kind, 0) + n
+                            if frames:
+                                frames[-1][kind] = frames[-1].get(kind, 0) + n
+                    yield item
+            finally:
+                generator.close()  # a consumer that stops early is not an error
+                with self._lock:
+                    stats.count += 1
+                    stats.errors += failed
+                    stats.total += elapsed
+                    if elapsed > stats.max:
+                        stats.max = elapsed
+                    stats.buckets[bisect_left(BUCKETS, elapsed)] += 1
+                    for kind, n in scanned.items():
+                        stats.scanned[kind] = stats.scanned.get(kind, 0) + n
+        return measured
+
+    def scanned(self, kind, n=1):
+        """Report n rows of `kind` read by the innermost instrumented call on this thread."""
+        frames = getattr(self._local, "frames", None)
+        if frames:
+            frame = frames[-1]
+            frame[kind] = frame.get(kind, 0) + n
+
+    # -------------------------------
+    # Slow-call profiles
+    # -------------------------------
+    def profile_slow(self, threshold, directory=None, every=1, max_dumps=100, callback=None):
+        """
+        Run every `every`-th outermost call of each function under cProfile
+        and write the profile of those that take >= threshold seconds to
+        `directory` as <name>-<ns>-<ms>ms.prof (at most max_dumps files).
+        Every slow call, profiled or not, goes to slow_calls and to
+        callback(name, seconds, path). threshold=None stops profiling.
+        """
+        if threshold is None:
+            self._profile = None
+            return
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._profile = {"threshold": threshold, "directory": directory, "every": max(1, every),
+                         "max_dumps": max_dumps if directory is not None else 0, "dumps": 0,
+                         "callback": callback}
+
+    def _start_profile(self, stats, frames):
+        config = self._profile
+        if (config is None or config["directory"] is None or len(frames) != 1
+                or stats.count % config["every"] or getattr(self._local, "profiling", False)):
+            return None
+        profile = cProfile.Profile()
+        self._local.profiling = True
+        profile.enable()
+        return profile
+
+    def _slow(self, name, elapsed, profile):
+        config = self._profile
+        if config is None or elapsed < config["threshold"]:
+            return
+        path = None
+        if profile is not None and config["dumps"] < config["max_dumps"]:
+            config["dumps"] += 1
+            path = os.path.join(config["directory"], f"{name}-{time.time_ns()}-{elapsed * 1000:.0f}ms.prof")
+            profile.dump_stats(path)
+        self.slow_calls.append((name, elapsed, path))
+        if config["callback"] is not None:
+            config["callback"](name, elapsed, path)
+
+    # -------------------------------
+    # Reading
+    # -------------------------------
+    def reset(self):
+        """Zero every counter (the functions stay instrumented)."""
+        with self._lock:
+            for stats in self._stats.values():
+                stats.__init__()
+        self.slow_calls.clear()
+
+    def snapshot(self):
+        """{name: {"calls", "errors", "total_s", "mean_s", "max_s", "p50_s", "p95_s", "p99_s", "scanned", "allocated_blocks"}}."""
+        with self._lock:
+            return {
+                name: {
+                    "calls": s.count,
+                    "errors": s.errors,
+                    "total_s": s.total,
+                    "mean_s": s.total / s.count if s.count else 0.0,
+                    "max_s": s.max,
+                    "p50_s": s.quantile(0.50),
+                    "p95_s": s.quantile(0.95),
+                    "p99_s": s.quantile(0.99),
+                    "scanned": dict(s.scanned),
+                    "allocated_blocks": s.blocks,
+                }
+                for name, s in sorted(self._stats.items()) if s.count
+            }
+
+    def to_prometheus(self, namespace="library"):
+        """The metrics in the Prometheus text exposition format."""
+        with self._lock:
+            stats = [(name, s) for name, s in sorted(self._stats.items()) if s.count]
+            lines = [f"# HELP {namespace}_calls_total Calls of each instrumented function.",
+                     f"# TYPE {namespace}_calls_total counter"]
+            lines += [f'{namespace}_calls_total{{function="{_label(n)}"}} {s.count}' for n, s in stats]
+            lines += [f"# HELP {namespace}_call_errors_total Calls that raised.",
+                      f"# TYPE {namespace}_call_errors_total counter"]
+            lines += [f'{namespace}_call_errors_total{{function="{_label(n)}"}} {s.errors}' for n, s in stats]
+            lines += [f"# HELP {namespace}_call_duration_seconds Latency of each call.",
+                      f"# TYPE {namespace}_call_duration_seconds histogram"]
+            for n, s in stats:
+                function, cumulative = _label(n), 0
+                for bound, count in zip(BUCKETS + (float("inf"),), s.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{namespace}_call_duration_seconds_bucket{{function="{function}",le="{le}"}} {cumulative}')
+                lines.append(f'{namespace}_call_duration_seconds_sum{{function="{function}"}} {s.total!r}')
+                lines.append(f'{namespace}_call_duration_seconds_count{{function="{function}"}} {s.count}')
+            lines += [f"# HELP {namespace}_rows_scanned_total Catalog, loan and member rows read.",
+                      f"# TYPE {namespace}_rows_scanned_total counter"]
+            lines += [f'{namespace}_rows_scanned_total{{function="{_label(n)}",kind="{_label(kind)}"}} {rows}'
+                      for n, s in stats for kind, rows in sorted(s.scanned.items())]
+            lines += [f"# HELP {namespace}_allocated_blocks_total Net memory blocks left allocated by calls.",
+                      f"# TYPE {namespace}_allocated_blocks_total counter"]
+            lines += [f'{namespace}_allocated_blocks_total{{function="{_label(n)}"}} {s.blocks}' for n, s in stats]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, namespace="library"):
+        """Write to_prometheus() to path atomically (for a node_exporter textfile collector)."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus(namespace))
+        os.replace(tmp, path)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
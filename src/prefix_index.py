@@ -0,0 +1,468 @@
+# Typeahead index: sorted runs of normalized title / author keys with max-trees over book weights
+import heapq
+import math
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from src.concurrency import synchronized
+from src.utils import STOP_WORDS, fold_text, split_words, tokenize
+
+_AFTER = chr(sys.maxunicode)  # sorts after every character a key can contain
+_DEAD = float("-inf")
+
+
+def completion_key(text):
+    """Normalized form of a title, author or typed prefix (format_search_query()'s "normalized")."""
+    return " ".join(tokenize(text or ""))
+
+
+def typed_keys(text):
+    """
+    Completion keys for what a patron has typed so far: stop words are
+    dropped from the finished words but not from the word being typed,
+    which may start a longer word ("the" -> "theory"). When that word is
+    a stop word, the key without it follows, in case it is finished
+    ("lord of" -> "lord").
+    """
+    words = split_words(fold_text(text))
+    if not words:
+        return []
+    typing = words.pop() if split_words((text or "")[-1:]) else None
+    head = [w for w in words if w not in STOP_WORDS]
+    if typing is None:
+        return [" ".join(head)] if head else []
+    keys = [" ".join(head + [typing])]
+    if typing in STOP_WORDS and head:
+        keys.append(" ".join(head))
+    return keys
+
+
+def key_suffixes(key):
+    """The key and its tails starting at each later word of two or more characters."""
+    suffixes = [key] if key else []
+    start = 0
+    while True:
+        start = key.find(" ", start) + 1
+        if not start:
+            return suffixes
+        if len(key) > start + 1 and key[start + 1] != " ":
+            suffixes.append(key[start:])
+
+
+class _Buffer:
+    """The newest (key, ref) entries in insertion order, small enough for queries to scan."""
+
+    __slots__ = ("keys", "refs", "weights", "dead")
+    tier = None  # not merged with the runs
+
+    def __init__(self, entries=()):
+        self.keys, self.refs, self.weights = [], array("q"), array("d")
+        self.dead = 0
+        for key, ref, weight in entries:
+            self.append(key, ref, weight)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def append(self, key, ref, weight):
+        """Add an entry; returns its position."""
+        self.keys.append(key)
+        self.refs.append(ref)
+        self.weights.append(weight)
+        return len(self.keys) - 1
+
+    def set(self, position, weight):
+        self.weights[position] = weight
+
+    def live(self):
+        """(key, ref, weight) of the entries not removed."""
+        return [entry for entry in zip(self.keys, self.refs, self.weights) if entry[2] != _DEAD]
+
+    def top(self, prefix):
+        """Yield (-weight, key, ref) for the live entries whose key starts with prefix, heaviest first."""
+        return iter(sorted((-weight, key, ref) for key, ref, weight in zip(self.keys, self.refs, self.weights)
+                           if weight != _DEAD and key.startswith(prefix)))
+
+
+class _Run:
+    """One sorted run of (key, ref) entries with a max-tree over their weights."""
+
+    __slots__ = ("keys", "refs", "tree", "size", "dead", "tier")
+
+    def __init__(self, entries, tier):
+        self.tier = tier
+        self.keys = [key for key, _, _ in entries]
+        self.refs = array("q", [ref for _, ref, _ in entries])
+        # Leaves at tree[size:], node i over nodes 2i and 2i + 1 (any size works, not just powers of two)
+        size = self.size = len(entries)
+        tree = self.tree = array("d", [_DEAD]) * size
+        tree.extend(array("d", [weight for _, _, weight in entries]))
+        # Fill the internal nodes a slice at a time: nodes [low, high) only need nodes from 2 * low >= high
+        high = size
+        while high > 1:
+            low = (high + 1) // 2
+            tree[low:high] = array("d", map(max, tree[2 * low:2 * high:2], tree[2 * low + 1:2 * high:2]))
+            high = low
+        self.dead = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def set(self, position, weight):
+        tree = self.tree
+        i = self.size + position
+        tree[i] = weight
+        i >>= 1
+        while i:
+            left, right = tree[2 * i], tree[2 * i + 1]
+            best = left if left >= right else right
+            if tree[i] == best:
+                return  # the ancestors' maxima do not change either
+            tree[i] = best
+            i >>= 1
+
+    def live(self):
+        """(key, ref, weight) of the entries not removed, in key order."""
+        return [entry for entry in zip(self.keys, self.refs, self.tree[self.size:]) if entry[2] != _DEAD]
+
+    def top(self, prefix):
+        """
+        Yield (-weight, key, ref) for the live entries whose key starts with
+        prefix, heaviest first (ties in key order): a best-first walk of the
+        max-tree over the O(log n) nodes that cover the prefix's key range.
+        """
+        keys, tree, size = self.keys, self.tree, self.size
+        low, high = bisect_left(keys, prefix) + size, bisect_left(keys, prefix + _AFTER) + size
+        # Heap items are (-weight, first position, node, leaves under it): the covering nodes are
+        # whole subtrees, so ties go to the subtree that starts first and leaves come out in key
+        # order without opening every node of a tied weight
+        heap, width = [], 1
+        while low < high:
+            if low & 1:
+                heap.append((-tree[low], low * width - size, low, width))
+                low += 1
+            if high & 1:
+                high -= 1
+                heap.append((-tree[high], high * width - size, high, width))
+            low >>= 1
+            high >>= 1
+            width <<= 1
+        heapq.heapify(heap)
+        while heap:
+            weight, first, node, width = heapq.heappop(heap)
+            if weight == -_DEAD:
+                return  # only removed entries are left
+            if width == 1:
+                yield weight, keys[first], self.refs[first]
+            else:
+                node *= 2
+                width >>= 1
+                heapq.heappush(heap, (-tree[node], first, node, width))
+                heapq.heappush(heap, (-tree[node + 1], first + width, node + 1, width))
+
+
+class PrefixIndex:
+    """
+    Title and author completions for a typeahead box, best first.
+
+    Each book's title and author are normalized like search queries
+    (completion_key()) and indexed under the whole key and under the tail
+    starting at every later word, so "hob" finds "The Hobbit" and "tolk"
+    finds "J. R. R. Tolkien". A completion's weight is
+    log1p(loans of the book) + availability_weight when copies are
+    available; the loan counts come from the ledger through
+    self.loan_counts, archived loans included.
+
+    The entries live in sorted runs. A book added on its own goes into an
+    unsorted buffer of up to BUFFER entries, which queries scan; a full
+    buffer becomes a run of tier 0, and GROWTH runs of one tier are
+    merged into one run of the next (about BUFFER * GROWTH**t entries),
+    so every entry is moved once per tier: O(log n) moves per insert.
+    Weights are computed once per book and move with its entries. A
+    removed entry is marked dead until its run is merged or rewritten.
+    Each run keeps a max-tree over its entries' weights, so a weight
+    change costs O(log n) and the top k completions of a prefix come from
+    a best-first walk of the trees in O(k log n) time, however many keys
+    share the prefix (or its top weight).
+
+    Registered on the catalog with catalog.add_index(); bulk_extend()
+    loads books through add_many().
+    """
+
+    FIELDS = ("title", "author")
+    BUFFER = 128
+    GROWTH = 8
+
+    def __init__(self, availability_weight=1.0):
+        self.availability_weight = availability_weight
+        self.lock = threading.RLock()  # catalog and ledger changes arrive under different locks
+        self.loan_counts = LoanCounts(self)
+        self._loans = {}  # book_id -> loans, from the ledger
+        self._reset()
+
+    def _reset(self):
+        # Entries are numbered (refs) and described by flat per-ref arrays, to keep them small
+        self._runs = [_Buffer()]         # slot -> _Run or None, after the buffer in slot 0
+        self._entry_book = []            # ref -> book_id, None once removed
+        self._entry_field = bytearray()  # ref -> index into FIELDS
+        self._slot = bytearray()         # ref -> slot of the run holding it
+        self._position = array("q")      # ref -> position in that run
+        self._live_entries = 0
+        self._books = {}                 # book_id -> (first ref, end ref, then display text and key per field)
+        self._available = set()          # book ids with copies available
+
+    def __len__(self):
+        return len(self._books)
+
+    # -------------------------------
+    # Catalog listener hooks
+    # -------------------------------
+    @synchronized
+    def add(self, book_id, record):
+        entries = self._entries_for(book_id, record)
+        buffer = self._runs[0]
+        if len(buffer) + len(entries) <= self.BUFFER:
+            for key, ref, weight in entries:
+                self._position[ref] = buffer.append(key, ref, weight)  # slot 0 already
+            return
+        entries += buffer.live()
+        entries.sort()
+        self._place(0, [])
+        self._push(entries)
+
+    @synchronized
+    def add_many(self, items):
+        entries = []
+        for book_id, record in items:
+            entries.extend(self._entries_for(book_id, record))
+        entries.sort()
+        self._push(entries, self._tier(len(entries)))
+
+    @synchronized
+    def discard(self, book_id):
+        book = self._books.pop(book_id, None)
+        self._available.discard(book_id)
+        slots = set()
+        for ref in range(*book[:2]) if book else ():
+            self._entry_book[ref] = None
+            self._live_entries -= 1
+            slot = self._slot[ref]
+            run = self._runs[slot]
+            run.set(self._position[ref], _DEAD)
+            run.dead += 1
+            slots.add(slot)
+        if len(self._entry_book) - self._live_entries > max(self._live_entries, self.BUFFER * self.GROWTH):
+            self._renumber()
+            return
+        for slot in slots:
+            run = self._runs[slot]
+            if run.dead * 2 > len(run):
+                self._place(slot, run.live(), run.tier)  # mostly dead: rewrite without them
+
+    @synchronized
+    def update(self, book_id, record, key):
+        if key in self.FIELDS:
+            self.discard(book_id)
+            self.add(book_id, record)
+        elif key == "copies_available" and book_id in self._books:
+            available = (record.get("copies_available") or 0) > 0
+            if available != (book_id in self._available):
+                if available:
+                    self._available.add(book_id)
+                else:
+                    self._available.discard(book_id)
+                self._reweight(book_id)
+
+    def reorder(self):
+        pass  # completions are ordered by weight and key, not catalog position
+
+    @synchronized
+    def clear(self):
+        self._reset()
+
+    # -------------------------------
+    # Popularity (fed by LoanCounts)
+    # -------------------------------
+    @synchronized
+    def count(self, book_id, delta):
+        """Add delta loans of book_id."""
+        loans = self._loans.get(book_id, 0) + delta
+        if loans:
+            self._loans[book_id] = loans
+        else:
+            self._loans.pop(book_id, None)
+        if book_id in self._books:
+            self._reweight(book_id)
+
+    @synchronized
+    def reset_counts(self):
+        self._loans = {}
+        for book_id in self._books:
+            self._reweight(book_id)
+
+    def weight(self, book_id):
+        """Current weight of book_id's completions."""
+        weight = math.log1p(self._loans.get(book_id, 0))
+        return weight + self.availability_weight if book_id in self._available else weight
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    @synchronized
+    def complete(self, prefix, limit=10, field=None):
+        """
+        The `limit` heaviest completions of prefix (already normalized with
+        completion_key(), or a list of such prefixes, e.g. from
+        typed_keys()): [{"text", "field", "book_id", "score"}], one per
+        distinct title or author, heaviest first. field limits them to
+        "title" or "author".
+        """
+        if limit <= 0:
+            return []
+        prefixes = [prefix] if isinstance(prefix, str) else prefix
+        streams = [run.top(p) for run in self._runs if run is not None for p in prefixes]
+        results, seen = [], set()
+        wanted = None if field is None else self.FIELDS.index(field)
+        for weight, _, ref in heapq.merge(*streams):
+            book_id, kind = self._entry_book[ref], self._entry_field[ref]
+            if wanted is not None and kind != wanted:
+                continue
+            text, key = self._books[book_id][2 + 2 * kind:4 + 2 * kind]
+            if (kind, key) in seen:
+                continue  # another entry (tail, edition, book by the same author) of a listed completion
+            seen.add((kind, key))
+            results.append({"text": text, "field": self.FIELDS[kind], "book_id": book_id, "score": -weight})
+            if len(results) == limit:
+                break
+        return results
+
+    @synchronized
+    def stats(self):
+        """{"books", "entries", "runs" (entries in the buffer, then per run, largest first), "dead"}."""
+        runs = [run for run in self._runs if run is not None]
+        return {"books": len(self._books), "entries": self._live_entries,
+                "runs": [len(runs[0])] + sorted((len(run) for run in runs[1:]), reverse=True),
+                "dead": sum(run.dead for run in runs)}
+
+    # -------------------------------
+    # Runs
+    # -------------------------------
+    def _entries_for(self, book_id, record):
+        if book_id in self._books:
+            self.discard(book_id)
+        if (record.get("copies_available") or 0) > 0:
+            self._available.add(book_id)
+        first = ref = len(self._entry_book)
+        weight = self.weight(book_id)
+        texts, entries = [], []
+        for kind, field in enumerate(self.FIELDS):
+            value = record.get(field)
+            key = completion_key(value) if isinstance(value, str) else ""
+            texts += (value, key)
+            for suffix in dict.fromkeys(key_suffixes(key)):
+                self._entry_book.append(book_id)
+                self._entry_field.append(kind)
+                entries.append((suffix, ref, weight))
+                ref += 1
+        self._slot.extend(bytes(ref - first))
+        self._position.frombytes(bytes(8 * (ref - first)))  # set by _place()
+        self._live_entries += ref - first
+        self._books[book_id] = (first, ref, *texts)
+        return entries
+
+    def _tier(self, size):
+        # The tier of a run of size entries: the first whose runs grow to hold it
+        tier, capacity = 0, self.BUFFER
+        while capacity < size:
+            tier, capacity = tier + 1, capacity * self.GROWTH
+        return tier
+
+    def _push(self, entries, tier=0):
+        # Add the sorted entries as a run, then merge the runs of any tier that has GROWTH of them
+        runs = self._runs
+        while True:
+            slot = runs.index(None) if None in runs else len(runs)
+            if slot == len(runs):
+                runs.append(None)
+            self._place(slot, entries, tier)
+            same = [slot for slot, run in enumerate(runs) if slot and run is not None and run.tier == tier]
+            if len(same) < self.GROWTH:
+                return
+            entries = [entry for slot in same for entry in runs[slot].live()]
+            entries.sort()  # GROWTH sorted runs: one merge pass
+            for slot in same:
+                runs[slot] = None
+            tier += 1
+
+    def _place(self, slot, entries, tier=None):
+        if slot == 0:
+            self._runs[0] = _Buffer(entries)
+        else:
+            self._runs[slot] = _Run(entries, tier) if entries else None
+        slots, positions = self._slot, self._position
+        for position, (_, ref, _) in enumerate(entries):
+            slots[ref] = slot
+            positions[ref] = position
+
+    def _renumber(self):
+        # More removed refs than live ones: hand out consecutive refs again and rebuild one run
+        new_ref, entry_book, entry_field = {}, [], bytearray()
+        for book_id, (first, end, *texts) in self._books.items():
+            self._books[book_id] = (len(entry_book), len(entry_book) + end - first, *texts)
+            for ref in range(first, end):
+                new_ref[ref] = len(entry_book)
+                entry_book.append(book_id)
+                entry_field.append(self._entry_field[ref])
+        entries = sorted((key, new_ref[ref], weight) for run in self._runs if run is not None
+                         for key, ref, weight in run.live())
+        self._entry_book, self._entry_field = entry_book, entry_field
+        self._slot, self._position = bytearray(len(entry_book)), array("q", bytes(8 * len(entry_book)))
+        self._runs = [_Buffer()]
+        self._push(entries, self._tier(len(entries)))
+
+    def _reweight(self, book_id):
+        weight = self.weight(book_id)
+        runs, slots, positions = self._runs, self._slot, self._position
+        for ref in range(*self._books[book_id][:2]):
+            runs[slots[ref]].set(positions[ref], weight)
+
+
+class LoanCounts:
+    """Loan ledger listener that feeds each book's loan count to a PrefixIndex (archived loans included)."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def add(self, record):
+        self.index.count(record.get("book_id"), 1)
+
+    def add_many(self, records):
+        for book_id, loans in Counter(record.get("book_id") for record in records).items():
+            self.index.count(book_id, loans)
+
+    def discard(self, record):
+        self.index.count(record.get("book_id"), -1)
+
+    def update(self, record, key, old):
+        if key == "book_id":
+            self.index.count(old, -1)
+            self.index.count(record.get("book_id"), 1)
+
+    def reorder(self):
+        pass  # counts do not depend on ledger order
+
+    def clear(self):
+        self.index.reset_counts()
+
+    def archive(self, record):
+        pass  # an archived loan still counts
+
+    def add_archived(self, archive):
+        for book_id, loans in zip(archive.books, archive.totals()["book_counts"].tolist()):
+            self.index.count(book_id, loans)
+
+    def drop_archived(self, archive):
+        for book_id, loans in zip(archive.books, archive.totals()["book_counts"].tolist()):
+            self.index.count(book_id, -loans)
@@ -0,0 +1,206 @@
+# Running rating aggregates per book and top-rated orders per genre
+from heapq import heapify, heappop, heappush
+from itertools import count
+
+
+def _genre_key(record):
+    genre = record.get("genre")
+    return genre.strip().lower() if isinstance(genre, str) else None
+
+
+class RatingIndex:
+    """
+    Running (sum, count) of the ratings of every book, and the rated
+    catalog books ranked by average and by Bayesian average, overall
+    and per genre (trimmed, lowercased, as in FacetIndex).
+
+    A vote updates the book's running sum instead of re-summing its
+    ratings and marks the book as moved; the moved books are pushed into
+    the heaps (a few O(log B) pushes each, however many votes they got in
+    between) by the next top-N query, which then pops the best N entries
+    of one heap (dropping entries a later vote superseded on the way) and
+    pushes them back. The Bayesian average pulls books with few votes towards
+    prior_mean, as if each had prior_weight extra votes of that value.
+    Books rated above prior_mean get a recommendation bonus (bonus()).
+
+    Registered on the catalog with catalog.add_index(), so only books in
+    the catalog are ranked and a genre change moves the book between
+    orders. rate_book() feeds it with vote(); rebuild() reloads it from
+    the ratings dict (after open_store()).
+    """
+
+    SCALE = (1, 5)
+
+    def __init__(self, prior_mean=3.0, prior_weight=5):
+        self.prior_mean = prior_mean
+        self.prior_weight = prior_weight
+        self._stats = {}     # book_id -> [sum, count]
+        self._genres = {}    # book_id -> genre key, for catalog books
+        self._orders = {}    # (genre key or None, bayesian) -> heap of (-score, -count, book_id, seq)
+        self._seq = {}       # book_id -> seq of its current heap entries; older entries are stale
+        self._counter = count()
+        self._boosted = set()  # catalog books with a Bayesian average above prior_mean
+        self._moved = set()    # catalog books voted on since their heap entries were pushed
+
+    # -------------------------------
+    # Votes
+    # -------------------------------
+    def vote(self, book_id, rating, old=None):
+        """
+        Add a member's rating, replacing their earlier one (old) if any.
+        Returns the book's (sum, count).
+        """
+        stats = self._stats.setdefault(book_id, [0, 0])
+        if old is None:
+            stats[0] += rating
+            stats[1] += 1
+        else:
+            stats[0] += rating - old
+        if book_id in self._genres:
+            self._moved.add(book_id)
+            if self.bayesian(book_id) > self.prior_mean:
+                self._boosted.add(book_id)
+            else:
+                self._boosted.discard(book_id)
+        return stats[0], stats[1]
+
+    def rebuild(self, ratings):
+        """Recompute every aggregate and order from {book_id: {member_id: rating}}."""
+        self._stats = {book_id: [sum(votes.values()), len(votes)] for book_id, votes in ratings.items() if votes}
+        self._reorder()
+
+    def set_prior(self, mean=None, weight=None):
+        """Change the Bayesian prior and re-sort the Bayesian orders."""
+        if mean is not None:
+            self.prior_mean = mean
+        if weight is not None:
+            self.prior_weight = weight
+        self._reorder()
+
+    # -------------------------------
+    # Catalog listener hooks
+    # -------------------------------
+    def add(self, book_id, record):
+        self._genres[book_id] = _genre_key(record)
+        self._place(book_id)
+
+    def add_many(self, items):
+        for book_id, record in items:
+            self.add(book_id, record)
+
+    def discard(self, book_id):
+        self._unplace(book_id)
+        self._genres.pop(book_id, None)
+
+    def update(self, book_id, record, key):
+        if key == "genre":
+            self._unplace(book_id)
+            self._genres[book_id] = _genre_key(record)
+            self._place(book_id)
+
+    def reorder(self):
+        pass  # ordered by rating, not by catalog position
+
+    def clear(self):
+        self._genres = {}
+        self._orders = {}
+        self._seq = {}
+        self._boosted = set()
+        self._moved = set()
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    def count(self, book_id):
+        stats = self._stats.get(book_id)
+        return stats[1] if stats else 0
+
+    def average(self, book_id):
+        """Mean rating, or None if the book has no ratings."""
+        stats = self._stats.get(book_id)
+        return stats[0] / stats[1] if stats and stats[1] else None
+
+    def bayesian(self, book_id):
+        total, count = self._stats.get(book_id) or (0, 0)
+        return (self.prior_weight * self.prior_mean + total) / (self.prior_weight + count)
+
+    def bonus(self, book_id):
+        """How far the Bayesian average sits above prior_mean, scaled to 0..1 (0 for most books)."""
+        if book_id not in self._boosted:
+            return 0.0
+        return (self.bayesian(book_id) - self.prior_mean) / (self.SCALE[1] - self.prior_mean)
+
+    def boosted_ids(self):
+        """Catalog books with a positive bonus()."""
+        return self._boosted
+
+    def top(self, n=10, genre=None, bayesian=False, min_votes=1):
+        """[(book_id, average)] best first, among catalog books with min_votes+ ratings."""
+        group = genre.strip().lower() if genre else None
+        while self._moved:
+            self._place(self._moved.pop())
+        heap = self._orders.get((group, bool(bayesian)), [])
+        popped, best = [], []
+        while heap and len(best) < n:
+            entry = heappop(heap)
+            if not self._live(entry, group):
+                continue  # superseded by a later vote or a genre change: drop it for good
+            popped.append(entry)
+            if -entry[1] >= min_votes:
+                best.append((entry[2], -entry[0]))
+        for entry in popped:
+            heappush(heap, entry)
+        return best
+
+    # -------------------------------
+    # Internals
+    # -------------------------------
+    def _place(self, book_id):
+        self._unplace(book_id)
+        stats = self._stats.get(book_id)
+        if book_id not in self._genres or not stats or not stats[1]:
+            return
+        seq = self._seq[book_id] = next(self._counter)
+        total, count = stats
+        smoothed = self.bayesian(book_id)
+        for bayesian, score in ((False, total / count), (True, smoothed)):
+            for group in (None, self._genres[book_id]):
+                heap = self._orders.setdefault((group, bayesian), [])
+                heappush(heap, (-score, -count, book_id, seq))
+                if len(heap) > 2 * len(self._seq) + 64:
+                    self._compact(heap, group)
+        if smoothed > self.prior_mean:
+            self._boosted.add(book_id)
+
+    def _unplace(self, book_id):
+        # Entries stay in the heaps until they surface (or a compaction); the seq check ignores them
+        self._seq.pop(book_id, None)
+        self._boosted.discard(book_id)
+        self._moved.discard(book_id)
+
+    def _live(self, entry, group):
+        book_id = entry[2]
+        return self._seq.get(book_id) == entry[3] and (group is None or self._genres[book_id] == group)
+
+    def _compact(self, heap, group):
+        heap[:] = [entry for entry in heap if self._live(entry, group)]
+        heapify(heap)
+
+    def _reorder(self):
+        self._orders = {}
+        self._seq = {}
+        self._boosted = set()
+        self._moved = set()
+        for book_id in self._genres:
+            stats = self._stats.get(book_id)
+            if not stats or not stats[1]:
+                continue
+            seq = self._seq[book_id] = next(self._counter)
+            total, count = stats
+            for bayesian, score in ((False, total / count), (True, self.bayesian(book_id))):
+                for group in (None, self._genres[book_id]):
+                    self._orders.setdefault((group, bayesian), []).append((-score, -count, book_id, seq))
+            if self.bayesian(book_id) > self.prior_mean:
+                self._boosted.add(book_id)
+        for heap in self._orders.values():
+            heapify(heap)
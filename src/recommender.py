@@ -0,0 +1,444 @@
+# Precomputed recommendation indexes: tag / author posting lists and co-borrow similarity
+import heapq
+from bisect import bisect_left
+from collections import Counter
+from itertools import islice
+from math import sqrt
+
+
+def _tags(record):
+    return frozenset(record.get("tags", ()) or ())
+
+
+def _title_key(book_id, record):
+    return (record.get("title") or "", book_id)
+
+
+class TitleOrder:
+    """
+    A set of (title, book_id) keys read back in descending order.
+    Changes are queued and applied on the next read: bisect inserts for
+    a few, one re-sort after a bulk load.
+    """
+
+    BULK = 64  # queued changes above which the order is re-sorted
+
+    def __init__(self):
+        self._keys = set()
+        self._order = []     # sorted keys
+        self._pending = []   # ("add" | "del", key) not yet applied to _order
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key):
+        self._keys.add(key)
+        self._pending.append(("add", key))
+
+    def discard(self, key):
+        self._keys.discard(key)
+        self._pending.append(("del", key))
+
+    def descending(self):
+        if self._pending:
+            self._sync()
+        return reversed(self._order)
+
+    def _sync(self):
+        if len(self._pending) > self.BULK:
+            self._order = sorted(self._keys)
+        else:
+            for op, key in self._pending:
+                i = bisect_left(self._order, key)
+                present = i < len(self._order) and self._order[i] == key
+                if op == "add" and not present:
+                    self._order.insert(i, key)
+                elif op == "del" and present:
+                    del self._order[i]
+        self._pending = []
+
+
+class ContentIndex:
+    """
+    Catalog index behind recommend_books():
+        - tag set -> books carrying exactly those tags, in title order
+        - tag     -> the tag sets that contain it
+        - author  -> book ids
+        - every book in title order, to fill the tail of a recommendation
+          list with in-stock books that match nothing
+
+    Every book in a tag-set group has the same tag-match count for a
+    given member, so a query scores groups rather than books. Registered
+    on the catalog with catalog.add_index().
+    """
+
+    def __init__(self):
+        self._groups = {}           # frozenset of tags -> TitleOrder
+        self._groups_by_tag = {}    # tag -> set of tag sets
+        self._by_author = {}
+        self._keys = {}             # book_id -> (tags, author, title key), to undo an entry
+        self._titles = TitleOrder()
+
+    # -------------------------------
+    # Catalog listener hooks
+    # -------------------------------
+    def add(self, book_id, record):
+        tags = _tags(record)
+        author = record.get("author", "")
+        title_key = _title_key(book_id, record)
+        group = self._groups.get(tags)
+        if group is None:
+            group = self._groups[tags] = TitleOrder()
+            for t in tags:
+                self._groups_by_tag.setdefault(t, set()).add(tags)
+        group.add(title_key)
+        self._by_author.setdefault(author, set()).add(book_id)
+        self._keys[book_id] = (tags, author, title_key)
+        self._titles.add(title_key)
+
+    def discard(self, book_id):
+        keys = self._keys.pop(book_id, None)
+        if keys is None:
+            return
+        tags, author, title_key = keys
+        group = self._groups[tags]
+        group.discard(title_key)
+        if not group:
+            del self._groups[tags]
+            for t in tags:
+                self._remove(self._groups_by_tag, t, tags)
+        self._remove(self._by_author, author, book_id)
+        self._titles.discard(title_key)
+
+    def update(self, book_id, record, key):
+        if key in ("tags", "author", "title"):
+            self.discard(book_id)
+            self.add(book_id, record)
+
+    def reorder(self):
+        pass  # ordered by title, not by catalog position
+
+    def clear(self):
+        self.__init__()
+
+    @staticmethod
+    def _remove(index, key, value):
+        values = index[key]
+        values.discard(value)
+        if not values:
+            del index[key]
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    def tags_of(self, book_id):
+        keys = self._keys.get(book_id)
+        return keys[0] if keys else frozenset()
+
+    def author_ids(self, author):
+        return self._by_author.get(author, ())
+
+    def groups_with(self, tag):
+        """Tag sets (group keys) that include tag."""
+        return self._groups_by_tag.get(tag, ())
+
+    def group(self, tags):
+        return self._groups[tags]
+
+    def titles(self):
+        return self._titles
+
+
+class CoBorrowIndex:
+    """
+    Sparse item-item co-borrow matrix, maintained from loan ledger events.
+    co[a][b] counts the members who borrowed both a and b; similarity is
+    the cosine co[a][b] / sqrt(readers(a) * readers(b)). Registered with
+    loans.add_listener(); each new (member, book) pair costs O(books the
+    member has already borrowed); add_many() counts a bulk load's pairs
+    a row at a time.
+    """
+
+    KEYS = ("user_id", "member_id", "book_id")
+
+    def __init__(self):
+        self._history = {}  # member id -> {book_id: loan count}
+        self._co = {}       # book_id -> {book_id: members who borrowed both}
+        self._readers = {}  # book_id -> distinct members who borrowed it
+
+    # -------------------------------
+    # Ledger listener hooks
+    # -------------------------------
+    def add(self, record):
+        self._link(record.get("user_id") or record.get("member_id"), record.get("book_id"))
+
+    def add_many(self, records):
+        # Record each member's new books first, then count their pairs with one Counter.update per row
+        new = {}
+        for record in records:
+            member_id, book_id = record.get("user_id") or record.get("member_id"), record.get("book_id")
+            if not member_id or book_id is None:
+                continue
+            books = self._history.setdefault(member_id, {})
+            if book_id in books:
+                books[book_id] += 1
+                continue
+            books[book_id] = 1
+            new.setdefault(member_id, []).append(book_id)
+            self._readers[book_id] = self._readers.get(book_id, 0) + 1
+        for member_id, added in new.items():
+            books = self._history[member_id]
+            for a in added:
+                self._row(a).update(books.keys())  # every book of the member, a itself included
+            if len(added) < len(books):
+                fresh = set(added)
+                for b in books:
+                    if b not in fresh:
+                        self._row(b).update(added)  # books the member had borrowed before the batch
+            for a in added:
+                row = self._co[a]
+                row[a] -= 1
+                if not row[a]:
+                    del row[a]
+
+    def discard(self, record):
+        self._unlink(record.get("user_id") or record.get("member_id"), record.get("book_id"))
+
+    def update(self, record, key, old):
+        if key in self.KEYS:
+            before = {**record, key: old}
+            self._unlink(before.get("user_id") or before.get("member_id"), before.get("book_id"))
+            self.add(record)
+
+    def reorder(self):
+        pass  # counts do not depend on ledger order
+
+    def clear(self):
+        self.__init__()
+
+    def archive(self, record):
+        pass  # an archived loan still counts; add_archived() covers it from now on
+
+    def add_archived(self, archive):
+        codes = archive.views()
+        members, books = archive.members, archive.books
+        for m, b in zip(codes["member_code"].tolist(), codes["book_code"].tolist()):
+            self._link(members[m], books[b])
+
+    def drop_archived(self, archive):
+        codes = archive.views()
+        members, books = archive.members, archive.books
+        for m, b in zip(codes["member_code"].tolist(), codes["book_code"].tolist()):
+            self._unlink(members[m], books[b])
+
+    def _link(self, member_id, book_id):
+        if not member_id or book_id is None:
+            return
+        books = self._history.setdefault(member_id, {})
+        if book_id in books:
+            books[book_id] += 1
+            return
+        for other in books:
+            for a, b in ((book_id, other), (other, book_id)):
+                row = self._row(a)
+                row[b] += 1
+        books[book_id] = 1
+        self._readers[book_id] = self._readers.get(book_id, 0) + 1
+
+    def _unlink(self, member_id, book_id):
+        books = self._history.get(member_id)
+        if not books or book_id not in books:
+            return
+        books[book_id] -= 1
+        if books[book_id]:
+            return
+        del books[book_id]
+        if not books:
+            del self._history[member_id]
+        for other in books:
+            self._drop_pair(book_id, other)
+            self._drop_pair(other, book_id)
+        self._readers[book_id] -= 1
+        if not self._readers[book_id]:
+            del self._readers[book_id]
+
+    def _row(self, book_id):
+        row = self._co.get(book_id)
+        if row is None:
+            row = self._co[book_id] = Counter()
+        return row
+
+    def _drop_pair(self, a, b):
+        row = self._co[a]
+        row[b] -= 1
+        if not row[b]:
+            del row[b]
+            if not row:
+                del self._co[a]
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    def history(self, member_id):
+        """{book_id: loan count} for the books member_id has borrowed (do not modify)."""
+        return self._history.get(member_id, {})
+
+    def similarity(self, a, b):
+        both = self._co.get(a, {}).get(b, 0)
+        return both / sqrt(self._readers[a] * self._readers[b]) if both else 0.0
+
+    def neighbors(self, book_ids):
+        """{book_id: summed similarity to book_ids} over books co-borrowed with them."""
+        scores = {}
+        for a in book_ids:
+            row = self._co.get(a)
+            if not row:
+                continue
+            n_a = self._readers[a]
+            for b, both in row.items():
+                scores[b] = scores.get(b, 0.0) + both / sqrt(n_a * self._readers[b])
+        return scores
+
+
+class Recommender:
+    """
+    Indexed recommend_books(). Scores match the catalog scan exactly
+    (tag matches, +1.5 preferred author, +0.5 previously borrowed author,
+    +0.3 in stock / -1.0 out of stock), plus co_borrow_weight times the
+    summed co-borrow similarity to the member's borrowed books, plus
+    rating_weight times the RatingIndex bonus() of well-rated books
+    (both weights are 0 unless set, so by default the answer is the
+    scan's; the scan never counts co-borrows or ratings).
+
+    Books hit by the author, co-borrow or well-rated lists are scored one
+    by one.
+    Every other book in a tag-set group scores the same, so each group
+    with a liked tag becomes a stream in title order, unmatched in-stock
+    books come from the catalog-wide title order at a flat 0.3, and the
+    top K are read off a heapq.merge of the streams.
+    """
+
+    def __init__(self, catalog, content=None, co_borrow=None, co_borrow_weight=0.0,
+                 rating_index=None, rating_weight=0.0):
+        self.catalog = catalog
+        self.content = content if content is not None else ContentIndex()
+        self.co_borrow = co_borrow if co_borrow is not None else CoBorrowIndex()
+        self.co_borrow_weight = co_borrow_weight
+        self.rating_index = rating_index
+        self.rating_weight = rating_weight if rating_index is not None else 0.0
+
+    def recommend(self, borrowed, prefs_tags=(), prefs_authors=(), limit=10, deps=None):
+        """
+        [(book_id, score)] best first; ties broken by title, then id (descending).
+        deps, if given, is a set that receives the result cache keys the
+        answer was read from: ("row", id) for the borrowed books whose
+        co-borrow rows were read, ("book", id) for the books scored one by
+        one or returned, ("score", id) for the returned ones, ("group", tags)
+        for the tag-set groups whose books could still reach the list,
+        "stock" when unmatched in-stock books filled the tail, and "ratings"
+        when ratings count towards the score.
+        """
+        catalog, content = self.catalog, self.content
+        borrowed = set(borrowed)
+
+        liked_tags = set(prefs_tags)
+        borrowed_authors = set()
+        for isbn in borrowed:
+            b = catalog.get(isbn)
+            if not b:
+                continue
+            liked_tags.update(_tags(b))
+            if b.get("author"):
+                borrowed_authors.add(b.get("author"))
+
+        # Tag-match count per tag-set group
+        matches = {}
+        for t in liked_tags:
+            for tags in content.groups_with(t):
+                matches[tags] = matches.get(tags, 0) + 1
+
+        preferred = set().union(*(content.author_ids(a) for a in set(prefs_authors)))
+        familiar = set().union(*(content.author_ids(a) for a in borrowed_authors))
+        similar = self.co_borrow.neighbors(borrowed) if self.co_borrow_weight else {}
+        rated = self.rating_index.boosted_ids() if self.rating_weight else set()
+        special = preferred | familiar | similar.keys() | rated
+
+        scored = []
+        for isbn in special - borrowed:
+            b = catalog.get(isbn)
+            if b is None:
+                continue
+            score = float(matches.get(content.tags_of(isbn), 0))
+            if isbn in preferred:
+                score += 1.5
+            if isbn in familiar:
+                score += 0.5
+            qty = b.get("copies_available", 0)
+            if qty and qty > 0:
+                score += 0.3
+            else:
+                score -= 1.0
+            if isbn in similar:
+                score += self.co_borrow_weight * similar[isbn]
+            if isbn in rated:
+                score += self.rating_weight * self.rating_index.bonus(isbn)
+            if score > 0:
+                scored.append((score, b.get("title") or "", isbn))
+
+        skip = special | borrowed
+        streams = [heapq.nlargest(limit, scored)]
+        for tags, count in matches.items():
+            streams.append(self._group_stream(content.group(tags), float(count), skip))
+        merged = heapq.merge(*streams, reverse=True)
+        best = []
+        filled = False
+        for item in merged:
+            if len(best) == limit:
+                break
+            if item[0] <= 0.3:
+                # Only now can unmatched books (0.3 each) make the list
+                rest = heapq.merge([item], merged, self._filler_stream(matches, skip), reverse=True)
+                best.extend(islice(rest, limit - len(best)))
+                filled = True
+                break
+            best.append(item)
+        else:
+            if len(best) < limit:
+                best.extend(islice(self._filler_stream(matches, skip), limit - len(best)))
+                filled = True
+        if deps is not None and limit:
+            # A book that comes back in stock in a group can only enter a
+            # full list if its group's in-stock score reaches the last place
+            last = best[-1][0] if len(best) == limit else None
+            deps.update(("row", isbn) for isbn in borrowed)
+            deps.update(("book", isbn) for isbn in special - borrowed)
+            for _, _, isbn in best:
+                deps.update((("book", isbn), ("score", isbn)))
+            deps.update(("group", tags) for tags, count in matches.items()
+                        if last is None or float(count) + 0.3 >= last)
+            if filled:
+                deps.add("stock")
+            if self.rating_weight:
+                deps.add("ratings")
+        return [(isbn, score) for score, _, isbn in best]
+
+    def _in_stock(self, isbn):
+        qty = (self.catalog.get(isbn) or {}).get("copies_available", 0)
+        return bool(qty and qty > 0)
+
+    def _group_stream(self, group, count, skip):
+        # In-stock books (count + 0.3) all rank above out-of-stock ones (count - 1.0)
+        for title, isbn in group.descending():
+            if isbn not in skip and self._in_stock(isbn):
+                yield (count + 0.3, title, isbn)
+        if count - 1.0 > 0:
+            for title, isbn in group.descending():
+                if isbn not in skip and not self._in_stock(isbn):
+                    yield (count - 1.0, title, isbn)
+
+    def _filler_stream(self, matches, skip):
+        # Books matching nothing score 0.3 when in stock, and are dropped otherwise
+        tags_of = self.content.tags_of
+        for title, isbn in self.content.titles().descending():
+            if isbn not in skip and tags_of(isbn) not in matches and self._in_stock(isbn):
+                yield (0.3, title, isbn)
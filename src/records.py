@@ -0,0 +1,190 @@
+# Record types stored in the global catalog, loan ledger and members table
+import sys
+from collections.abc import MutableMapping
+
+_MISSING = object()
+
+
+class TagSet(frozenset):
+    """An immutable tag set shared by every record with the same tags; prints like a set."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "{" + ", ".join(map(repr, self)) + "}" if self else "set()"
+
+
+EMPTY_TAGS = TagSet()
+_tag_sets = {frozenset(): EMPTY_TAGS}  # every distinct tag set seen, so equal sets share one object
+
+
+def intern_tags(tags):
+    """The shared TagSet equal to tags (a set or frozenset), with interned strings."""
+    key = frozenset(tags)
+    shared = _tag_sets.get(key)
+    if shared is None:
+        shared = _tag_sets[key] = TagSet(sys.intern(t) if type(t) is str else t for t in key)
+    return shared
+
+
+class TrackedRecord(MutableMapping):
+    """
+    A compact mapping that reports its own key changes back to the
+    container that owns it.
+
+    The usual keys (FIELDS) live in __slots__, anything else in a small
+    overflow dict, so a record costs a fraction of a dict with the same
+    items. An absent field holds the _MISSING sentinel. Strings in
+    INTERNED fields are interned and sets in TAG_SETS fields become shared
+    TagSets. Keys iterate in FIELDS order, then the extra keys in
+    insertion order.
+    """
+
+    FIELDS = ()
+    INTERNED = frozenset()
+    TAG_SETS = frozenset()
+
+    __slots__ = ("_owner", "_extra")
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fieldset = frozenset(cls.FIELDS)
+
+    def __init__(self, *args, **kwargs):
+        self._owner = None
+        self._extra = None
+        if len(args) == 1 and not kwargs and isinstance(args[0], (dict, TrackedRecord)):
+            items = args[0]
+        else:
+            items = dict(*args, **kwargs)
+        found = 0
+        for key in self.FIELDS:
+            value = items.get(key, _MISSING)
+            if value is not _MISSING:
+                found += 1
+                value = self._compact(key, value)
+            setattr(self, key, value)
+        if found < len(items):
+            self._extra = {key: value for key, value in items.items() if key not in self._fieldset}
+
+    def _compact(self, key, value):
+        if key in self.INTERNED and type(value) is str:
+            return sys.intern(value)
+        if key in self.TAG_SETS and isinstance(value, (set, frozenset)):
+            return intern_tags(value)
+        return value
+
+    def _store(self, key, value):
+        if key in self._fieldset:
+            setattr(self, key, self._compact(key, value))
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    # -------------------------------
+    # Lookup
+    # -------------------------------
+    def __getitem__(self, key):
+        if key in self._fieldset:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._fieldset:
+            value = getattr(self, key)
+            return default if value is _MISSING else value
+        extra = self._extra
+        return default if extra is None else extra.get(key, default)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        for key in self.FIELDS:
+            if getattr(self, key) is not _MISSING:
+                yield key
+        if self._extra:
+            yield from list(self._extra)
+
+    def __len__(self):
+        n = sum(1 for key in self.FIELDS if getattr(self, key) is not _MISSING)
+        return n + len(self._extra) if self._extra else n
+
+    def copy(self):
+        return dict(self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    # -------------------------------
+    # Mutations (forwarded to the owner)
+    # -------------------------------
+    def __setitem__(self, key, value):
+        old = self.get(key)
+        self._store(key, value)
+        if self._owner is not None:
+            self._owner._record_changed(self, key, old)
+
+    def __delitem__(self, key):
+        old = self.get(key, _MISSING)
+        if old is _MISSING:
+            raise KeyError(key)
+        if key in self._fieldset:
+            setattr(self, key, _MISSING)
+        else:
+            del self._extra[key]
+        if self._owner is not None:
+            self._owner._record_changed(self, key, old)
+
+    def popitem(self):
+        keys = list(self)
+        if not keys:
+            raise KeyError("popitem(): record is empty")
+        return keys[-1], self.pop(keys[-1])
+
+    def clear(self):
+        for key in list(self):
+            del self[key]
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+
+class BookRecord(TrackedRecord):
+    """
+    One catalog entry: {"id","title","author","genre","tags","copies_total","copies_available",...}.
+    "waitlist" is only set on older records; waitlist_of() moves it into the waitlists global.
+    """
+
+    FIELDS = ("id", "title", "author", "genre", "tags", "copies_total", "copies_available", "waitlist")
+    INTERNED = frozenset({"author", "genre"})
+    TAG_SETS = frozenset({"tags"})
+
+    __slots__ = FIELDS
+
+
+class LoanRecord(TrackedRecord):
+    """One loan: {"member_id","book_id","borrow_date","due_date","returned",...}."""
+
+    FIELDS = ("member_id", "user_id", "book_id", "borrow_date", "due_date", "returned", "return_date")
+    INTERNED = frozenset({"member_id", "user_id", "book_id"})
+
+    __slots__ = FIELDS + ("_seq",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._seq = None
+
+
+class MemberRecord(TrackedRecord):
+    """One members entry: {"name","email","active","balance","loans",...}."""
+
+    FIELDS = ("name", "email", "phone", "active", "balance", "loans", "preferences_tags", "preferences_authors")
+    TAG_SETS = frozenset({"preferences_tags", "preferences_authors"})
+
+    __slots__ = FIELDS
@@ -0,0 +1,271 @@
+# Bounded LRU / TTL result cache for search and recommendations, invalidated by version counters
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import count
+
+
+def _in_stock(record):
+    qty = record.get("copies_available", 0)
+    return bool(qty and qty > 0)
+
+
+def _tags(record):
+    return frozenset(record.get("tags", ()) or ())
+
+
+class Versions:
+    """
+    Version stamps for the inputs of cached results.
+
+    Keys are "catalog" (book membership, order and the text / tag fields),
+    "stock" (any book going in or out of stock), "ratings" (any vote),
+    ("book", id), ("member", id), ("group", tag set) and the co-borrow
+    keys ("row", id) and ("score", id) (see LoanVersions). bump() gives a key the next
+    value of one global counter, so a result computed after stamp = now()
+    is still current exactly while every key it read is <= stamp.
+    bump_all() outdates everything at once (a store reload, a cleared
+    catalog or ledger). latest() is the stamp of the last bump: a result
+    stamped at or after it is current without looking at its keys. The
+    last LOG bumps are also kept, so a result with many keys that only a
+    few bumps came after is checked against those bumps' keys instead.
+    """
+
+    LOG = 1024
+
+    def __init__(self):
+        self._clock = count(1)
+        self._stamps = {}
+        self._epoch = 0
+        self._last = 0     # stamp of the last bump; bumps hold _lock so it only grows
+        self._log = []     # (stamp, keys) of the recent bumps, oldest first
+        self._trimmed = 0  # stamp of the newest bump dropped from _log
+        self._lock = threading.Lock()
+
+    def now(self):
+        """A stamp to take before reading the inputs of a result."""
+        return next(self._clock)
+
+    def latest(self):
+        """Every key changed so far has a stamp <= this."""
+        return self._last
+
+    def bump(self, *keys):
+        with self._lock:
+            stamp = next(self._clock)
+            for key in keys:
+                self._stamps[key] = stamp
+            self._last = stamp
+            self._log.append((stamp, keys))
+            if len(self._log) > 2 * self.LOG:
+                self._trimmed = self._log[-self.LOG - 1][0]
+                del self._log[:-self.LOG]
+
+    def bump_all(self):
+        with self._lock:
+            self._epoch = self._last = next(self._clock)
+
+    def current(self, keys, stamp):
+        """True if none of keys (a set) changed after stamp."""
+        if self._last <= stamp:
+            return True
+        if self._epoch > stamp:
+            return False
+        with self._lock:
+            if self._trimmed <= stamp:
+                recent = self._log[bisect_left(self._log, (stamp + 1,)):]
+                if sum(len(bumped) for _, bumped in recent) < len(keys):
+                    return not any(key in keys for _, bumped in recent for key in bumped)
+        get = self._stamps.get
+        for key in keys:
+            if get(key, 0) > stamp:
+                return False
+        return True
+
+
+class ResultCache:
+    """
+    A bounded LRU map of results with a time-to-live.
+
+    Each entry keeps the Versions keys it was computed from and the stamp
+    taken before computing it; get() drops it once any of those keys has
+    moved on, once it is older than ttl seconds, or when maxsize newer
+    entries push it out. An entry that passes the key check is restamped
+    with Versions.latest(), so until the next bump its hits skip the check. Hits, misses, evictions, expirations and
+    invalidations are counted for stats().
+    """
+
+    def __init__(self, versions, maxsize=1024, ttl=300.0, clock=time.monotonic):
+        self.versions = versions
+        self.maxsize = maxsize
+        self.ttl = ttl  # seconds; None keeps entries until they are invalidated or evicted
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (value, dependency keys, stamp, expires at)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, keys, stamp, expires = entry
+            if expires is not None and self.clock() >= expires:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            latest = self.versions.latest()  # read before the check: later bumps get larger stamps
+            if latest > stamp:
+                if not self.versions.current(keys, stamp):
+                    del self._entries[key]
+                    self.invalidations += 1
+                    self.misses += 1
+                    return default
+                self._entries[key] = (value, keys, latest, expires)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, keys, stamp):
+        """Cache value, computed from the Versions keys after stamp was taken."""
+        if self.maxsize <= 0:
+            return
+        expires = self.clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, frozenset(keys), stamp, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"size": len(self._entries), "maxsize": self.maxsize, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "expirations": self.expirations, "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class CatalogVersions:
+    """
+    Catalog index that bumps Versions keys. Membership, order and title /
+    author / genre / tags edits bump "catalog". A copies_available change
+    only bumps anything when the book goes in or out of stock: then its
+    ("book", id), its ("group", tags) and "stock". Other fields are read
+    live from the records a cached result returns.
+    """
+
+    TEXT_FIELDS = ("title", "author", "genre", "tags")
+
+    def __init__(self, versions):
+        self.versions = versions
+        self._state = {}  # book_id -> (in stock, tag set)
+
+    def add(self, book_id, record):
+        self._state[book_id] = (_in_stock(record), _tags(record))
+        self.versions.bump("catalog")
+
+    def add_many(self, items):
+        for book_id, record in items:
+            self._state[book_id] = (_in_stock(record), _tags(record))
+        self.versions.bump("catalog")
+
+    def discard(self, book_id):
+        self._state.pop(book_id, None)
+        self.versions.bump("catalog")
+
+    def update(self, book_id, record, key):
+        if key in self.TEXT_FIELDS:
+            self._state[book_id] = (_in_stock(record), _tags(record))
+            self.versions.bump("catalog")
+        elif key == "copies_available":
+            was, tags = self._state.get(book_id, (None, _tags(record)))
+            now = _in_stock(record)
+            if now != was:
+                self._state[book_id] = (now, tags)
+                self.versions.bump(("book", book_id), ("group", tags), "stock")
+
+    def reorder(self):
+        self.versions.bump("catalog")
+
+    def clear(self):
+        self._state = {}
+        self.versions.bump_all()
+
+
+class LoanVersions:
+    """
+    Loan ledger listener that bumps Versions keys. Every loan change bumps
+    its ("member", id). The first loan of a book by a member also changes
+    the co-borrow rows of that book and of every other book the member
+    borrowed, bumping their ("row", id), and lowers the book's similarity
+    to everything else (one more reader), bumping its ("score", id). The
+    removal of the member's last loan of a book raises it instead, which
+    bumps ("book", id). Register it after the CoBorrowIndex it reads the
+    member histories from.
+    """
+
+    KEYS = ("user_id", "member_id", "book_id")
+
+    def __init__(self, versions, co_borrow):
+        self.versions = versions
+        self.co_borrow = co_borrow
+
+    def add(self, record):
+        member_id, book_id = _loan_key(record)
+        history = self.co_borrow.history(member_id)
+        if history.get(book_id) == 1:  # a new (member, book) pair
+            self._pair_changed(member_id, book_id, history, ("score", book_id))
+        else:
+            self.versions.bump(("member", member_id))
+
+    def add_many(self, records):
+        self.versions.bump_all()  # a bulk load can touch any member, row or book
+
+    def discard(self, record):
+        member_id, book_id = _loan_key(record)
+        history = self.co_borrow.history(member_id)
+        if book_id not in history:  # the member's last loan of the book
+            self._pair_changed(member_id, book_id, history, ("book", book_id))
+        else:
+            self.versions.bump(("member", member_id))
+
+    def update(self, record, key, old):
+        if key in self.KEYS:
+            for member_id, book_id in (_loan_key({**record, key: old}), _loan_key(record)):
+                history = self.co_borrow.history(member_id)
+                self._pair_changed(member_id, book_id, history, ("book", book_id), ("score", book_id))
+        else:
+            self.versions.bump(("member", _loan_key(record)[0]))
+
+    def reorder(self):
+        pass  # recommendations do not depend on ledger order
+
+    def clear(self):
+        self.versions.bump_all()
+
+    def archive(self, record):
+        pass  # archived loans still count in the co-borrow index and the member's history
+
+    def add_archived(self, archive):
+        self.versions.bump_all()
+
+    def drop_archived(self, archive):
+        self.versions.bump_all()
+
+    def _pair_changed(self, member_id, book_id, history, *keys):
+        self.versions.bump(("member", member_id), ("row", book_id), *(("row", b) for b in history), *keys)
+
+
+def _loan_key(record):
+    return record.get("user_id") or record.get("member_id"), record.get("book_id")
@@ -14,21 +14,21 @@ class Search:
     # -------------------------------
     # Methods (Integrated)
     # -------------------------------
-    def find_books(self, query="", author="", genre="", available=None):
-        """Search the catalog for books."""
-        return lib.search_catalog(query, author, genre, available)
+    def find_books(self, query="", author="", genre="", available=None, limit=None, fuzzy=False):
+        """Search the catalog for books (keyword results are ranked best first; fuzzy=True also matches misspelled words)."""
+        return lib.search_catalog(query, author, genre, available, limit, fuzzy)
 
     def reserve(self, member_id: str, book_id: str):
         """Reserve a book or add user to the waitlist."""
         return lib.reserve_book(member_id, book_id)
 
     def manage_waitlist(self, book_id: str, member_id: str, action="add"):
-        """Add or notify members on waitlist."""
+        """Add, notify, cancel or locate members on the waitlist."""
         return lib.waitlist_management(book_id, member_id, action)
 
-    def recommend_for_member(self, member_id: str, limit: int = 10):
-        """Recommend books using Project 1 algorithm."""
-        return lib.recommend_books(member_id=member_id, limit=limit)
+    def recommend_for_member(self, member_id: str, limit: int = 10, mode: str = "indexed"):
+        """Recommend books using Project 1 algorithm (mode="scan" for the full catalog scan)."""
+        return lib.recommend_books(member_id=member_id, limit=limit, mode=mode)
 
     def normalize_query(self, q: str):
         """Clean up and tokenize a search query."""
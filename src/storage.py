@@ -0,0 +1,437 @@
+# Durable storage for the global library state: binary snapshot + append-only write-ahead log
+import atexit
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+from src.concurrency import synchronized
+
+SNAPSHOT_FILE = "snapshot.bin"
+WAL_FILE = "wal.log"
+FORMAT = 1
+
+_FRAME = struct.Struct("<II")  # payload length, crc32 of payload
+
+
+def _write_frame(f, payload):
+    f.write(_FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+
+
+def _read_frames(f):
+    """Yield (end offset, payload) for each intact frame; stop at a torn or corrupt tail."""
+    offset = f.tell()
+    while True:
+        header = f.read(_FRAME.size)
+        if len(header) < _FRAME.size:
+            return
+        size, crc = _FRAME.unpack(header)
+        payload = f.read(size)
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            return
+        offset += _FRAME.size + size
+        yield offset, payload
+
+
+def _fsync_dir(path):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class LibraryStore:
+    """
+    Snapshot + write-ahead log for the library_functions globals.
+
+    Every change is appended to the WAL as a redo record:
+        - catalog and loans changes arrive through the CatalogStore index
+          and LoanLedger listener hooks, so any code path is covered
+        - members, reservations, waitlists, ratings, average_ratings and
+          reminders are plain containers; the library functions call
+          touch(name, key) after changing one of their entries
+
+    Records are buffered and written in groups of batch_size (or once the
+    oldest buffered record is max_delay seconds old; with max_delay=0,
+    every record is written at once). With fsync=True, sync() makes
+    everything written so far durable; the library functions call it once
+    per operation after releasing their locks, and threads that call it
+    together share one fsync (group commit). The default batch_size=1
+    therefore makes each operation durable before it returns. Once the WAL
+    grows past checkpoint_bytes it is folded into a new snapshot and
+    truncated. All methods are thread-safe.
+
+    open() loads the snapshot and replays the WAL tail into the given
+    containers in place, reloading the catalog and the loans through
+    their bulk_extend(). Each WAL record carries a log sequence number,
+    and records already covered by the snapshot are skipped, so a crash
+    between writing a snapshot and truncating the WAL is harmless.
+    """
+
+    DICTS = ("members", "reservations", "waitlists", "ratings", "average_ratings")
+    LISTS = ("reminders",)
+
+    def __init__(self, path, state, *, batch_size=1, max_delay=0.0, fsync=True,
+                 checkpoint_bytes=64 * 1024 * 1024):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.path = path
+        self.state = state  # name -> the live container (catalog, loans, members, ...)
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.fsync = fsync
+        self.checkpoint_bytes = checkpoint_bytes
+        self._wal = None
+        self._buffer = []
+        self._buffer_since = 0.0
+        self._lsn = 0
+        self._next_lid = 0
+        self._lids = {}  # id(loan record) -> loan id used in the log
+        self._hooks = ()
+        self._checkpoint_due = False
+        self.lock = threading.RLock()        # guards the buffer, sequence numbers and file
+        self._sync_lock = threading.Lock()   # one fsync at a time; waiters share its result
+        self._written_lsn = 0                # last record handed to the OS
+        self._synced_lsn = 0                 # last record known to be on disk
+        self.recovery_times = {}  # seconds spent reading files / rebuilding the globals on open()
+        self.wal_syncs = 0        # fsyncs made by sync(); fewer than operations when threads share them
+
+    # -------------------------------
+    # Open / close
+    # -------------------------------
+    @property
+    def is_open(self):
+        return self._wal is not None
+
+    def open(self):
+        """
+        Load the snapshot and WAL into the live containers, then start logging.
+        An empty directory adopts the current in-memory state as its first snapshot.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        snapshot_path = os.path.join(self.path, SNAPSHOT_FILE)
+        wal_path = os.path.join(self.path, WAL_FILE)
+        if os.path.exists(snapshot_path) or os.path.exists(wal_path):
+            self._recover(snapshot_path, wal_path)
+            self._wal = open(wal_path, "ab")
+        else:
+            self._assign_lids()
+            self._wal = open(wal_path, "ab")
+            self.checkpoint()
+        self._hooks = (_CatalogHooks(self), _LoanHooks(self))
+        self.state["catalog"].add_index(self._hooks[0])
+        self.state["loans"].add_listener(self._hooks[1])
+        for hooks in self._hooks:
+            hooks.loading = False
+        atexit.register(self.close)
+        return self
+
+    def close(self):
+        """Flush buffered records and stop logging."""
+        if self._wal is None:
+            return
+        self.flush()
+        with self._sync_lock, self.lock:
+            self._wal.close()
+            self._wal = None
+        self.state["catalog"].remove_index(self._hooks[0])
+        self.state["loans"].remove_listener(self._hooks[1])
+        self._hooks = ()
+        atexit.unregister(self.close)
+
+    # -------------------------------
+    # Logging
+    # -------------------------------
+    def touch(self, name, key):
+        """Log the current value of state[name][key] (or its removal)."""
+        with self.lock:
+            self._touch(name, key)
+        if self._checkpoint_due:
+            self.checkpoint()
+
+    def _touch(self, name, key):
+        if name == "catalog":
+            record = self.state["catalog"].get(key)
+            if record is None:
+                self._log("catalog", "del", key)
+            else:
+                self._log("catalog", "put", key, dict(record))
+        elif name in self.LISTS:
+            container = self.state[name]
+            if key < len(container):
+                self._log(name, "put", key, container[key])
+            else:
+                self._log(name, "truncate", len(container))
+        elif key in self.state[name]:
+            self._log(name, "put", key, self.state[name][key])
+        else:
+            self._log(name, "del", key)
+
+    @synchronized
+    def _log(self, *entry):
+        if self._wal is None:
+            return
+        self._lsn += 1
+        payload = pickle.dumps((self._lsn,) + entry, pickle.HIGHEST_PROTOCOL)
+        if not self._buffer:
+            self._buffer_since = time.monotonic()
+        self._buffer.append(_FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._buffer_since >= self.max_delay:
+            self._commit()
+
+    def _commit(self):
+        # Called from inside catalog / ledger mutations too, so it never fsyncs or checkpoints
+        self._wal.write(b"".join(self._buffer))
+        self._buffer = []
+        self._wal.flush()
+        self._written_lsn = self._lsn
+        if self._wal.tell() > self.checkpoint_bytes:
+            self._checkpoint_due = True
+
+    def sync(self):
+        """Make every record written so far durable (no-op when fsync=False)."""
+        target = self._written_lsn
+        if not self.fsync or self._synced_lsn >= target:
+            return
+        with self._sync_lock:
+            if self._synced_lsn >= target or self._wal is None:
+                return  # another thread's fsync already covered these records
+            with self.lock:
+                upto = self._written_lsn
+                fd = self._wal.fileno()
+            os.fsync(fd)  # outside self.lock, so other threads keep logging meanwhile
+            self._synced_lsn = max(self._synced_lsn, upto)
+            self.wal_syncs += 1
+
+    def flush(self):
+        """Write and sync buffered records; checkpoint if the WAL is too big."""
+        if self._wal is None:
+            return
+        with self.lock:
+            if self._buffer:
+                self._commit()
+        self.sync()
+        if self._checkpoint_due:
+            self.checkpoint()
+
+    # -------------------------------
+    # Snapshots
+    # -------------------------------
+    def checkpoint(self):
+        """Write a new snapshot of the live state and truncate the WAL."""
+        catalog, loans = self.state["catalog"], self.state["loans"]
+        # Same lock order as a change (container, then store), so nothing moves meanwhile
+        with catalog.lock, loans.lock, self._sync_lock, self.lock:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        self._buffer = []  # the snapshot covers everything logged so far
+        self._checkpoint_due = False
+        catalog, loans = self.state["catalog"], self.state["loans"]
+        image = {
+            "format": FORMAT,
+            "lsn": self._lsn,
+            "next_lid": self._next_lid,
+            "catalog": [dict(catalog.get(book_id)) for book_id in _catalog_order(catalog)],
+            "loans": [(self._lids[id(r)], dict(r)) for r in self._loan_records()],
+        }
+        for name in self.DICTS + self.LISTS:
+            image[name] = self.state[name]
+
+        snapshot_path = os.path.join(self.path, SNAPSHOT_FILE)
+        tmp_path = snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            _write_frame(f, pickle.dumps(image, pickle.HIGHEST_PROTOCOL))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, snapshot_path)
+        _fsync_dir(self.path)
+
+        self._wal.seek(0)
+        self._wal.truncate()
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        self._written_lsn = self._synced_lsn = self._lsn
+
+    # -------------------------------
+    # Recovery
+    # -------------------------------
+    def _loan_records(self):
+        loans = self.state["loans"]
+        # The same record listed twice is logged once; skip the id() pass when there are none
+        return loans if len(loans) == len(self._lids) else _unique(loans)
+
+    def _recover(self, snapshot_path, wal_path):
+        started = time.perf_counter()
+        image = {"lsn": 0, "next_lid": 0, "catalog": [], "loans": []}
+        image.update((name, {}) for name in self.DICTS)
+        image.update((name, []) for name in self.LISTS)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "rb") as f:
+                frames = list(_read_frames(f))
+            if not frames:
+                raise ValueError(f"{snapshot_path} is damaged")
+            image = pickle.loads(frames[0][1])
+            if image.get("format") != FORMAT:
+                raise ValueError(f"Unsupported snapshot format: {image.get('format')!r}")
+
+        model = {
+            "catalog": {record.get("id"): record for record in image["catalog"]},
+            "loans": dict(image["loans"]),
+        }
+        for name in self.DICTS + self.LISTS:
+            model[name] = image[name]
+        self._lsn = image["lsn"]
+        self._next_lid = image["next_lid"]
+
+        if os.path.exists(wal_path):
+            good = 0
+            with open(wal_path, "rb") as f:
+                for good, payload in _read_frames(f):
+                    entry = pickle.loads(payload)
+                    if entry[0] > self._lsn:
+                        self._lsn = entry[0]
+                        _apply(model, entry[1:])
+                        if entry[1] == "loans" and entry[2] == "add":
+                            self._next_lid = max(self._next_lid, entry[3] + 1)
+            if good < os.path.getsize(wal_path):
+                with open(wal_path, "r+b") as f:
+                    f.truncate(good)  # drop a torn final write
+        loaded = time.perf_counter()
+
+        # Through the bulk paths: each index and ledger listener takes the records as one batch
+        catalog, loans = self.state["catalog"], self.state["loans"]
+        catalog.clear()
+        catalog.bulk_extend(model["catalog"].values())
+        loans.clear()
+        loans.bulk_extend(model["loans"].values())
+        self._lids = {id(r): lid for r, lid in zip(self.state["loans"], model["loans"])}
+        for name in self.DICTS:
+            self.state[name].clear()
+            self.state[name].update(model[name])
+        for name in self.LISTS:
+            self.state[name][:] = model[name]
+        self.recovery_times = {"read": loaded - started, "rebuild": time.perf_counter() - loaded}
+
+    def _assign_lids(self):
+        for record in _unique(self.state["loans"]):
+            self._lids[id(record)] = self._next_lid
+            self._next_lid += 1
+
+
+def _unique(records):
+    seen = set()
+    for record in records:
+        if id(record) not in seen:
+            seen.add(id(record))
+            yield record
+
+
+def _catalog_order(catalog):
+    return sorted(catalog.ids(), key=catalog.position)
+
+
+def _apply(model, entry):
+    """Replay one WAL record onto the recovery model."""
+    name, op, *args = entry
+    target = model[name]
+    if op == "put":
+        key, value = args
+        if isinstance(target, list) and key == len(target):
+            target.append(value)
+        else:
+            target[key] = value
+    elif op == "putmany":                   # catalog bulk_extend()
+        for key, value in args[0]:
+            target[key] = value
+    elif op == "add":                       # loans
+        lid, record = args
+        target[lid] = record
+    elif op == "set":                       # catalog / loans field
+        key, field, value = args
+        if key in target:
+            target[key][field] = value
+    elif op == "unset":
+        key, field = args
+        if key in target:
+            target[key].pop(field, None)
+    elif op == "del":
+        target.pop(args[0], None)
+    elif op == "truncate":
+        del target[args[0]:]
+    elif op == "order":
+        model[name] = {key: target[key] for key in args[0] if key in target}
+    elif op == "clear":
+        target.clear()
+    else:
+        raise ValueError(f"Unknown WAL operation: {op!r}")
+
+
+class _CatalogHooks:
+    """Catalog index that forwards every record change to the store's WAL."""
+
+    def __init__(self, store):
+        self.store = store
+        self.loading = True  # add_index() replays the current records; they are in the snapshot
+
+    def add(self, book_id, record):
+        if not self.loading:
+            self.store._log("catalog", "put", book_id, dict(record))
+
+    def add_many(self, items):
+        # One WAL record for a bulk_extend() batch
+        if not self.loading and items:
+            self.store._log("catalog", "putmany", [(book_id, dict(record)) for book_id, record in items])
+
+    def discard(self, book_id):
+        self.store._log("catalog", "del", book_id)
+
+    def update(self, book_id, record, key):
+        if key in record:
+            self.store._log("catalog", "set", book_id, key, record[key])
+        else:
+            self.store._log("catalog", "unset", book_id, key)
+
+    def reorder(self):
+        self.store._log("catalog", "order", _catalog_order(self.store.state["catalog"]))
+
+    def clear(self):
+        self.store._log("catalog", "clear")
+
+
+class _LoanHooks:
+    """Loan ledger listener that forwards every loan change to the store's WAL."""
+
+    def __init__(self, store):
+        self.store = store
+        self.loading = True
+
+    def add(self, record):
+        if self.loading:
+            return
+        store = self.store
+        lid = store._lids[id(record)] = store._next_lid
+        store._next_lid += 1
+        store._log("loans", "add", lid, dict(record))
+
+    def discard(self, record):
+        self.store._log("loans", "del", self.store._lids.pop(id(record)))
+
+    def update(self, record, key, old):
+        lid = self.store._lids[id(record)]
+        if key in record:
+            self.store._log("loans", "set", lid, key, record[key])
+        else:
+            self.store._log("loans", "unset", lid, key)
+
+    def reorder(self):
+        lids = self.store._lids
+        self.store._log("loans", "order", [lids[id(r)] for r in self.store._loan_records()])
+
+    def clear(self):
+        self.store._lids = {}
+        self.store._log("loans", "clear")
@@ -0,0 +1,216 @@
+# Inverted full-text index over the catalog (token -> posting list of book ids)
+import math
+from src.utils import STOP_WORDS, fold_text, split_words
+
+
+class TextIndex:
+    """
+    Keeps a posting list per search token, built from each book's title,
+    author, genre and tags, and ranks matches with BM25.
+
+    Registered on the catalog with catalog.add_index(), so it is updated
+    incrementally whenever a record is added, removed or edited.
+    """
+
+    FIELDS = ("title", "author", "genre", "tags")
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}   # term -> {book_id: term frequency}
+        self._doc_terms = {}  # book_id -> {term: term frequency}
+        self._doc_text = {}   # book_id -> folded field text, used to check phrases
+        self._total_len = 0
+        self._vocabulary = None  # told about new and vanished terms (FuzzyIndex)
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    # -------------------------------
+    # Catalog listener hooks
+    # -------------------------------
+    def add(self, book_id, record):
+        words = []
+        parts = []
+        for field in self.FIELDS:
+            value = record.get(field)
+            if not value:
+                continue
+            if not isinstance(value, str):
+                value = " ".join(sorted(str(v) for v in value))
+            field_words = split_words(fold_text(value))
+            words.extend(field_words)
+            parts.append(" ".join(field_words))
+
+        terms = {}
+        for w in words:
+            if w not in STOP_WORDS:
+                terms[w] = terms.get(w, 0) + 1
+        for term, tf in terms.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = {}
+                if self._vocabulary is not None:
+                    self._vocabulary.add(term)
+            posting[book_id] = tf
+        self._doc_terms[book_id] = terms
+        self._doc_text[book_id] = " " + " | ".join(parts) + " "
+        self._total_len += sum(terms.values())
+
+    def discard(self, book_id):
+        terms = self._doc_terms.pop(book_id, None)
+        if terms is None:
+            return
+        del self._doc_text[book_id]
+        self._total_len -= sum(terms.values())
+        for term in terms:
+            posting = self._postings[term]
+            del posting[book_id]
+            if not posting:
+                del self._postings[term]
+                if self._vocabulary is not None:
+                    self._vocabulary.discard(term)
+
+    def update(self, book_id, record, key):
+        if key in self.FIELDS:
+            self.discard(book_id)
+            self.add(book_id, record)
+
+    def reorder(self):
+        pass  # ranking ties use catalog.position() at query time
+
+    def clear(self):
+        self._postings = {}
+        self._doc_terms = {}
+        self._doc_text = {}
+        self._total_len = 0
+        if self._vocabulary is not None:
+            self._vocabulary.clear()
+
+    def set_vocabulary(self, vocabulary):
+        """
+        Keep vocabulary (add(term) / discard(term) / clear()) in step with
+        the indexed terms, starting with the current ones.
+        """
+        self._vocabulary = vocabulary
+        vocabulary.clear()
+        for term in self._postings:
+            vocabulary.add(term)
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    def postings(self, term):
+        """Book ids containing term (an empty dict if none)."""
+        return self._postings.get(term, {})
+
+    def search(self, tokens, candidates=None):
+        """
+        Match tokens from format_search_query() against the index.
+
+        Every word must appear in the book, and multi-word tokens (quoted
+        phrases) must appear as a phrase. candidates, if given, is a set
+        of book ids the matches are restricted to.
+        Returns a list of (book_id, bm25_score), unsorted, or None when
+        the tokens carry no searchable words.
+        """
+        terms, phrases = self._parse(tokens)
+        if not terms and not phrases:
+            return None
+
+        # Intersect postings, walking the smallest list
+        lists = sorted((self._postings.get(t, {}) for t in terms), key=len)
+        if lists:
+            pool, others = lists[0].keys(), lists[1:]
+            if candidates is not None:
+                if len(candidates) < len(pool):
+                    pool, others = candidates, lists
+                else:
+                    others = others + [candidates]
+            matches = [bid for bid in pool if all(bid in p for p in others)]
+        else:
+            # Only stop-word phrases: nothing to intersect, check the text
+            pool = self._doc_text.keys() if candidates is None else candidates
+            matches = [bid for bid in pool if bid in self._doc_text]
+
+        if phrases:
+            matches = [bid for bid in matches
+                       if all(p in self._doc_text[bid] for p in phrases)]
+
+        return [(bid, self._bm25(bid, terms)) for bid in matches]
+
+    def fuzzy_search(self, tokens, vocabulary, candidates=None):
+        """
+        Like search(), but each query word also matches the indexed terms
+        vocabulary.similar() finds within a few edits of it. Quoted
+        phrases must still match exactly.
+        Returns a list of (book_id, edits, bm25_score), unsorted, or None
+        when the tokens carry no searchable words. edits is the number of
+        corrections the book needed, summed over the words (the closest
+        matching term is used for each), so the exact matches of search()
+        are the ones with 0 edits.
+        """
+        terms, phrases = self._parse(tokens)
+        if not terms:
+            hits = self.search(tokens, candidates)
+            return None if hits is None else [(bid, 0, score) for bid, score in hits]
+
+        # Per word: [(edits, term, posting)], closest first
+        choices = []
+        for word in terms:
+            options = [(edits, term, self._postings[term]) for term, edits in vocabulary.similar(word)
+                       if term in self._postings]
+            if not options:
+                return []
+            choices.append(options)
+        choices.sort(key=lambda options: sum(len(posting) for _, _, posting in options))
+
+        # Walk the union for the rarest word, closest terms first
+        pool = {}
+        for edits, term, posting in choices[0]:
+            for bid in posting:
+                if bid not in pool and (candidates is None or bid in candidates):
+                    pool[bid] = (edits, term)
+        hits = []
+        for bid, (edits, term) in pool.items():
+            matched = [term]
+            for options in choices[1:]:
+                for word_edits, word_term, posting in options:
+                    if bid in posting:
+                        edits += word_edits
+                        matched.append(word_term)
+                        break
+                else:
+                    break
+            else:
+                if all(p in self._doc_text[bid] for p in phrases):
+                    hits.append((bid, edits, self._bm25(bid, list(dict.fromkeys(matched)))))
+        return hits
+
+    @staticmethod
+    def _parse(tokens):
+        """Split format_search_query() tokens into distinct non-stop words and padded phrases."""
+        terms = []
+        phrases = []
+        for tok in tokens:
+            words = split_words(tok)
+            if len(words) > 1 or (words and words[0] in STOP_WORDS):
+                phrases.append(" " + " ".join(words) + " ")
+            terms.extend(w for w in words if w not in STOP_WORDS)
+        return list(dict.fromkeys(terms)), phrases
+
+    def _bm25(self, book_id, terms):
+        n = len(self._doc_terms)
+        avgdl = (self._total_len / n) if n else 0.0
+        doc = self._doc_terms[book_id]
+        dl = sum(doc.values())
+        score = 0.0
+        for term in terms:
+            tf = doc.get(term, 0)
+            if not tf:
+                continue
+            df = len(self._postings[term])
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * dl / avgdl) if avgdl else self.k1
+            score += idf * tf * (self.k1 + 1) / (tf + norm)
+        return score
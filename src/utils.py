@@ -1 +1,27 @@
 # Helper utilities (optional)
+import re, unicodedata
+
+STOP_WORDS = frozenset({"the","a","an","and","or","of","for","to","in","on","at","by","with","from"})
+
+_NON_WORD = re.compile(r"[^\w\-]+")
+
+
+def fold_text(s):
+    """Lowercase, trim and strip accents the same way search queries are cleaned."""
+    s = (s or "").strip().lower()
+    if s.isascii():
+        return s  # nothing to decompose
+    return "".join(
+        c for c in unicodedata.normalize("NFKD", s)
+        if not unicodedata.combining(c)
+    )
+
+
+def split_words(s):
+    """Split already-folded text into words, dropping punctuation."""
+    return _NON_WORD.sub(" ", s).split()
+
+
+def tokenize(s):
+    """Fold text and return its search tokens (stop words removed)."""
+    return [t for t in split_words(fold_text(s)) if t not in STOP_WORDS]
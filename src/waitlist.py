@@ -0,0 +1,134 @@
+# First-come, first-served waitlist of one book: deque + member hash with lazy cancellation
+from bisect import bisect_left, insort
+from collections import deque
+from itertools import islice
+
+
+class Waitlist:
+    """
+    The members waiting for one book, in arrival order.
+
+    Each member gets an increasing ticket. The deque holds (ticket, member)
+    pairs and a dict maps every waiting member to their ticket, so append,
+    popleft and `in` are O(1). cancel() only drops the member from the
+    dict and records the ticket: the dead pair is skipped when it reaches
+    the front, and the queue is rebuilt once dead pairs outnumber the
+    live ones. position() is the member's ticket minus the head's, less
+    the cancelled tickets in between (a bisect), so it is O(log c).
+
+    Iterates, compares and pickles like the list of waiting member ids.
+    """
+
+    __slots__ = ("_queue", "_tickets", "_cancelled", "_next")
+
+    def __init__(self, members=()):
+        self._queue = deque()
+        self._tickets = {}     # waiting member -> ticket
+        self._cancelled = []   # sorted tickets of cancelled pairs still in the deque
+        self._next = 0
+        for member_id in members:
+            self.append(member_id)
+
+    # -------------------------------
+    # Queue operations
+    # -------------------------------
+    def append(self, member_id):
+        """Queue member_id at the back. Returns False if they are already waiting."""
+        if member_id in self._tickets:
+            return False
+        self._tickets[member_id] = self._next
+        self._queue.append((self._next, member_id))
+        self._next += 1
+        return True
+
+    def popleft(self):
+        """Remove and return the member at the front. Raises IndexError if nobody is waiting."""
+        queue, tickets = self._queue, self._tickets
+        while queue:
+            ticket, member_id = queue.popleft()
+            if tickets.get(member_id) == ticket:
+                del tickets[member_id]
+                if not tickets:
+                    self._reset()
+                return member_id
+        raise IndexError("pop from an empty waitlist")
+
+    def pop_many(self, k):
+        """Remove and return the first k members (fewer if the queue is shorter)."""
+        return [self.popleft() for _ in range(min(k, len(self._tickets)))]
+
+    def cancel(self, member_id):
+        """Take member_id off the queue. Returns False if they were not waiting."""
+        ticket = self._tickets.pop(member_id, None)
+        if ticket is None:
+            return False
+        if not self._tickets:
+            self._reset()
+        else:
+            insort(self._cancelled, ticket)
+            if len(self._cancelled) > len(self._tickets) + 32:
+                self._compact()
+        return True
+
+    def position(self, member_id):
+        """1-based place of member_id in the queue, or None if they are not waiting."""
+        ticket = self._tickets.get(member_id)
+        if ticket is None:
+            return None
+        head = self._head()
+        cancelled = self._cancelled
+        skipped = bisect_left(cancelled, ticket) - bisect_left(cancelled, head)
+        return ticket - head - skipped + 1
+
+    def peek(self, k=1):
+        """The first k waiting members, without removing them."""
+        tickets = self._tickets
+        live = ((t, m) for t, m in self._queue if tickets.get(m) == t)
+        return [m for _, m in islice(live, k)]
+
+    # -------------------------------
+    # List-like access
+    # -------------------------------
+    def __contains__(self, member_id):
+        return member_id in self._tickets
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def __iter__(self):
+        tickets = self._tickets
+        return (m for t, m in self._queue if tickets.get(m) == t)
+
+    def __eq__(self, other):
+        if isinstance(other, Waitlist):
+            return list(self) == list(other)
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Waitlist({list(self)!r})"
+
+    def __reduce__(self):
+        return (type(self), (list(self),))
+
+    # -------------------------------
+    # Internals
+    # -------------------------------
+    def _head(self):
+        queue, tickets = self._queue, self._tickets
+        while tickets.get(queue[0][1]) != queue[0][0]:
+            queue.popleft()  # a cancelled pair reached the front
+        return queue[0][0]
+
+    def _compact(self):
+        members = list(self)
+        self._reset()
+        for member_id in members:
+            self.append(member_id)
+
+    def _reset(self):
+        self._queue.clear()
+        self._tickets.clear()
+        self._cancelled = []
+        self._next = 0
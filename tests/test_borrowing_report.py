@@ -0,0 +1,103 @@
+"""live_borrowing_report() (the materialized aggregates) against generate_borrowing_report()."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from src import library_functions as lib
+from benchmarks.datagen import make_loans, populate
+
+
+def _new_loan(rng):
+    borrowed = datetime.now() - timedelta(days=rng.randrange(60), hours=rng.randrange(24))
+    return {"member_id": rng.choice(list(lib.members)), "book_id": rng.choice(list(lib.catalog.ids())),
+            "borrow_date": borrowed, "due_date": borrowed + timedelta(days=14), "returned": False}
+
+
+def _edit(rng):
+    """One random change to the ledger: a checkout or return, a record edit, an insert or a removal."""
+    action = rng.random()
+    if action < 0.2:
+        member_id, book_id = rng.choice(list(lib.members)), rng.choice(list(lib.catalog.ids()))
+        try:
+            lib.check_in_out_operations(member_id, book_id, rng.choice(["borrow", "return"]))
+        except (KeyError, ValueError):
+            pass  # no copies left, already borrowed, nothing to return
+        return
+    if action < 0.3:
+        lib.loans.append(_new_loan(rng))
+        return
+    if action < 0.35:
+        lib.loans.bulk_extend([_new_loan(rng) for _ in range(rng.randint(1, 20))])
+        return
+    record = rng.choice(lib.loans)
+    if action < 0.5:
+        record["returned"] = not record.get("returned")
+    elif action < 0.6:
+        record["due_date"] = datetime.now() + timedelta(days=rng.randint(-60, 20), hours=rng.randrange(24))
+    elif action < 0.7:
+        record["return_date"] = None if record.get("return_date") else datetime.now()
+    elif action < 0.8:
+        record["member_id"] = rng.choice(list(lib.members))
+    elif action < 0.9:
+        record["book_id"] = rng.choice(list(lib.catalog.ids()))
+    else:
+        lib.loans.remove(record)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_live_report_matches_batch_report(seed):
+    rng = populate(n_books=200, n_members=50, n_loans=2000, seed=seed)
+    for step in range(300):
+        _edit(rng)
+        for fine_per_day in (0.5, 1.25):
+            live = lib.live_borrowing_report(fine_per_day)
+            assert live == lib.generate_borrowing_report(fine_per_day), f"step {step}, fine {fine_per_day}"
+
+
+def test_since_lists_every_changed_user():
+    rng = populate(n_books=200, n_members=50, n_loans=2000, seed=4)
+    before = lib.live_borrowing_report(since=0)
+    for step in range(200):
+        for _ in range(rng.randint(1, 5)):
+            _edit(rng)
+        delta = lib.live_borrowing_report(since=before["version"])
+        full = lib.generate_borrowing_report()
+        changed = {user for user, entry in full["user_activity"].items()
+                   if before["user_activity"].get(user) != entry}
+        assert delta["full"] or changed <= delta["user_activity"].keys(), f"step {step}"
+        assert all(full["user_activity"][user] == entry for user, entry in delta["user_activity"].items())
+        before = lib.live_borrowing_report(since=0)
+
+
+@pytest.mark.parametrize("days", [7, 30, 365])
+def test_window_matches_batch_report_over_the_window(days):
+    rng = populate(n_books=200, n_members=50, n_loans=0, seed=5)
+    lib.loans.bulk_extend(make_loans(2000, list(lib.catalog.ids()), list(lib.members), rng,
+                                     start=datetime.now() - timedelta(days=400), days=400))
+    for _ in range(100):
+        _edit(rng)
+    cutoff = datetime.today().toordinal() - days + 1
+    everything = lib.loans
+    lib.loans = [r for r in everything if r.get("borrow_date") and r["borrow_date"].toordinal() >= cutoff]
+    try:
+        expected = lib.generate_borrowing_report()
+    finally:
+        lib.loans = everything
+    live = dict(lib.live_borrowing_report(window_days=days))
+    assert live.pop("window_days") == days
+    assert live == expected
+
+
+def test_bulk_reload_matches_record_by_record():
+    rng = populate(n_books=200, n_members=50, n_loans=2000, seed=6)
+    for _ in range(100):
+        _edit(rng)
+    records = [dict(record) for record in lib.loans]
+    lib.loans.clear()
+    lib.loans.bulk_extend(records)
+    bulk = lib.live_borrowing_report()
+    lib.loans.clear()
+    for record in records:
+        lib.loans.append(record)
+    assert bulk == lib.live_borrowing_report() == lib.generate_borrowing_report()
@@ -0,0 +1,35 @@
+"""recommend_books(): the indexed recommender against the catalog scan."""
+
+import pytest
+
+from src import library_functions as lib
+from benchmarks.datagen import GENRES, populate
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_default_indexed_matches_scan(seed):
+    rng = populate(n_books=400, n_members=40, n_loans=1500, seed=seed, n_ratings=600, zipf=1.1)
+    for member_id in rng.sample(list(lib.members), 20):
+        member = lib.members[member_id]
+        if rng.random() < 0.7:
+            member["preferences_tags"] = set(rng.sample(GENRES, rng.randint(1, 3)))
+        if rng.random() < 0.5:
+            member["preferences_authors"] = {f"Author {rng.randrange(20)}"}
+        for limit in (5, 10, 50):
+            expected = lib.recommend_books(member_id=member_id, limit=limit, mode="scan")
+            assert lib.recommend_books(member_id=member_id, limit=limit) == expected
+
+
+def test_co_borrow_weight_is_opt_in():
+    rng = populate(n_books=200, n_members=20, n_loans=800, seed=4)
+    member_id = rng.choice(list(lib.members))
+    default = lib.recommend_books(member_id=member_id, limit=20)
+    lib.recommender.co_borrow_weight = 1.0
+    lib.clear_caches()  # cached results do not record the weights they were scored with
+    try:
+        weighted = lib.recommend_books(member_id=member_id, limit=20)
+    finally:
+        lib.recommender.co_borrow_weight = 0.0
+        lib.clear_caches()
+    assert default == lib.recommend_books(member_id=member_id, limit=20, mode="scan")
+    assert weighted != default
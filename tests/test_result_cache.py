@@ -0,0 +1,48 @@
+"""Versions.current() and ResultCache.get() against a brute-force stamp table."""
+
+import random
+
+from src.result_cache import ResultCache, Versions
+
+
+def test_current_matches_brute_force():
+    rng = random.Random(1)
+    versions = Versions()
+    versions.LOG = 8  # trim the bump log often
+    last = {}  # key -> stamp of its last bump
+    computed = []
+    for _ in range(20_000):
+        r = rng.random()
+        if r < 0.4:
+            keys = [rng.randrange(60) for _ in range(rng.randint(1, 6))]
+            versions.bump(*keys)
+            last.update((key, versions.latest()) for key in keys)
+        elif r < 0.42:
+            versions.bump_all()
+            last = dict.fromkeys(range(60), versions.latest())
+        elif r < 0.6:
+            computed.append((frozenset(rng.randrange(60) for _ in range(rng.randint(1, 40))), versions.now()))
+        elif computed:
+            keys, stamp = rng.choice(computed)
+            assert versions.current(keys, stamp) == all(last.get(key, 0) <= stamp for key in keys)
+
+
+def test_hits_are_dropped_once_a_key_moves():
+    rng = random.Random(2)
+    versions = Versions()
+    cache = ResultCache(versions, maxsize=100, ttl=None)
+    last = {}
+    for step in range(5_000):
+        name = rng.randrange(50)
+        keys = {rng.randrange(200) for _ in range(rng.randint(1, 30))}
+        stamp = versions.now()
+        if cache.get(name) is None:
+            cache.put(name, (keys, stamp), keys, stamp)
+        else:
+            keys, stamp = cache.get(name)
+            assert all(last.get(key, 0) <= stamp for key in keys)
+        if step % 3 == 0:
+            bumped = [rng.randrange(200) for _ in range(rng.randint(1, 5))]
+            versions.bump(*bumped)
+            last.update((key, versions.latest()) for key in bumped)
+    assert cache.hits and cache.invalidations